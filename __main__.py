@@ -0,0 +1,11 @@
+import os
+import sys
+
+# `python -m pyx <demo>` from the directory above the checkout, or `python . <demo>`
+# from inside it; see gen-art/common/launcher.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gen-art'))
+
+from common.launcher import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# Offscreen benchmarks for the demos. Each case times one stage (a simulation
+# step, a repaint, the noise field, an SVG export) at several sizes across the
+# slider ranges, with fixed seeds. Results are written as JSON and can be
+# compared against a stored baseline; the run fails when a stage's median gets
+# slower than the baseline by more than the threshold (and more than --floor
+# ms), again when it is timed a second time.
+#
+#   python gen-art/benchmarks/bench.py --out results.json
+#   python gen-art/benchmarks/bench.py --baseline --threshold 0.25
+#   python gen-art/benchmarks/bench.py --only 'voronoi.*' --quick
+#
+# --baseline with no path uses the stored benchmarks/baseline.json, which
+# --save-baseline rewrites. Timings only compare on the same machine, so
+# refresh it when the hardware changes.
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import kernels
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+CASES = []
+WIDTH, HEIGHT = 900, 800  # Roughly the demo widget inside a 1200x800 window
+
+
+def case(name, sizes, quick_sizes=None, repeats=20):
+    # Registers setup(size) -> callable to time, once per size
+    def register(setup):
+        CASES.append({'name': name, 'sizes': sizes, 'quick_sizes': quick_sizes or sizes[:2],
+                      'repeats': repeats, 'setup': setup})
+        return setup
+    return register
+
+
+_app = None
+
+
+def qt_app():
+    global _app
+    if _app is None:
+        from PyQt5.QtWidgets import QApplication
+        _app = QApplication.instance() or QApplication(sys.argv[:1])
+    return _app
+
+
+def paint_callable(widget):
+    # Runs the widget's paintEvent into an offscreen image
+    from PyQt5.QtGui import QImage
+    image = QImage(widget.width(), widget.height(), QImage.Format_ARGB32_Premultiplied)
+    return lambda: widget.render(image)
+
+
+def load_demo(path):
+    import runpy
+    return runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path))
+
+
+def quiet_window(cls):
+    # Demo window with its timer and worker thread stopped, so only the benchmark drives it
+    window = cls()
+    window.timer.stop()
+    for widget in ('flow_widget', 'voronoi_widget', 'gl_widget'):
+        if hasattr(window, widget):
+            getattr(window, widget).pipeline.stop()
+    return window
+
+
+@contextlib.contextmanager
+def save_dialog_answer(path):
+    # Makes QFileDialog.getSaveFileName return path without a dialog, until the block ends
+    from PyQt5.QtWidgets import QFileDialog
+    original = QFileDialog.__dict__['getSaveFileName']
+    QFileDialog.getSaveFileName = staticmethod(lambda *args, **kwargs: (path, ''))
+    try:
+        yield
+    finally:
+        QFileDialog.getSaveFileName = original
+
+
+def export_callable(window, suffix):
+    path = os.path.join(tempfile.gettempdir(), f'gen-art-bench{suffix}')
+
+    def export():
+        with save_dialog_answer(path), contextlib.redirect_stdout(io.StringIO()):
+            window.export_svg()
+    return export
+
+
+PARTICLES = [1000, 5000, 10000, 20000]
+POINTS = [10, 100, 1000, 5000, 20000]
+THREADS = [1, 10, 20, 40, 80]
+
+
+@case('fluid_flow.update_simulation', PARTICLES)
+def fluid_step(size):
+    qt_app()
+    widget = load_demo('fluid_flow/fluid_flow.py')['FluidFlowWidget'](seed=0)
+    widget.resize(WIDTH, HEIGHT)
+    widget.model.num_particles = size
+    widget.update_simulation()
+    return widget.update_simulation
+
+
+@case('fluid_flow.paintEvent', PARTICLES)
+def fluid_paint(size):
+    widget = fluid_step(size).__self__
+    return paint_callable(widget)
+
+
+@case('fluid_flow.export_svg', PARTICLES, repeats=3)
+def fluid_export(size):
+    qt_app()
+    window = quiet_window(load_demo('fluid_flow/fluid_flow.py')['FluidFlowSimulation'])
+    window.flow_widget.model.num_particles = size
+    window.flow_widget.update_simulation()
+    return export_callable(window, '-fluid.svg')
+
+
+@case('voronoi.update_simulation', POINTS)
+def voronoi_step(size):
+    qt_app()
+    widget = load_demo('voronoi/voronoi_art.py')['VoronoiWidget'](seed=0)
+    widget.resize(WIDTH, HEIGHT)
+    widget.model.num_points = size
+    widget.update_simulation()
+    return widget.update_simulation
+
+
+@case('voronoi.paintEvent', POINTS)
+def voronoi_paint(size):
+    widget = voronoi_step(size).__self__
+    return paint_callable(widget)
+
+
+@case('voronoi.export_svg', POINTS, repeats=3)
+def voronoi_export(size):
+    qt_app()
+    window = quiet_window(load_demo('voronoi/voronoi_art.py')['VoronoiArtSimulation'])
+    window.voronoi_widget.model.num_points = size
+    window.voronoi_widget.model.clear_points()
+    window.voronoi_widget.update_simulation()
+    return export_callable(window, '-voronoi.svg')
+
+
+@case('fabric.multi_layer_perlin_noise', THREADS)
+def fabric_noise(size):
+    from common.perlin import multi_layer_perlin_noise
+    return lambda: multi_layer_perlin_noise(50, size, 0.2, 4, seed=0.5, dtype=np.float32)
+
+
+@case('fabric.step', THREADS)
+def fabric_step(size):
+    # Advancing frames miss the noise cache every time, like the running demo
+    from fabric.model import FabricModel
+    model = FabricModel(seed=0)
+    model.num_threads = size
+    return model.step
+
+
+@case('fabric.export_svg', THREADS, repeats=3)
+def fabric_export(size):
+    qt_app()
+    window = quiet_window(load_demo('fabric/fabric.py')['OrganicMotionSimulation'])
+    window.gl_widget.model.num_threads = size
+    window.gl_widget.model.step()
+    return export_callable(window, '-fabric.svg')
+
+
+def measure(fn, repeats, budget=2.0):
+    fn()  # Warm-up: first-call allocations, caches, lazy imports
+    # Peak traced memory of one call, measured apart from the timings since tracing slows allocation
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    deadline = time.perf_counter() + budget
+    while len(times) < repeats and (len(times) < 3 or time.perf_counter() < deadline):
+        started = time.perf_counter_ns()
+        fn()
+        times.append((time.perf_counter_ns() - started) / 1e6)
+    times = np.array(times)
+    return {
+        'median_ms': float(np.median(times)),
+        'p95_ms': float(np.percentile(times, 95)),
+        'min_ms': float(times.min()),
+        'repeats': len(times),
+        'peak_bytes': int(peak),
+    }
+
+
+def run(only=None, quick=False, budget=2.0):
+    results = {}
+    for entry in CASES:
+        for size in entry['quick_sizes'] if quick else entry['sizes']:
+            key = f"{entry['name']}[{size}]"
+            if only and not any(fnmatch.fnmatch(key, pattern) or fnmatch.fnmatch(entry['name'], pattern)
+                                for pattern in only):
+                continue
+            results[key] = measure(entry['setup'](size), entry['repeats'], budget)
+            print(f"{key:45s} median {results[key]['median_ms']:9.3f} ms   "
+                  f"p95 {results[key]['p95_ms']:9.3f} ms   peak {results[key]['peak_bytes'] / 1e6:8.2f} MB")
+    return results
+
+
+def remeasure(key, budget=2.0):
+    # Times one stage again from a fresh setup, e.g. to confirm a regression
+    name, size = key[:-1].split('[')
+    entry = next(entry for entry in CASES if entry['name'] == name)
+    return measure(entry['setup'](int(size)), entry['repeats'], budget)
+
+
+def metadata():
+    meta = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'kernels': kernels.backend(),  # GENART_BACKEND; compare baselines of the same backend
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    try:
+        import resource
+        meta['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        pass  # Not available on Windows
+    return meta
+
+
+def compare(results, baseline, threshold, floor_ms=0.25):
+    # Stages whose median grew by more than threshold (a fraction) over the
+    # baseline. Differences below floor_ms are scheduling noise on
+    # sub-millisecond stages and never count.
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        change = result['median_ms'] / max(base['median_ms'], 1e-9) - 1
+        if change > threshold and result['median_ms'] - base['median_ms'] > floor_ms:
+            regressions.append((key, base['median_ms'], result['median_ms'], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the gen-art demos offscreen.')
+    parser.add_argument('--out', help='write results to this JSON file')
+    parser.add_argument('--baseline', nargs='?', const=BASELINE,
+                        help='compare against a results JSON file (default: the stored baseline)')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed median slowdown as a fraction (default 0.25)')
+    parser.add_argument('--floor', type=float, default=0.25,
+                        help='ignore slowdowns smaller than this many ms (default 0.25)')
+    parser.add_argument('--only', action='append', help="glob over stage names, e.g. 'voronoi.*'")
+    parser.add_argument('--quick', action='store_true', help='only the two smallest sizes per stage')
+    parser.add_argument('--budget', type=float, default=2.0, help='seconds per case before stopping early')
+    args = parser.parse_args(argv)
+
+    results = run(args.only, args.quick, args.budget)
+    report = {'meta': metadata(), 'results': results}
+    for path in filter(None, [args.out, BASELINE if args.save_baseline else None]):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Results written to '{path}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold, args.floor)
+        if regressions:
+            # Flagged stages are timed again and keep their faster run, so a
+            # one-off slow run on a busy machine doesn't fail the check
+            print(f"Timing {len(regressions)} flagged stage(s) again")
+            for key, *_ in regressions:
+                again = remeasure(key, args.budget)
+                if again['median_ms'] < results[key]['median_ms']:
+                    results[key] = again
+            regressions = compare(results, baseline, args.threshold, args.floor)
+        for key, before, after, change in regressions:
+            print(f"REGRESSION {key}: {before:.3f} ms -> {after:.3f} ms (+{change:.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.threshold:.0%} against '{args.baseline}'")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+# This file can be left empty
\ No newline at end of file
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Tiny 3x5 pixel font for labelling rendered images without Qt or PIL.
+# Letters are drawn as capitals; anything unknown becomes '?'.
+
+GLYPHS = {
+    '0': ('###', '#.#', '#.#', '#.#', '###'), '1': ('.#.', '##.', '.#.', '.#.', '###'),
+    '2': ('###', '..#', '###', '#..', '###'), '3': ('###', '..#', '.##', '..#', '###'),
+    '4': ('#.#', '#.#', '###', '..#', '..#'), '5': ('###', '#..', '###', '..#', '###'),
+    '6': ('###', '#..', '###', '#.#', '###'), '7': ('###', '..#', '..#', '.#.', '.#.'),
+    '8': ('###', '#.#', '###', '#.#', '###'), '9': ('###', '#.#', '###', '..#', '###'),
+    'A': ('.#.', '#.#', '###', '#.#', '#.#'), 'B': ('##.', '#.#', '##.', '#.#', '##.'),
+    'C': ('.##', '#..', '#..', '#..', '.##'), 'D': ('##.', '#.#', '#.#', '#.#', '##.'),
+    'E': ('###', '#..', '##.', '#..', '###'), 'F': ('###', '#..', '##.', '#..', '#..'),
+    'G': ('.##', '#..', '#.#', '#.#', '.##'), 'H': ('#.#', '#.#', '###', '#.#', '#.#'),
+    'I': ('###', '.#.', '.#.', '.#.', '###'), 'J': ('..#', '..#', '..#', '#.#', '.#.'),
+    'K': ('#.#', '#.#', '##.', '#.#', '#.#'), 'L': ('#..', '#..', '#..', '#..', '###'),
+    'M': ('#.#', '###', '###', '#.#', '#.#'), 'N': ('##.', '#.#', '#.#', '#.#', '#.#'),
+    'O': ('.#.', '#.#', '#.#', '#.#', '.#.'), 'P': ('##.', '#.#', '##.', '#..', '#..'),
+    'Q': ('.#.', '#.#', '#.#', '##.', '.##'), 'R': ('##.', '#.#', '##.', '#.#', '#.#'),
+    'S': ('.##', '#..', '.#.', '..#', '##.'), 'T': ('###', '.#.', '.#.', '.#.', '.#.'),
+    'U': ('#.#', '#.#', '#.#', '#.#', '###'), 'V': ('#.#', '#.#', '#.#', '#.#', '.#.'),
+    'W': ('#.#', '#.#', '###', '###', '#.#'), 'X': ('#.#', '#.#', '.#.', '#.#', '#.#'),
+    'Y': ('#.#', '#.#', '.#.', '.#.', '.#.'), 'Z': ('###', '..#', '.#.', '#..', '###'),
+    '.': ('...', '...', '...', '...', '.#.'), '=': ('...', '###', '...', '###', '...'),
+    '_': ('...', '...', '...', '...', '###'), '-': ('...', '...', '###', '...', '...'),
+    '+': ('...', '.#.', '###', '.#.', '...'), ',': ('...', '...', '...', '.#.', '#..'),
+    ':': ('...', '.#.', '...', '.#.', '...'), ' ': ('...', '...', '...', '...', '...'),
+    '?': ('###', '..#', '.#.', '...', '.#.'),
+}
+GLYPH_WIDTH, GLYPH_HEIGHT = 3, 5
+ADVANCE, LINE_HEIGHT = GLYPH_WIDTH + 1, GLYPH_HEIGHT + 2
+
+_masks = {}
+
+
+def glyph(char):
+    # Boolean (5, 3) mask of a character
+    char = char.upper()
+    if char not in GLYPHS:
+        char = '?'
+    mask = _masks.get(char)
+    if mask is None:
+        mask = _masks[char] = np.array([[c == '#' for c in row] for row in GLYPHS[char]])
+    return mask
+
+
+def text_size(lines, scale=1):
+    # Pixel (width, height) of the lines as draw_text lays them out
+    width = max((len(line) for line in lines), default=0) * ADVANCE - 1
+    return max(width, 0) * scale, max(len(lines) * LINE_HEIGHT - 2, 0) * scale
+
+
+def draw_text(rgba, x, y, lines, scale=1, color=(0, 0, 0)):
+    # Draws lines of text with the top-left corner at (x, y), clipped to the image
+    height, width = rgba.shape[:2]
+    for row, line in enumerate(lines):
+        for column, char in enumerate(line):
+            mask = glyph(char)
+            if scale > 1:
+                mask = mask.repeat(scale, axis=0).repeat(scale, axis=1)
+            left = x + column * ADVANCE * scale
+            top = y + row * LINE_HEIGHT * scale
+            if left >= width or top >= height or left + mask.shape[1] <= 0 or top + mask.shape[0] <= 0:
+                continue
+            # Clip the mask to the image
+            mx, my = max(-left, 0), max(-top, 0)
+            mask = mask[my:height - top, mx:width - left]
+            region = rgba[top + my:top + my + mask.shape[0], left + mx:left + mx + mask.shape[1], :3]
+            region[mask] = color
@@ -0,0 +1,148 @@
+import argparse
+import ast
+import importlib
+import os
+import sys
+
+# Renders demo frames to PNG or SVG files without Qt. Every frame is a pure
+# function of (demo, seed, parameters, frame number): each worker rebuilds the
+# model from the seed and steps it up to its first frame, so a frame range
+# split across a process pool writes exactly the same bytes as one process.
+#
+#   python gen-art/common/headless.py fluid_flow --frames 120 --seed 7 --workers 4
+#   python gen-art/common/headless.py voronoi --set num_points=2000 --format svg
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.png import write_png
+from common.raster import RasterCanvas
+from common.svg import SvgCanvas
+
+# Demo name -> (module, model class), imported only when used
+MODELS = {
+    'fluid_flow': ('fluid_flow.model', 'FluidFlowModel'),
+    'voronoi': ('voronoi.model', 'VoronoiModel'),
+    'fabric': ('fabric.model', 'FabricModel'),
+}
+
+TITLES = {
+    'fluid_flow': 'Fluid Flow',
+    'voronoi': 'Voronoi Art',
+    'fabric': 'Organic Fabric',
+}
+
+
+def create_model(demo, seed=0, params=None, size=None):
+    module, name = MODELS[demo]
+    model = getattr(importlib.import_module(module), name)(seed=seed)
+    if size is not None:
+        model.width, model.height = size
+    for key, value in (params or {}).items():
+        if not hasattr(model, key):
+            raise ValueError(f"{demo} has no parameter '{key}'")
+        setattr(model, key, value)
+    return model
+
+
+def step_model(model, draw):
+    # Voronoi only needs its diagram on frames that are drawn
+    if hasattr(model, 'update_diagram'):
+        model.step(diagram=draw)
+    else:
+        model.step()
+
+
+def frame_path(out_dir, demo, frame, fmt):
+    return os.path.join(out_dir, f'{demo}_{frame:05d}.{fmt}')
+
+
+def render_frame(model, path, fmt='png', scale=1.0, title=None):
+    if fmt == 'png':
+        canvas = RasterCanvas(round(model.width * scale), round(model.height * scale), scale)
+        model.draw(canvas)
+        write_png(path, canvas.rgba)
+    elif fmt == 'svg':
+        with SvgCanvas(path, model.width, model.height, scale, title=title,
+                       description='Rendered headless by gen-art') as canvas:
+            model.draw(canvas)
+    else:
+        raise ValueError(f"Unknown format '{fmt}'")
+    return path
+
+
+def render_range(demo, start, stop, seed=0, params=None, size=None, out_dir='.', fmt='png', scale=1.0):
+    # Frames start..stop-1, where frame n is the state after n + 1 steps
+    model = create_model(demo, seed, params, size)
+    paths = []
+    try:
+        for frame in range(stop):
+            draw = frame >= start
+            step_model(model, draw)
+            if draw:
+                path = frame_path(out_dir, demo, frame, fmt)
+                paths.append(render_frame(model, path, fmt, scale, TITLES.get(demo)))
+    finally:
+        if hasattr(model, 'close'):
+            model.close()  # e.g. fluid_flow's advection workers with --set processes=N
+    return paths
+
+
+def split_range(start, stop, parts):
+    # Contiguous chunks, so no worker replays more steps than the last frame needs
+    bounds = [start + (stop - start) * i // parts for i in range(parts + 1)]
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+
+def render(demo, frames, start=0, seed=0, params=None, size=None, out_dir='.', fmt='png',
+           scale=1.0, workers=1):
+    os.makedirs(out_dir, exist_ok=True)
+    stop = start + frames
+    if workers <= 1:
+        return render_range(demo, start, stop, seed, params, size, out_dir, fmt, scale)
+
+    paths = []
+    from concurrent.futures import ProcessPoolExecutor  # Only pays for multiprocessing when it is used
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(render_range, demo, lo, hi, seed, params, size, out_dir, fmt, scale)
+                for lo, hi in split_range(start, stop, workers)]
+        for job in jobs:
+            paths.extend(job.result())
+    return paths
+
+
+def parse_params(items):
+    # name=value pairs; values are Python literals, anything else stays a string
+    params = {}
+    for item in items:
+        name, _, value = item.partition('=')
+        try:
+            params[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            params[name] = value
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render gen-art frames to files without a display.')
+    parser.add_argument('demo', choices=sorted(MODELS))
+    parser.add_argument('--frames', type=int, default=1, help='number of frames to write')
+    parser.add_argument('--start', type=int, default=0, help='first frame to write')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', help='canvas size as WIDTHxHEIGHT (defaults to the demo\'s own)')
+    parser.add_argument('--scale', type=float, default=1.0, help='output pixels per canvas unit')
+    parser.add_argument('--format', choices=['png', 'svg'], default='png')
+    parser.add_argument('--out', default='frames', help='output directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='model parameter, e.g. --set num_particles=20000')
+    args = parser.parse_args(argv)
+
+    size = tuple(int(v) for v in args.size.lower().split('x')) if args.size else None
+    paths = render(args.demo, args.frames, args.start, args.seed, parse_params(args.set), size,
+                   args.out, args.format, args.scale, args.workers)
+    print(f"Wrote {len(paths)} frames to '{args.out}'")
+
+
+if __name__ == '__main__':
+    main()
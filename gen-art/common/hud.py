@@ -0,0 +1,35 @@
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QPainter
+
+# Frame-timing overlay drawn over a demo's canvas
+
+
+def hud_font():
+    font = QFont('Monospace', 8)
+    font.setStyleHint(QFont.TypeWriter)
+    return font
+
+
+def draw_hud(painter, profiler, x=8, y=8, extra=()):
+    # Summary box in the top-left corner, drawn with an active QPainter; extra lines go below the timings
+    lines = profiler.summary() + list(extra)
+    font = hud_font()
+    metrics = QFontMetrics(font)
+    width = max(metrics.horizontalAdvance(line) for line in lines) + 12
+    height = metrics.lineSpacing() * len(lines) + 8
+
+    painter.save()
+    painter.setRenderHint(QPainter.Antialiasing, False)
+    painter.fillRect(QRectF(x, y, width, height), QColor(0, 0, 0, 160))
+    painter.setFont(font)
+    painter.setPen(QColor(255, 255, 255))
+    painter.drawText(QRectF(x + 6, y + 4, width, height), Qt.AlignLeft | Qt.AlignTop, '\n'.join(lines))
+    painter.restore()
+
+
+def render_hud_gl(widget, profiler, x=8, y=8, extra=()):
+    # Same text for a QGLWidget, drawn from paintGL with renderText
+    font = hud_font()
+    spacing = QFontMetrics(font).lineSpacing()
+    for i, line in enumerate(profiler.summary() + list(extra)):
+        widget.renderText(x, y + spacing * (i + 1), line, font)
@@ -0,0 +1,97 @@
+import math
+
+import numba
+import numpy as np
+
+from common import kernels
+from common.perlin import GRAD_X, GRAD_Y, PERM
+
+# numba versions of the registered kernels, imported by kernels.use('numba').
+# Each fuses the reference's whole-array passes into one parallel loop per
+# element, so nothing is allocated per call. Compiled code is cached on disk
+# next to this file, so only the first run on a machine pays for compiling.
+
+
+@numba.njit(parallel=True, cache=True)
+def _advect(x, y, flow_scale, speed, time, width, height):
+    for i in numba.prange(x.shape[0]):
+        px = x[i]
+        py = y[i]
+        angle = (math.sin(px * flow_scale + time) + math.sin(py * flow_scale + time) +
+                 math.sin((px + py) * flow_scale + time)) * math.pi
+        px += math.cos(angle) * speed
+        py += math.sin(angle) * speed
+        x[i] = px - math.floor(px / width) * width
+        y[i] = py - math.floor(py / height) * height
+
+
+@kernels.register('advect', 'numba')
+def advect_arrays(x, y, angle, tmp, flow_scale, speed, time, width, height):
+    # angle and tmp are only needed by the reference
+    _advect(x, y, np.float32(flow_scale), np.float32(speed), np.float32(time), np.float32(width),
+            np.float32(height))
+
+
+@numba.njit(parallel=True, cache=True)
+def _orbit(points, time, speed, width, height):
+    count = points.shape[0]
+    step = 2 * math.pi / (count - 1) if count > 1 else 0.0
+    for i in numba.prange(count):
+        theta = i * step + time
+        points[i, 0] = (points[i, 0] + math.cos(theta) * speed) % width
+        points[i, 1] = (points[i, 1] + math.sin(theta) * speed) % height
+
+
+@kernels.register('orbit', 'numba')
+def orbit(points, time, speed, width, height):
+    _orbit(points, float(time), float(speed), float(width), float(height))
+
+
+@numba.njit(inline='always')
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+@numba.njit(inline='always')
+def _corner(kx, ky, dx, dy, perm, grad_x, grad_y):
+    h = perm[perm[(perm[kx & 255] + ky) & 255]] & 15
+    return grad_x[h] * dx + grad_y[h] * dy
+
+
+@numba.njit(inline='always')
+def _keys(coord, repeat, base):
+    cell = math.floor(math.fmod(coord, repeat))
+    return (int(cell) & 255) + base, (int(math.fmod(cell + 1, repeat)) & 255) + base
+
+
+@numba.njit(parallel=True, cache=True)
+def _perlin_layer(num_points, num_threads, scale, octave, seed, repeatx, repeaty, base, perm, grad_x, grad_y,
+                  out):
+    frequency = 2.0 ** octave
+    amplitude = 1 / (frequency ** 0.5)
+    for i in numba.prange(num_points):
+        x = (i / num_points) * scale * frequency + seed
+        i0, i1 = _keys(x, repeatx, base)
+        fx = x - math.floor(x)
+        u = _fade(fx)
+        for j in range(num_threads):
+            y = (j / num_threads) * scale * frequency + seed
+            j0, j1 = _keys(y, repeaty, base)
+            fy = y - math.floor(y)
+            v = _fade(fy)
+            n00 = _corner(i0, j0, fx, fy, perm, grad_x, grad_y)
+            n10 = _corner(i1, j0, fx - 1, fy, perm, grad_x, grad_y)
+            n01 = _corner(i0, j1, fx, fy - 1, perm, grad_x, grad_y)
+            n11 = _corner(i1, j1, fx - 1, fy - 1, perm, grad_x, grad_y)
+            nx0 = n00 + u * (n10 - n00)
+            nx1 = n01 + u * (n11 - n01)
+            out[i, j] = (nx0 + v * (nx1 - nx0)) * amplitude
+
+
+@kernels.register('perlin_layer', 'numba')
+def perlin_layer(num_points, num_threads, scale, octave, seed=0, repeatx=1024, repeaty=1024, base=0,
+                 perm=None, dtype=np.float64):
+    out = np.empty((num_points, num_threads), dtype=dtype)
+    _perlin_layer(num_points, num_threads, float(scale), octave, float(seed), float(repeatx), float(repeaty),
+                  base, PERM if perm is None else perm, GRAD_X, GRAD_Y, out)
+    return out
@@ -0,0 +1,181 @@
+import argparse
+import importlib
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+# Registry of the hot numeric kernels, each with a NumPy reference and
+# optional faster backends. The modules that own a kernel register the
+# reference and call it through get(), so the demos never name a backend:
+#
+#   @kernels.register('advect')
+#   def advect_arrays(x, y, ...): ...
+#   kernels.get('advect')(x, y, ...)
+#
+# The backend is picked once per process from GENART_BACKEND (numpy, numba or
+# auto for the fastest one installed), or set with use(). A backend is only
+# imported when it is picked, and kernels it doesn't implement fall back to
+# the reference. Outputs differ from the reference by float rounding, so
+# renders are only byte-identical within one backend.
+#
+#   python gen-art/common/kernels.py --list
+#   python gen-art/common/kernels.py --check             # every installed backend against numpy
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Backend -> (package it needs, module that registers its kernels), fastest first
+BACKENDS = {
+    'numba': ('numba', 'common.jit_kernels'),
+    'numpy': ('numpy', None),
+}
+# Modules that register the reference kernels, for --check and --list
+REFERENCE_MODULES = ('fluid_flow.particles', 'voronoi.model', 'common.perlin')
+
+_kernels = {}  # name -> {backend: function}
+_active = None
+
+
+def register(name, backend='numpy'):
+    def decorator(function):
+        _kernels.setdefault(name, {})[backend] = function
+        return function
+    return decorator
+
+
+def installed(backend):
+    return backend in BACKENDS and importlib.util.find_spec(BACKENDS[backend][0]) is not None
+
+
+def use(backend):
+    # Selects the backend for every later get(); 'auto' takes the fastest installed one
+    global _active
+    if backend == 'auto':
+        backend = next(name for name in BACKENDS if installed(name))
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown kernel backend '{backend}', expected one of {', '.join(BACKENDS)} or auto")
+    if not installed(backend):
+        raise ValueError(f"Kernel backend '{backend}' needs {BACKENDS[backend][0]}, which is not installed")
+    module = BACKENDS[backend][1]
+    if module is not None:
+        importlib.import_module(module)
+    _active = backend
+    return backend
+
+
+def backend():
+    # The selected backend, reading GENART_BACKEND the first time
+    if _active is None:
+        requested = os.environ.get('GENART_BACKEND', 'numpy').lower() or 'numpy'
+        try:
+            use(requested)
+        except ValueError as error:
+            print(f'{error}; using numpy', file=sys.stderr)
+            use('numpy')
+    return _active
+
+
+def get(name):
+    implementations = _kernels[name]
+    return implementations.get(backend(), implementations['numpy'])
+
+
+def implementations(name):
+    return dict(_kernels[name])
+
+
+# Parity cases: make(rng) builds fresh arguments, output(args, result) picks
+# what to compare, and period gives per-row wrap-around sizes so a particle
+# that wrapped to the other edge in one backend still counts as a match.
+
+def _advect_case(rng, count=20000, width=600, height=400):
+    x = rng.random(count, dtype=np.float32) * width
+    y = rng.random(count, dtype=np.float32) * height
+    angle = np.empty(count, dtype=np.float32)
+    tmp = np.empty(count, dtype=np.float32)
+    return [x, y, angle, tmp, 0.005, 1.5, 0.37, width, height]
+
+
+def _orbit_case(rng, count=5000, width=600, height=400):
+    return [rng.random((count, 2)) * [width, height], 1.85, 2.5, width, height]
+
+
+def _perlin_case(rng):
+    return [120, 40, 0.35, 3, 1.27, 1024, 1024, 7, None, np.float64]
+
+
+CASES = {
+    'advect': (_advect_case, lambda args, result: np.stack(args[:2]), lambda args: args[7:9]),
+    'orbit': (_orbit_case, lambda args, result: args[0].T, lambda args: args[3:5]),
+    'perlin_layer': (_perlin_case, lambda args, result: result, None),
+}
+TOLERANCE = {'advect': 1e-3, 'orbit': 1e-9, 'perlin_layer': 1e-6}
+
+
+def max_error(name, function, seed=0):
+    # Largest absolute difference between function and the numpy reference on the parity case
+    make, output, period = CASES[name]
+    results = []
+    for candidate in (_kernels[name]['numpy'], function):
+        args = make(np.random.default_rng(seed))
+        results.append(np.asarray(output(args, candidate(*args)), dtype=np.float64))
+    reference, other = results
+    difference = np.abs(other - reference)
+    if period is not None:
+        size = np.asarray(period(make(np.random.default_rng(seed))), dtype=np.float64)[:, None]
+        difference = np.minimum(difference, size - difference)
+    return float(difference.max()) if difference.size else 0.0
+
+
+def check(backends=None):
+    # [(kernel, backend, max error, tolerance, ok)] for every registered
+    # implementation of the given (default: all installed) backends
+    for module in REFERENCE_MODULES:
+        importlib.import_module(module)
+    results = []
+    for name in backends or [name for name in BACKENDS if installed(name)]:
+        module = BACKENDS[name][1]
+        if module is not None:
+            importlib.import_module(module)
+        for kernel in sorted(_kernels):
+            function = _kernels[kernel].get(name)
+            if function is None or kernel not in CASES:
+                continue
+            error = max_error(kernel, function)
+            results.append((kernel, name, error, TOLERANCE[kernel], error <= TOLERANCE[kernel]))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List the kernel backends or check them against numpy.')
+    parser.add_argument('--list', action='store_true', help='show the kernels and which backends implement them')
+    parser.add_argument('--check', action='store_true', help='compare every installed backend with numpy')
+    parser.add_argument('--backend', action='append', help='only check this backend (repeatable)')
+    args = parser.parse_args(argv)
+
+    for name in BACKENDS:
+        print(f"{name:<8}{'installed' if installed(name) else 'not installed'}")
+    if args.list:
+        for module in REFERENCE_MODULES:
+            importlib.import_module(module)
+        for name in BACKENDS:
+            if installed(name) and BACKENDS[name][1]:
+                importlib.import_module(BACKENDS[name][1])
+        for kernel in sorted(_kernels):
+            print(f"  {kernel:<14}{', '.join(sorted(_kernels[kernel]))}")
+    if not args.check:
+        return 0
+
+    failed = False
+    for kernel, name, error, tolerance, ok in check(args.backend):
+        print(f"  {kernel:<14}{name:<8}max error {error:.3g} (tolerance {tolerance:g}) {'ok' if ok else 'FAILED'}")
+        failed |= not ok
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    # Through the importable module, whose registry the kernel modules fill
+    from common.kernels import main
+    sys.exit(main())
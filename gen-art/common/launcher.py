@@ -0,0 +1,160 @@
+import importlib
+import os
+import runpy
+import subprocess
+import sys
+import time
+
+# One entry point for every demo and headless tool:
+#
+#   python -m pyx                        list what can be run
+#   python -m pyx fluid_flow             open a demo
+#   python -m pyx voronoi --startup      open it, report startup time after the first frame, quit
+#   python -m pyx fabric --timings       same, plus import time broken down by package
+#   python -m pyx render fluid_flow --frames 120 --out frames
+#
+# (`python -m pyx` from the directory above the checkout, or `python .` from
+# inside it.) Nothing is imported until a name is picked, so each demo only
+# loads its own backends: PyQt5 for the windows, plus scipy for voronoi,
+# PyOpenGL for fabric and matplotlib for fabric_basic. The headless tools
+# never import Qt.
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Demo name -> (module, description); demos with a main() are started through
+# it, the others are run as scripts
+DEMOS = {
+    'fluid_flow': ('fluid_flow.fluid_flow', 'particles following a flow field (PyQt5)'),
+    'voronoi': ('voronoi.voronoi_art', 'drifting Voronoi diagram (PyQt5, scipy)'),
+    'fabric': ('fabric.fabric', 'Perlin noise threads (PyQt5, PyOpenGL)'),
+    'fabric_basic': ('fabric.fabric_basic', 'Perlin noise threads (matplotlib)'),
+}
+
+# Headless tools, each module's main(argv)
+TOOLS = {
+    'render': ('common.headless', 'render frames to PNG or SVG without a display'),
+    'poster': ('common.poster', 'render one frame at print resolution in tiles'),
+    'sweep': ('common.sweep', 'render a contact sheet of parameter combinations'),
+    'recording': ('common.recording', 'record runs as compact positions and re-render them without simulating'),
+    'kernels': ('common.kernels', 'list the compute backends or check them against numpy'),
+}
+
+
+def usage():
+    lines = ['usage: python -m pyx <demo> [--startup | --timings] | <tool> [args]', '', 'demos:']
+    lines += [f'  {name:<14}{description}' for name, (_, description) in DEMOS.items()]
+    lines += ['', 'tools (see <tool> --help):']
+    lines += [f'  {name:<14}{description}' for name, (_, description) in TOOLS.items()]
+    return '\n'.join(lines)
+
+
+class StartupClock:
+    # Wall-clock marks since the launcher started, each reported as the time since the previous one
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self):
+        lines = []
+        previous = self.started
+        for name, at in self.marks:
+            lines.append(f'  {name:<22}{(at - previous) * 1000:8.1f} ms')
+            previous = at
+        lines.append(f"  {'total':<22}{(previous - self.started) * 1000:8.1f} ms")
+        return lines
+
+
+def run_demo(name, argv, startup=False):
+    module_name = DEMOS[name][0]
+    clock = StartupClock()
+    if startup and name == 'fabric_basic':
+        os.environ['MPLBACKEND'] = 'Agg'  # plt.show() returns at once instead of opening a window
+
+    if startup and name != 'fabric_basic':
+        # Quit as soon as the window has painted once
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QtCore import QTimer
+        clock.mark('import PyQt5')
+        app = QApplication.instance() or QApplication([sys.argv[0]] + argv)
+        clock.mark('QApplication')
+
+        def first_frame():
+            for widget in app.topLevelWidgets():
+                if widget.isVisible():
+                    widget.repaint()
+            clock.mark('window + first frame')
+            app.quit()
+        QTimer.singleShot(0, first_frame)
+
+    module = importlib.import_module(module_name) if name != 'fabric_basic' else None
+    if module is not None:
+        clock.mark(f'import {module_name}')
+        status = module.main([sys.argv[0]] + argv)
+    else:
+        runpy.run_module(module_name, run_name='__main__')
+        clock.mark(f'run {module_name}')
+        status = 0
+
+    if startup:
+        print(f'startup of {name}:')
+        print('\n'.join(clock.report()))
+    return status
+
+
+def import_breakdown(stderr, top=10):
+    # Sums `python -X importtime` self times by top-level package, largest first
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        head, _, name = line.split('|', 2)
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(head.split(':')[1])
+    ranked = sorted(totals.items(), key=lambda item: -item[1])
+    lines = [f'  {package:<22}{us / 1000:8.1f} ms' for package, us in ranked[:top]]
+    rest = sum(us for _, us in ranked[top:])
+    lines.append(f"  {'(other)':<22}{rest / 1000:8.1f} ms")
+    lines.append(f"  {'total':<22}{sum(totals.values()) / 1000:8.1f} ms")
+    return lines
+
+
+def timings(name, argv):
+    # Runs the demo with --startup in a fresh interpreter under -X importtime
+    command = [sys.executable, '-X', 'importtime', os.path.abspath(__file__), name, '--startup'] + argv
+    result = subprocess.run(command, capture_output=True, text=True)
+    sys.stdout.write(result.stdout)
+    print(f'import time of {name} by package:')
+    print('\n'.join(import_breakdown(result.stderr)))
+    if result.returncode:
+        sys.stderr.write(result.stderr[-2000:])
+    return result.returncode
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0
+    name, rest = argv[0], argv[1:]
+    if name in TOOLS:
+        module = importlib.import_module(TOOLS[name][0])
+        return module.main(rest) or 0
+    if name not in DEMOS:
+        print(f"Unknown demo or tool '{name}'\n\n{usage()}", file=sys.stderr)
+        return 2
+    if '--timings' in rest:
+        rest.remove('--timings')
+        return timings(name, rest)
+    startup = '--startup' in rest
+    if startup:
+        rest.remove('--startup')
+    return run_demo(name, rest, startup)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
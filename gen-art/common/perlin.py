@@ -0,0 +1,167 @@
+import numpy as np
+
+from common import kernels
+
+# Vectorized 2D Perlin noise that reproduces noise.pnoise2 (octaves=1) for whole
+# grids at once. The same permutation, gradient table, fade curve and
+# repeatx/repeaty/base handling are used, so fields match the C version to
+# float32 precision.
+
+# Ken Perlin's reference permutation (the table used by the noise package)
+PERM = np.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225,
+    140, 36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148,
+    247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32,
+    57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175,
+    74, 165, 71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122,
+    60, 211, 133, 230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54,
+    65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169,
+    200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64,
+    52, 217, 226, 250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212,
+    207, 206, 59, 227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213,
+    119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9,
+    129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104,
+    218, 246, 97, 228, 251, 34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241,
+    81, 51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31, 181, 199, 106, 157,
+    184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93,
+    222, 114, 67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180,
+], dtype=np.int64)
+
+# x/y components of the 16 gradient directions used by grad2
+GRAD_X = np.array([1, -1, 1, -1, 1, -1, 1, -1, 0, 0, 0, 0, 1, -1, 0, 0], dtype=np.float64)
+GRAD_Y = np.array([1, 1, -1, -1, 0, 0, 0, 0, 1, -1, 1, -1, 0, 0, -1, 1], dtype=np.float64)
+
+
+def make_permutation(seed):
+    # A shuffled permutation table for noise that differs from the reference one
+    return np.random.default_rng(seed).permutation(256).astype(np.int64)
+
+
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def _lattice_keys(coords, repeat, base):
+    # Hash keys of the two lattice corners around each coordinate, wrapped the
+    # same way as the C code (fmod by repeat, then & 255, then offset by base)
+    cell = np.floor(np.fmod(coords, repeat))
+    nxt = np.fmod(cell + 1, repeat)
+    k0 = (cell.astype(np.int64) & 255) + base
+    k1 = (nxt.astype(np.int64) & 255) + base
+    return k0, k1
+
+
+def _gradient_hash(kx, ky, perm):
+    # Index with & 255 so any base stays inside the table (the C version reads
+    # past its 512 entries for base > 0)
+    return perm[perm[(perm[kx & 255] + ky) & 255]] & 15
+
+
+def pnoise2(x, y, repeatx=1024, repeaty=1024, base=0, perm=None):
+    # Elementwise single-octave noise for arrays of arbitrary (broadcastable) shape
+    perm = PERM if perm is None else perm
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    i0, i1 = _lattice_keys(x, repeatx, base)
+    j0, j1 = _lattice_keys(y, repeaty, base)
+    fx = x - np.floor(x)
+    fy = y - np.floor(y)
+    u = _fade(fx)
+    v = _fade(fy)
+
+    def corner(ki, kj, dx, dy):
+        h = _gradient_hash(ki, kj, perm)
+        return GRAD_X[h] * dx + GRAD_Y[h] * dy
+
+    n00 = corner(i0, j0, fx, fy)
+    n10 = corner(i1, j0, fx - 1, fy)
+    n01 = corner(i0, j1, fx, fy - 1)
+    n11 = corner(i1, j1, fx - 1, fy - 1)
+    nx0 = n00 + u * (n10 - n00)
+    nx1 = n01 + u * (n11 - n01)
+    return nx0 + v * (nx1 - nx0)
+
+
+def _axis_weights(coords, repeat, base):
+    # Noise is bilinear in the per-axis corner weights, so each axis reduces to
+    # two (len(coords), n_keys) matrices over the lattice keys it touches. Each
+    # row has at most two nonzeros, but they are kept dense: n_keys is only the
+    # number of lattice cells the axis spans, and dense blocks let the layer be
+    # one BLAS matrix product.
+    #   blend[r, k]  = fade weight of corner k for coordinate r
+    #   offset[r, k] = fade weight times the distance to corner k
+    k0, k1 = _lattice_keys(coords, repeat, base)
+    keys, inverse = np.unique(np.concatenate([k0, k1]), return_inverse=True)
+    n = len(coords)
+    c0, c1 = inverse[:n], inverse[n:]
+    f = coords - np.floor(coords)
+    w = _fade(f)
+
+    rows = np.arange(n)
+    blend = np.zeros((n, len(keys)))
+    offset = np.zeros((n, len(keys)))
+    blend[rows, c0] += 1 - w
+    blend[rows, c1] += w
+    offset[rows, c0] += (1 - w) * f
+    offset[rows, c1] += w * (f - 1)
+    return keys, blend, offset
+
+
+def _octave_blocks(num_points, num_threads, scale, octave, seed, repeatx, repeaty, base, perm):
+    frequency = 2 ** octave
+    amplitude = 1 / (frequency ** 0.5)
+    x = (np.arange(num_points) / num_points) * scale * frequency + seed
+    y = (np.arange(num_threads) / num_threads) * scale * frequency + seed
+    kx, blend_x, offset_x = _axis_weights(x, repeatx, base)
+    ky, blend_y, offset_y = _axis_weights(y, repeaty, base)
+    h = _gradient_hash(kx[:, None], ky[None, :], perm)
+    gx = GRAD_X[h] * amplitude
+    gy = GRAD_Y[h] * amplitude
+
+    # noise = offset_x @ gx @ blend_y.T + blend_x @ gy @ offset_y.T; fold the
+    # gradient tables into whichever side keeps the shared inner dimension small
+    if len(kx) <= len(ky):
+        return [offset_x, blend_x], [gx @ blend_y.T, gy @ offset_y.T]
+    return [offset_x @ gx, blend_x @ gy], [blend_y.T, offset_y.T]
+
+
+@kernels.register('perlin_layer')
+def perlin_layer(num_points, num_threads, scale, octave, seed=0, repeatx=1024, repeaty=1024, base=0,
+                 perm=None, dtype=np.float64):
+    # One amplitude-weighted octave of multi_layer_perlin_noise
+    perm = PERM if perm is None else perm
+    left, right = _octave_blocks(num_points, num_threads, scale, octave, seed, repeatx, repeaty, base, perm)
+    return np.hstack(left).astype(dtype, copy=False) @ np.vstack(right).astype(dtype, copy=False)
+
+
+def multi_layer_perlin_noise(num_points, num_threads, scale, octaves, seed=0, repeatx=1024, repeaty=1024, base=0,
+                             perm=None, dtype=np.float64):
+    # Same field as summing pnoise2(x, y) * amplitude over every (octave, point,
+    # thread), computed for all octaves with a single matrix product. float32
+    # halves the cost of that product and is as precise as the C version.
+    perm = PERM if perm is None else perm
+    if octaves < 1:
+        return np.zeros((num_points, num_threads), dtype=dtype)
+    left, right = [], []
+    for octave in range(octaves):
+        l, r = _octave_blocks(num_points, num_threads, scale, octave, seed, repeatx, repeaty, base, perm)
+        left += l
+        right += r
+    return np.hstack(left).astype(dtype, copy=False) @ np.vstack(right).astype(dtype, copy=False)
+
+
+def multi_layer_perlin_points(u, v, scale, octaves, seed=0, repeatx=1024, repeaty=1024, base=0, perm=None):
+    # multi_layer_perlin_noise at arbitrary positions instead of a whole grid:
+    # u and v are fractions along each axis, so u = i / num_points and
+    # v = j / num_threads give field[i, j]. For callers that only need some
+    # of the grid, or points between its rows.
+    perm = PERM if perm is None else perm
+    u = np.asarray(u, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    total = np.zeros(np.broadcast(u, v).shape)
+    for octave in range(octaves):
+        frequency = 2 ** octave
+        amplitude = 1 / (frequency ** 0.5)
+        total += pnoise2(u * scale * frequency + seed, v * scale * frequency + seed,
+                         repeatx, repeaty, base, perm) * amplitude
+    return total
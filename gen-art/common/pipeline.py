@@ -0,0 +1,147 @@
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+
+from common.profiling import FrameProfiler
+
+
+class SimulationPipeline:
+    # Steps a demo model on a worker thread at its own rate and hands finished
+    # frames to the GUI through two buffers. After each step the worker copies
+    # the drawable state into the back buffer with model.snapshot(back) and
+    # swaps it with the front buffer, which the GUI reads under the same lock
+    # in front(). A frame that is replaced before it was ever displayed is
+    # dropped, not queued, and a worker that falls behind skips ticks instead
+    # of running late steps back to back.
+    #
+    # The worker owns the model while running. Parameter changes and resets
+    # from the GUI go through set() and call(), which run them between steps.
+    # Until start() is called, step() runs everything on the caller's thread.
+    # Steps are timed under the 'simulation' stage of the given profiler.
+    #
+    # Every published snapshot is also passed to each callable in listeners,
+    # on the thread that published it (e.g. a Recorder). The buffer is reused
+    # two frames later, so listeners that keep it must copy it.
+    #
+    # An exception on the worker (from the model, its snapshot or a listener)
+    # stops it and is kept in error for the GUI to report; start() clears it.
+
+    def __init__(self, model, rate=60, profiler=None):
+        self.model = model
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        self.rate = rate  # Simulation steps per second, independent of the repaint timer
+        self.frame = 0  # Number of frames published so far
+        self.steps = 0
+        self.dropped = 0  # Published frames that were never displayed
+        self.skipped = 0  # Ticks the worker could not keep up with
+        self.step_time = 0.0  # Seconds taken by the last step, snapshot included
+        self.listeners = []
+        self.error = None
+        self._front = None
+        self._back = None
+        self._displayed = True
+        self._lock = threading.Lock()
+        self._commands = deque()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, rate=None):
+        if rate is not None:
+            self.rate = rate
+        if self.running:
+            return
+        self.error = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='simulation', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def set(self, **attrs):
+        # Assign model attributes between steps
+        self.call(lambda model: [setattr(model, name, value) for name, value in attrs.items()])
+
+    def call(self, fn):
+        # Run fn(model) between steps; when not running it runs now and the
+        # result is published so the next repaint shows it
+        if self.running:
+            self._commands.append(fn)
+        else:
+            fn(self.model)
+            self._publish()
+
+    def step(self):
+        # One synchronous step, for use without a worker thread
+        self._apply_commands()
+        self._step()
+
+    @contextmanager
+    def front(self):
+        # Latest published frame, or None before the first one. The worker
+        # cannot swap buffers until the with block ends, so draw inside it.
+        with self._lock:
+            self._displayed = True
+            yield self._front
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'frames': self.frame,
+            'steps': self.steps,
+            'dropped': self.dropped,
+            'skipped': self.skipped,
+            'step_ms': self.step_time * 1000,
+        }
+
+    def _apply_commands(self):
+        while self._commands:
+            self._commands.popleft()(self.model)
+
+    def _step(self):
+        started = time.perf_counter()
+        with self.profiler.stage('simulation'):
+            self.model.step()
+        self.steps += 1
+        self._publish()
+        self.step_time = time.perf_counter() - started
+
+    def _publish(self):
+        back = self.model.snapshot(self._back)
+        with self._lock:
+            if not self._displayed:
+                self.dropped += 1
+            self._back, self._front = self._front, back
+            self._displayed = False
+            self.frame += 1
+        for listener in list(self.listeners):
+            listener(back)
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                self._apply_commands()
+                self._step()
+
+                interval = 1.0 / self.rate
+                next_tick += interval
+                now = time.perf_counter()
+                if now > next_tick + interval:
+                    # More than a whole tick late: resynchronize rather than catch up
+                    self.skipped += int((now - next_tick) / interval)
+                    next_tick = now
+                self._stop.wait(max(next_tick - now, 0))
+        except Exception as error:
+            traceback.print_exc(file=sys.stderr)
+            self.error = error
@@ -0,0 +1,65 @@
+import struct
+import zlib
+
+import numpy as np
+
+# Minimal PNG encoder (stdlib zlib + NumPy) so frames can be saved without Qt
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+COLOR_TYPES = {1: 0, 3: 2, 4: 6}  # channels -> PNG color type (gray, RGB, RGBA)
+
+
+def png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def png_header(width, height, channels):
+    return PNG_SIGNATURE + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, COLOR_TYPES[channels], 0, 0, 0))
+
+
+def scanlines(pixels):
+    # Prefix every row with filter type 0 (None)
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    height = pixels.shape[0]
+    raw = np.zeros((height, 1 + pixels[0].size), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, -1)
+    return raw
+
+
+def encode_png(pixels, compress_level=6):
+    # pixels is an (height, width) gray or (height, width, 3|4) RGB(A) uint8 array
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    channels = pixels.shape[2] if pixels.ndim == 3 else 1
+    data = zlib.compress(scanlines(pixels).tobytes(), compress_level)
+    return png_header(width, height, channels) + png_chunk(b'IDAT', data) + png_chunk(b'IEND', b'')
+
+
+def write_png(path, pixels, compress_level=6):
+    with open(path, 'wb') as f:
+        f.write(encode_png(pixels, compress_level))
+
+
+def write_png_stream(path, pixels, rows=256, compress_level=6, chunk_size=1 << 20):
+    # Same file as write_png, but the image is read and compressed `rows` rows
+    # at a time and written as a series of IDAT chunks, so pixels can be a
+    # numpy.memmap far larger than memory
+    height, width = pixels.shape[:2]
+    channels = pixels.shape[2] if pixels.ndim == 3 else 1
+    compressor = zlib.compressobj(compress_level)
+    with open(path, 'wb') as f:
+        f.write(png_header(width, height, channels))
+        pending = []
+        pending_size = 0
+        for top in range(0, height, rows):
+            data = compressor.compress(scanlines(pixels[top:top + rows]).tobytes())
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size >= chunk_size:
+                f.write(png_chunk(b'IDAT', b''.join(pending)))
+                pending = []
+                pending_size = 0
+        pending.append(compressor.flush())
+        f.write(png_chunk(b'IDAT', b''.join(pending)))
+        f.write(png_chunk(b'IEND', b''))
@@ -0,0 +1,151 @@
+import argparse
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+
+import numpy as np
+
+# Print-resolution rasters of a demo frame, far beyond the widget size. The
+# output is split into tiles that are drawn from the same model state by a
+# process pool, each straight into a numpy.memmap scratch image on disk, which
+# is then streamed to a tiled TIFF or a PNG written in row bands. Peak memory
+# is a few tiles per worker, not the whole image.
+#
+# RasterCanvas maps canvas units to pixels with the same scale in every tile
+# and only shifts whole pixels by the tile origin, so antialiased lines and
+# splats that cross a tile border come out exactly as in one big render.
+#
+#   python gen-art/common/poster.py fluid_flow --steps 300 --scale 16 --out poster.tif
+#   python gen-art/common/poster.py fabric --set num_threads=80 --scale 20 --dpi 300 --out fabric.png
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.headless import MODELS, create_model, parse_params, step_model
+from common.png import write_png_stream
+from common.raster import RasterCanvas
+from common.tiff import write_tiled_tiff
+
+
+def tile_boxes(width, height, tile):
+    # (left, top, width, height) of each tile, row by row
+    return [(left, top, min(tile, width - left), min(tile, height - top))
+            for top in range(0, height, tile) for left in range(0, width, tile)]
+
+
+def render_tile(model, state, image, scale, box):
+    left, top, width, height = box
+    canvas = RasterCanvas(width, height, scale, origin=(left, top))
+    model.draw(canvas, state)
+    image[top:top + height, left:left + width] = canvas.rgba[..., :3]
+
+
+# Per-worker copies of the model, its state and the open scratch image, set
+# up once by the pool initializer instead of being pickled with every tile
+_worker = {}
+
+
+def _init_worker(model, state, image_path, scale):
+    _worker.update(model=model, state=state, scale=scale,
+                   image=np.load(image_path, mmap_mode='r+'))
+
+
+def _render_tile(box):
+    render_tile(_worker['model'], _worker['state'], _worker['image'], _worker['scale'], box)
+    _worker['image'].flush()
+    return box
+
+
+def render_poster(model, path, scale, state=None, tile=2048, workers=None, dpi=None):
+    # Draws model (or a snapshot() state of it) at scale output pixels per
+    # canvas unit into path, a .tif/.tiff or .png. Returns the pixel size.
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.tif', '.tiff', '.png'):
+        raise ValueError(f"Posters are written as .tif or .png, not '{path}'")
+    if state is None:
+        state = model.snapshot()
+    width, height = round(model.width * scale), round(model.height * scale)
+    workers = workers or os.cpu_count() or 1
+
+    scratch = path + '.scratch.npy'
+    image = np.lib.format.open_memmap(scratch, mode='w+', dtype=np.uint8, shape=(height, width, 3))
+    try:
+        boxes = tile_boxes(width, height, tile)
+        if workers <= 1 or len(boxes) == 1:
+            for box in boxes:
+                render_tile(model, state, image, scale, box)
+        else:
+            from concurrent.futures import ProcessPoolExecutor  # Only pays for multiprocessing when it is used
+            # Spawned rather than forked, so the workers don't inherit a window's threads
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(model, state, scratch, scale)) as pool:
+                for _ in pool.map(_render_tile, boxes):
+                    pass
+        image.flush()
+
+        if extension == '.png':
+            write_png_stream(path, image)
+        else:
+            write_tiled_tiff(path, image, dpi=dpi)
+    finally:
+        del image
+        os.remove(scratch)
+    return width, height
+
+
+class PosterJob:
+    # render_poster on a background thread, so a window stays responsive
+    # while a large poster renders. The model and state are copied first (the
+    # way the tile workers get them), so the simulation can go on as soon as
+    # the job has started. Poll done(); size or error holds the outcome.
+
+    def __init__(self, model, path, scale, state=None, **options):
+        self.path = path
+        self.size = None
+        self.error = None
+        model, state = pickle.loads(pickle.dumps((model, model.snapshot() if state is None else state)))
+        self._thread = threading.Thread(target=self._run, args=(model, path, scale, state, options),
+                                        name='poster', daemon=True)
+        self._thread.start()
+
+    def _run(self, model, path, scale, state, options):
+        try:
+            self.size = render_poster(model, path, scale, state, **options)
+        except Exception as error:
+            self.error = error
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def wait(self):
+        self._thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render one gen-art frame at print resolution.')
+    parser.add_argument('demo', choices=sorted(MODELS))
+    parser.add_argument('--steps', type=int, default=1, help='simulation steps before the frame is drawn')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', help='canvas size as WIDTHxHEIGHT (defaults to the demo\'s own)')
+    parser.add_argument('--scale', type=float, default=16.0, help='output pixels per canvas unit')
+    parser.add_argument('--tile', type=int, default=2048, help='pixels per side of each rendered tile')
+    parser.add_argument('--dpi', type=float, help='resolution to record in the TIFF')
+    parser.add_argument('--out', default='poster.tif', help='output .tif or .png')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='model parameter, e.g. --set num_particles=20000')
+    args = parser.parse_args(argv)
+
+    size = tuple(int(v) for v in args.size.lower().split('x')) if args.size else None
+    model = create_model(args.demo, args.seed, parse_params(args.set), size)
+    for step in range(args.steps):
+        step_model(model, step == args.steps - 1)
+    width, height = render_poster(model, args.out, args.scale, tile=args.tile, workers=args.workers,
+                                  dpi=args.dpi)
+    print(f"Wrote {width}x{height} poster to '{args.out}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import os
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+# Per-stage frame timing. Code under measurement is wrapped in
+# `with profiler.stage('paint'):`; durations go into a fixed-size ring buffer
+# per stage and stats() summarizes them. A disabled profiler hands out one
+# shared no-op context, so the hooks can stay in place at negligible cost.
+#
+# Set GENART_PROFILE=1 to profile the demos from the start, or
+# GENART_PROFILE=hud to also draw the numbers over the canvas.
+
+_NULL_STAGE = nullcontext()
+
+
+class RingBuffer:
+    # Last `size` samples in a preallocated float64 array
+
+    def __init__(self, size):
+        self.samples = np.zeros(size)
+        self.index = 0
+        self.count = 0
+
+    def append(self, value):
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % len(self.samples)
+        self.count = min(self.count + 1, len(self.samples))
+
+    def values(self):
+        return self.samples[:self.count]
+
+    def clear(self):
+        self.index = 0
+        self.count = 0
+
+
+class _Stage:
+    # Reusable timing context for one stage; stages with different names may nest
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.started = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.buffer.append((time.perf_counter_ns() - self.started) / 1e6)
+
+
+class FrameProfiler:
+    # Stage durations in milliseconds plus displayed-frame timestamps for the
+    # achieved frame rate. target_fps is what the demo's QTimer aims for.
+
+    def __init__(self, enabled=False, size=240, target_fps=None):
+        self.enabled = enabled
+        self.size = size
+        self.target_fps = target_fps
+        self.hud = False  # Whether the demo should draw the overlay
+        self.buffers = {}
+        self._stages = {}
+        self._frames = RingBuffer(size)
+        self._last_frame = None
+
+    @classmethod
+    def from_env(cls, target_fps=None, variable='GENART_PROFILE'):
+        value = os.environ.get(variable, '').lower()
+        profiler = cls(enabled=value not in ('', '0', 'off'), target_fps=target_fps)
+        profiler.hud = value == 'hud'
+        return profiler
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage(self._buffer(name))
+        return stage
+
+    def record(self, name, milliseconds):
+        if self.enabled:
+            self._buffer(name).append(milliseconds)
+
+    def frame(self):
+        # Call once per displayed frame; the interval between calls gives the FPS
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        if self._last_frame is not None:
+            self._frames.append((now - self._last_frame) / 1e6)
+        self._last_frame = now
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self._last_frame = None
+
+    def clear(self):
+        for buffer in self.buffers.values():
+            buffer.clear()
+        self._frames.clear()
+        self._last_frame = None
+
+    def _buffer(self, name):
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = self.buffers[name] = RingBuffer(self.size)
+        return buffer
+
+    def stats(self):
+        # {'stages': {name: {p50, p95, max, count}}, 'fps': achieved, 'target_fps': ...}
+        stages = {}
+        for name, buffer in list(self.buffers.items()):  # The simulation thread may add a stage meanwhile
+            values = buffer.values()
+            if len(values):
+                p50, p95 = np.percentile(values, [50, 95])
+                stages[name] = {'p50': float(p50), 'p95': float(p95),
+                                'max': float(values.max()), 'count': buffer.count}
+        intervals = self._frames.values()
+        fps = 1000 / float(np.median(intervals)) if len(intervals) else 0.0
+        return {'stages': stages, 'fps': fps, 'target_fps': self.target_fps}
+
+    def summary(self):
+        # Text lines for the overlay or a log
+        stats = self.stats()
+        target = f" / {stats['target_fps']:.0f}" if stats['target_fps'] else ''
+        lines = [f"{stats['fps']:5.1f}{target} fps"]
+        for name, s in sorted(stats['stages'].items()):
+            lines.append(f"{name:<10} p50 {s['p50']:6.2f}  p95 {s['p95']:6.2f}  max {s['max']:6.2f} ms")
+        return lines
@@ -0,0 +1,30 @@
+import numpy as np
+from PyQt5 import sip
+from PyQt5.QtCore import QPointF
+from PyQt5.QtGui import QPolygonF
+
+# Fill Qt geometry straight from NumPy arrays instead of building one QPointF
+# per vertex in Python
+
+
+def polygon_from_array(points):
+    # points is an (n, 2) array; QPolygonF stores its points as packed doubles
+    points = np.asarray(points, dtype=np.float64)
+    polygon = QPolygonF(len(points))
+    if len(points):
+        buffer = polygon.data()
+        buffer.setsize(points.nbytes)
+        np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)[:] = points
+    return polygon
+
+
+def point_pairs_from_array(segments):
+    # segments is an (n, 2, 2) array; the result can be passed to
+    # QPainter.drawLines to draw all n lines in one call
+    segments = np.asarray(segments, dtype=np.float64)
+    pairs = sip.array(QPointF, 2 * len(segments))
+    if len(segments):
+        buffer = sip.voidptr(pairs)
+        buffer.setsize(segments.nbytes)
+        np.frombuffer(buffer, dtype=np.float64).reshape(segments.shape)[:] = segments
+    return pairs
@@ -0,0 +1,93 @@
+import math
+
+import numpy as np
+
+from common.profiling import RingBuffer
+
+# Holds a demo at its frame budget by trading detail for speed. The window
+# feeds each displayed frame's cost (step plus paint time) to observe(); the
+# controller keeps the median of the last `window` frames and moves a
+# quality level, and values() scales the parameters the sliders asked for by
+# it. With max_quality on, values() passes the requests through untouched,
+# e.g. before an export.
+#
+#   quality = QualityController({'num_particles': scaled(100)}, budget_ms=1000 / 60)
+#   quality.request(num_particles=20000)
+#   if quality.observe(step_ms, paint_ms):
+#       pipeline.set(**quality.values())
+
+
+def scaled(minimum=1):
+    # Knob that scales a count by the quality, never below minimum
+    return lambda value, quality: max(min(minimum, value), round(value * quality))
+
+
+class QualityController:
+    # Quality is step ** level, from 1 at level 0 down to min_quality. A
+    # median cost above `high` times the budget drops enough levels to get
+    # back under it at once (cost is taken to scale with quality). Quality is
+    # only raised one level at a time, and only when the cost predicted for
+    # the next level stays under `low` times the budget, so a level that
+    # would overshoot is never tried and the level doesn't flip back and
+    # forth around the budget. Samples from before a change are discarded,
+    # so every decision waits for a full window at the new level.
+
+    def __init__(self, knobs, budget_ms, window=30, high=1.0, low=0.75, step=0.8, min_quality=0.1):
+        self.knobs = knobs  # name -> knob(requested value, quality) -> value to use
+        self.budget_ms = budget_ms
+        self.high = high
+        self.low = low
+        self.step = step
+        self.max_level = int(math.floor(math.log(min_quality) / math.log(step) + 1e-9))
+        self.level = 0
+        self.max_quality = False
+        self.requested = {}
+        self.samples = RingBuffer(window)
+
+    @property
+    def quality(self):
+        return 1.0 if self.max_quality else self.step ** self.level
+
+    def request(self, **values):
+        # The parameters the user picked; knobs scale them by the quality
+        self.requested.update(values)
+
+    def values(self):
+        # Parameters to apply at the current quality
+        quality = self.quality
+        return {name: self.knobs[name](value, quality) if name in self.knobs and quality < 1 else value
+                for name, value in self.requested.items()}
+
+    def set_max_quality(self, enabled):
+        self.max_quality = enabled
+        self.samples.clear()
+
+    def cost(self):
+        # Median frame cost in ms over the window, None until it has filled
+        values = self.samples.values()
+        return float(np.median(values)) if self.samples.count == len(self.samples.samples) else None
+
+    def observe(self, step_ms, paint_ms=0.0):
+        # Feeds one frame's cost; returns True when the level changed and values() should be applied
+        if self.max_quality:
+            return False
+        self.samples.append(step_ms + paint_ms)
+        cost = self.cost()
+        if cost is None:
+            return False
+        load = cost / self.budget_ms
+        level = self.level
+        if load > self.high:
+            level += math.ceil(math.log(load / self.high) / -math.log(self.step))
+        elif load / self.step < self.low:
+            level -= 1
+        level = min(max(level, 0), self.max_level)
+        if level == self.level:
+            return False
+        self.level = level
+        self.samples.clear()
+        return True
+
+    def summary(self):
+        # Text line for the overlay
+        return 'quality    max' if self.max_quality else f'quality    {self.quality:4.0%}  budget {self.budget_ms:.1f} ms'
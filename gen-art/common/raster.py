@@ -0,0 +1,172 @@
+import numpy as np
+
+# Qt-free drawing target for headless rendering. Demo models draw onto a
+# RasterCanvas or an SvgCanvas through the same three calls, points(),
+# segments() and polylines(), in their own canvas coordinates. The canvas maps
+# them to pixels with a uniform scale and an integer pixel origin, so a frame
+# can be drawn at a larger size or split into tiles without the model knowing.
+
+
+def rgb_array(colors, count):
+    # A gray level, one (r, g, b) color, or (n, 1) grays / (n, 3) colors per item -> (n, 3) uint8
+    colors = np.asarray(colors, dtype=np.uint8)
+    if colors.ndim == 0:
+        colors = np.repeat(colors, 3)
+    return np.broadcast_to(colors, (count, 3))
+
+
+class RasterCanvas:
+    # RGBA8888 pixels plus the canvas -> pixel mapping pixel = point * scale - origin.
+    # Points are opaque squares; lines are antialiased by splatting samples taken
+    # every half pixel along them with bilinear weights, then blended over the
+    # canvas once per call. All sums run in a fixed order and the origin is only
+    # subtracted from whole pixel indices, so identical inputs give identical
+    # bytes and a tile matches the same region of a full-size render exactly.
+
+    sample_spacing = 0.5
+    chunk_samples = 1 << 20
+
+    def __init__(self, width, height, scale=1.0, origin=(0, 0), background=(255, 255, 255)):
+        self.width = int(width)
+        self.height = int(height)
+        self.scale = float(scale)
+        self.origin = (int(origin[0]), int(origin[1]))
+        self.rgba = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        self.rgba[..., :3] = background
+        self.rgba[..., 3] = 255
+
+    def to_pixels(self, points):
+        # Scaled but not shifted; see _index for the origin
+        return np.asarray(points, dtype=np.float64) * self.scale
+
+    def _index(self, px, py):
+        # Flat pixel index of whole-pixel coordinates, or -1 outside the canvas
+        px = px - self.origin[0]
+        py = py - self.origin[1]
+        inside = (px >= 0) & (px < self.width) & (py >= 0) & (py < self.height)
+        return np.where(inside, py * self.width + px, -1)
+
+    def points(self, points, colors, size=1):
+        # Square splats of size canvas units, like a QPen of that width drawing a point
+        points = self.to_pixels(points).reshape(-1, 2)
+        if not len(points):
+            return
+        colors = rgb_array(colors, len(points))
+        ix = np.floor(points[:, 0]).astype(np.intp)
+        iy = np.floor(points[:, 1]).astype(np.intp)
+        pixels = self.rgba.reshape(-1, 4)
+
+        size = max(int(round(size * self.scale)), 1)
+        offsets = np.arange(-(size // 2), size - size // 2)
+        for dy in offsets:
+            for dx in offsets:
+                index = self._index(ix + dx, iy + dy)
+                inside = index >= 0
+                pixels[index[inside], :3] = colors[inside]
+
+    def polylines(self, lines, colors, width=1.0, alpha=1.0):
+        # lines is (n, points, 2); colors is one color or one per line
+        lines = np.asarray(lines, dtype=np.float64)
+        num_lines, num_points = lines.shape[:2]
+        if num_points < 2:
+            return
+        segments = np.stack([lines[:, :-1], lines[:, 1:]], axis=2).reshape(-1, 2, 2)
+        colors = np.repeat(rgb_array(colors, num_lines), num_points - 1, axis=0)
+        self.segments(segments, colors, width, alpha)
+
+    def segments(self, segments, colors, width=1.0, alpha=1.0):
+        # segments is (n, 2, 2); colors is one color or one per segment
+        segments = self.to_pixels(segments).reshape(-1, 2, 2)
+        if not len(segments):
+            return
+        colors = rgb_array(colors, len(segments)).astype(np.float64)
+        if (colors == colors[:, :1]).all():
+            colors = colors[:, :1]  # Gray lines only need one color channel accumulated
+        line_width = width * self.scale
+        # Wide lines are drawn as parallel strands at most a pixel apart
+        strands = max(int(np.ceil(line_width)), 1)
+        strand_weight = min(line_width, 1.0) if strands == 1 else line_width / strands
+        strand_offsets = (np.arange(strands) + 0.5 - strands / 2) * (line_width / strands)
+
+        size = self.width * self.height
+        coverage = np.zeros(size)
+        color_sum = np.zeros((colors.shape[1], size))
+
+        start = np.asarray(segments[:, 0])
+        delta = segments[:, 1] - segments[:, 0]
+        length = np.sqrt((delta ** 2).sum(axis=1))
+        normal = np.stack([-delta[:, 1], delta[:, 0]], axis=1) / np.maximum(length, 1e-12)[:, None]
+        samples = np.maximum(np.ceil(length / self.sample_spacing), 1).astype(np.intp)
+        # Only samples that can touch the canvas are generated; they sit at the
+        # same positions as in an unclipped render
+        first, last = self._visible_samples(start, delta, samples, line_width / 2 + 2)
+
+        # Chunk boundaries depend only on the segments, never on the canvas size
+        ends = np.cumsum(samples)
+        chunk_id = (ends - 1) // self.chunk_samples
+        bounds = np.flatnonzero(np.diff(chunk_id)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(segments)]):
+            counts = np.maximum(last[lo:hi] - first[lo:hi], 0)
+            if not counts.any():
+                continue
+            owner = np.repeat(np.arange(lo, hi), counts)
+            step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first[owner]
+            t = (step + 0.5) / samples[owner]
+            base = start[owner] + delta[owner] * t[:, None]
+            weight = (length / samples)[owner] * strand_weight
+            for offset in strand_offsets:
+                self._splat(base + normal[owner] * offset, weight, colors[owner], coverage, color_sum)
+
+        covered = np.flatnonzero(coverage)
+        if not len(covered):
+            return
+        pixels = self.rgba.reshape(-1, 4)
+        total = coverage[covered]
+        amount = np.minimum(total, 1.0) * alpha
+        for c in range(3):
+            color = color_sum[min(c, len(color_sum) - 1)][covered] / total
+            under = pixels[covered, c].astype(np.float64)
+            blended = under + (color - under) * amount
+            pixels[covered, c] = np.clip(np.rint(blended), 0, 255).astype(np.uint8)
+
+    def _visible_samples(self, start, delta, samples, margin):
+        # Liang-Barsky clip of each segment against the canvas grown by margin,
+        # turned into the range first <= k < last of sample indices inside it
+        low = np.array(self.origin, dtype=np.float64) - margin
+        high = low + [self.width + 2 * margin, self.height + 2 * margin]
+        t0 = np.zeros(len(start))
+        t1 = np.ones(len(start))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for axis in range(2):
+                d = delta[:, axis]
+                for p, q in ((-d, start[:, axis] - low[axis]), (d, high[axis] - start[:, axis])):
+                    r = q / p
+                    t0 = np.where(p < 0, np.maximum(t0, r), t0)
+                    t1 = np.where(p > 0, np.minimum(t1, r), t1)
+                    t1 = np.where((p == 0) & (q < 0), -1.0, t1)
+        first = np.clip(np.ceil(t0 * samples - 0.5), 0, samples).astype(np.intp)
+        last = np.clip(np.floor(t1 * samples - 0.5) + 1, 0, samples).astype(np.intp)
+        return first, last
+
+    def _splat(self, points, weight, colors, coverage, color_sum):
+        # Bilinear splat onto pixel centers, all four corners in one bincount per channel
+        px = points[:, 0] - 0.5
+        py = points[:, 1] - 0.5
+        x0 = np.floor(px)
+        y0 = np.floor(py)
+        fx = px - x0
+        fy = py - y0
+        x0 = x0.astype(np.intp)
+        y0 = y0.astype(np.intp)
+        index = np.concatenate([self._index(x0, y0), self._index(x0 + 1, y0),
+                                self._index(x0, y0 + 1), self._index(x0 + 1, y0 + 1)])
+        w = np.concatenate([(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy])
+        w *= np.tile(weight, 4)
+        inside = index >= 0
+        index = index[inside]
+        w = w[inside]
+        colors = np.tile(colors, (4, 1))[inside]
+        size = len(coverage)
+        coverage += np.bincount(index, weights=w, minlength=size)
+        for c in range(len(color_sum)):
+            color_sum[c] += np.bincount(index, weights=w * colors[:, c], minlength=size)
@@ -0,0 +1,318 @@
+import copy
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from common.png import png_chunk, png_header, scanlines, write_png
+from common.raster import RasterCanvas
+
+# Animation recording for the demos. A Recorder listens to a
+# SimulationPipeline, copies every published frame's state into a bounded
+# queue, and a background thread rasterizes and encodes it, so the simulation
+# thread never waits on zlib or disk. When the queue is full the 'drop' policy
+# skips the frame and the 'block' policy makes the simulation wait for the
+# encoder (backpressure); either way stats() reports what happened.
+#
+# Writers take (height, width, 4) uint8 RGBA frames:
+#   PngSequenceWriter  numbered PNG files in a directory
+#   ApngWriter         animated PNG, stdlib zlib only
+#   GifWriter          animated GIF, stdlib + NumPy (uncompressed LZW, 256 colors)
+#   FfmpegWriter       any container ffmpeg supports, if ffmpeg is installed
+
+
+class PngSequenceWriter:
+
+    def __init__(self, directory, fps=60, prefix='frame', compress_level=1):
+        self.directory = directory
+        self.prefix = prefix
+        self.compress_level = compress_level
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, rgba):
+        path = os.path.join(self.directory, f'{self.prefix}_{self.count:05d}.png')
+        write_png(path, rgba, self.compress_level)
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class ApngWriter:
+    # The frame count in acTL is only known at the end, so it is patched in on close
+
+    def __init__(self, path, fps=60, compress_level=1):
+        self.file = open(path, 'wb')
+        self.delay = (1, int(round(fps)))
+        self.compress_level = compress_level
+        self.count = 0
+        self.sequence = 0
+        self.size = None
+        self._actl_offset = None
+
+    def write(self, rgba):
+        height, width = rgba.shape[:2]
+        if self.size is None:
+            self.size = (width, height)
+            self.file.write(png_header(width, height, 4))
+            self._actl_offset = self.file.tell()
+            self.file.write(png_chunk(b'acTL', struct.pack('>II', 0, 0)))
+        elif self.size != (width, height):
+            raise ValueError('All APNG frames must have the same size')
+
+        self.file.write(png_chunk(b'fcTL', struct.pack('>IIIIIHHBB', self.sequence, width, height, 0, 0,
+                                                       self.delay[0], self.delay[1], 0, 0)))
+        self.sequence += 1
+        data = zlib.compress(scanlines(rgba).tobytes(), self.compress_level)
+        if self.count == 0:
+            self.file.write(png_chunk(b'IDAT', data))
+        else:
+            self.file.write(png_chunk(b'fdAT', struct.pack('>I', self.sequence) + data))
+            self.sequence += 1
+        self.count += 1
+
+    def close(self):
+        if self.size is not None:
+            self.file.write(png_chunk(b'IEND', b''))
+            self.file.seek(self._actl_offset)
+            self.file.write(png_chunk(b'acTL', struct.pack('>II', self.count, 0)))  # 0 plays = loop forever
+        self.file.close()
+
+
+class GifWriter:
+    # Frames are mapped to one global 256-color palette chosen from the first
+    # frame: 256 grays when it is grayscale (all three demos are), otherwise
+    # 3-3-2 RGB. Pixel data uses "uncompressed" LZW: a clear code after every
+    # 254 literals keeps codes 9 bits wide, so encoding is a NumPy bit-pack
+    # instead of a per-pixel Python loop. Files are about 1.1x raw size.
+    # GIF delays are whole centiseconds, so 60 FPS plays back at 50.
+
+    LITERALS_PER_CLEAR = 254
+
+    def __init__(self, path, fps=60):
+        self.file = open(path, 'wb')
+        self.delay = max(int(round(100 / fps)), 2)
+        self.size = None
+        self.gray = True
+        self.count = 0
+
+    def write(self, rgba):
+        height, width = rgba.shape[:2]
+        if self.size is None:
+            self.size = (width, height)
+            rgb = rgba[..., :3]
+            self.gray = bool((rgb[..., 0] == rgb[..., 1]).all() and (rgb[..., 1] == rgb[..., 2]).all())
+            self._write_header(width, height)
+        elif self.size != (width, height):
+            raise ValueError('All GIF frames must have the same size')
+
+        indices = self.quantize(rgba)
+        self.file.write(b'\x21\xf9\x04\x00' + struct.pack('<H', self.delay) + b'\x00\x00')
+        self.file.write(b'\x2c' + struct.pack('<HHHHB', 0, 0, width, height, 0))
+        self.file.write(b'\x08' + self.sub_blocks(self.lzw_literals(indices.ravel())) + b'\x00')
+        self.count += 1
+
+    def _write_header(self, width, height):
+        if self.gray:
+            palette = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+        else:
+            i = np.arange(256)
+            palette = np.stack([(i >> 5) * 255 // 7, ((i >> 2) & 7) * 255 // 7, (i & 3) * 255 // 3], axis=1)
+        self.file.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0xf7, 0, 0))
+        self.file.write(palette.astype(np.uint8).tobytes())
+        self.file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')  # Loop forever
+
+    def quantize(self, rgba):
+        if self.gray:
+            # Luma, which is exact for frames that are already gray
+            rgb = rgba[..., :3].astype(np.uint16)
+            return ((rgb[..., 0] * 77 + rgb[..., 1] * 150 + rgb[..., 2] * 29) >> 8).astype(np.uint8)
+        return ((rgba[..., 0] & 0xe0) | ((rgba[..., 1] >> 3) & 0x1c) | (rgba[..., 2] >> 6)).astype(np.uint8)
+
+    @classmethod
+    def lzw_literals(cls, indices):
+        # clear, 254 literals, clear, ... , end-of-information, as 9-bit codes packed LSB first
+        run = cls.LITERALS_PER_CLEAR
+        groups = -(-len(indices) // run)
+        codes = np.full((groups, run + 1), -1, dtype=np.int32)
+        codes[:, 0] = 256
+        codes.reshape(-1)[np.arange(len(indices)) + np.arange(len(indices)) // run + 1] = indices
+        codes = np.append(codes[codes >= 0], 257)
+        bits = ((codes[:, None] >> np.arange(9)) & 1).astype(np.uint8)
+        return np.packbits(bits.ravel(), bitorder='little')
+
+    @staticmethod
+    def sub_blocks(data):
+        # Data sub-blocks of at most 255 bytes, each prefixed with its length
+        blocks = -(-len(data) // 255)
+        padded = np.zeros(blocks * 255, dtype=np.uint8)
+        padded[:len(data)] = data
+        out = np.empty((blocks, 256), dtype=np.uint8)
+        out[:, 0] = 255
+        out[:, 1:] = padded.reshape(blocks, 255)
+        last = len(data) - (blocks - 1) * 255
+        out[-1, 0] = last
+        return out.reshape(-1)[:(blocks - 1) * 256 + 1 + last].tobytes()
+
+    def close(self):
+        self.file.write(b'\x3b')
+        self.file.close()
+
+
+class FfmpegWriter:
+    # Raw RGBA frames piped to a local ffmpeg process
+
+    def __init__(self, path, fps=60, executable=None, args=('-pix_fmt', 'yuv420p')):
+        self.executable = executable or shutil.which('ffmpeg')
+        if self.executable is None:
+            raise RuntimeError('ffmpeg was not found on PATH')
+        self.path = path
+        self.fps = fps
+        self.args = list(args)
+        self.process = None
+
+    def write(self, rgba):
+        height, width = rgba.shape[:2]
+        if self.process is None:
+            command = [self.executable, '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                       '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+                       '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2'] + self.args + [self.path]
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.process.stdin.write(np.ascontiguousarray(rgba).tobytes())
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            if self.process.wait():
+                raise RuntimeError(f'ffmpeg exited with status {self.process.returncode}')
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.webm', '.avi')
+
+
+def open_writer(path, fps=60, sequence=False):
+    # Picks a writer from the path: a directory (or sequence=True) for PNG
+    # frames, .png for APNG, .gif, or a video extension for ffmpeg
+    extension = os.path.splitext(path)[1].lower()
+    if sequence or not extension:
+        return PngSequenceWriter(os.path.splitext(path)[0] if extension else path, fps)
+    if extension == '.png':
+        return ApngWriter(path, fps)
+    if extension == '.gif':
+        return GifWriter(path, fps)
+    if extension in VIDEO_EXTENSIONS:
+        return FfmpegWriter(path, fps)
+    raise ValueError(f"Don't know how to record to '{path}'")
+
+
+def render_state(model, state, scale=1.0, size=None):
+    # RGBA frame of a model snapshot, drawn without Qt; size defaults to the model's
+    width, height = size or (model.width, model.height)
+    canvas = RasterCanvas(round(width * scale), round(height * scale), scale)
+    model.draw(canvas, state)
+    return canvas.rgba
+
+
+_STOP = object()
+
+
+class Recorder:
+
+    def __init__(self, model, writer, max_queue=32, policy='drop', scale=1.0):
+        if policy not in ('drop', 'block'):
+            raise ValueError("policy must be 'drop' or 'block'")
+        self.model = model
+        self.writer = writer
+        self.policy = policy
+        self.scale = scale
+        self.size = (model.width, model.height)  # Frames keep this size even if the model is resized
+        self.queue = queue.Queue(max_queue)
+        self.pipeline = None
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0.0  # Seconds the simulation waited on a full queue
+        self.encode_time = 0.0
+        self.peak_queue = 0
+        self.error = None
+        self.closed = False
+        self._thread = threading.Thread(target=self._run, name='recorder', daemon=True)
+        self._thread.start()
+
+    def attach(self, pipeline):
+        # Capture every frame the pipeline publishes from now on
+        self.pipeline = pipeline
+        pipeline.listeners.append(self.capture)
+        return self
+
+    def capture(self, state):
+        # Called on the simulation thread; the pipeline reuses its buffers, so the state is copied.
+        # The pipeline can still call it once more after close(), when nothing drains the queue.
+        if self.closed:
+            return
+        self.submitted += 1
+        if self.policy == 'drop' and self.queue.full():
+            self.dropped += 1  # Before copying, which can be a whole image in voronoi cells mode
+            return
+        item = copy.deepcopy(state)
+        if self.policy == 'block':
+            started = time.perf_counter()
+            while not self.closed:
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            self.blocked += time.perf_counter() - started
+        else:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+        self.peak_queue = max(self.peak_queue, self.queue.qsize())
+
+    def close(self):
+        # Stop capturing, encode what is queued and finish the file; returns stats()
+        if self.pipeline is not None and self.capture in self.pipeline.listeners:
+            self.pipeline.listeners.remove(self.capture)
+        self.closed = True
+        self.queue.put(_STOP)
+        self._thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
+        return self.stats()
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'blocked_ms': self.blocked * 1000,
+            'peak_queue': self.peak_queue,
+            'max_queue': self.queue.maxsize,
+            'encode_ms': self.encode_time * 1000 / max(self.written, 1),
+        }
+
+    def _run(self):
+        while True:
+            state = self.queue.get()
+            if state is _STOP:
+                return
+            if self.error is not None:
+                continue  # Keep draining so a blocked simulation can go on
+            try:
+                started = time.perf_counter()
+                self.writer.write(render_state(self.model, state, self.scale, self.size))
+                self.encode_time += time.perf_counter() - started
+                self.written += 1
+            except Exception as error:
+                self.error = error
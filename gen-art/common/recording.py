@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Compact recordings of the particle and point positions of a run, for
+# replaying, scrubbing and re-rendering it without simulating again.
+#
+# A .genrec file is a JSON header (demo, seed, canvas size and every model
+# parameter at the start) followed by one record per frame and an index.
+# Positions are quantized to uint16 over the canvas, wrapping like the
+# particles do, so moves are differences modulo 2 ** 16 and a particle that
+# crosses an edge only moves a little. Every `keyframe_interval` frames (or
+# when the count changes) the full uint16 positions are written. Frames in
+# between store how much each particle's move differs from its move in the
+# previous frame: particles follow a smooth field, so that is a few levels
+# where the move itself is a hundred or more. These are stored as int8, with
+# the few that don't fit (sharp turns of the field) patched in afterwards as
+# (index, int16) pairs, or as int16 when more than `max_patched` of a frame
+# would need patching.
+#
+# Replay maps the file with numpy.memmap and finds frames through the index,
+# so any frame is at most keyframe_interval - 1 deltas away from a keyframe,
+# however long the run; playing forward applies one delta per frame. A file
+# whose recording never finished has no index and is scanned instead.
+#
+#   python gen-art/common/recording.py record fluid_flow --steps 10000 --out run.genrec
+#   python gen-art/common/recording.py info run.genrec
+#   python gen-art/common/recording.py render run.genrec --frames 9000:9120 --scale 2 --set particle_size=2
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EXTENSION = '.genrec'
+MAGIC = b'GENREC1\n'
+INDEX_MAGIC = b'GENRIDX\n'
+FRAME = struct.Struct('<4sII')  # kind (b'KEY ', b'D8  ' or b'D16 '), count, patches
+KINDS = {b'KEY ': np.uint16, b'D8  ': np.int8, b'D16 ': np.int16}
+LEVELS = 1 << 16
+
+# Demo model class -> demo name in the header, for create_model on replay
+DEMOS = {'FluidFlowModel': 'fluid_flow', 'VoronoiModel': 'voronoi'}
+
+
+def quantize(points, width, height):
+    # (n, 2) canvas positions -> (2, n) uint16 steps of size / 2 ** 16, wrapped
+    out = np.empty((2, len(points)), dtype=np.uint16)
+    for axis, size in enumerate((width, height)):
+        out[axis] = (np.floor(points[:, axis] * (LEVELS / size)).astype(np.int64) % LEVELS)
+    return out
+
+
+def dequantize(levels, width, height):
+    # (2, n) uint16 -> (n, 2) float32 canvas positions at the centers of their steps
+    points = np.empty((levels.shape[1], 2), dtype=np.float32)
+    for axis, size in enumerate((width, height)):
+        points[:, axis] = (levels[axis] + 0.5) * (size / LEVELS)
+    return points
+
+
+def model_params(model):
+    # The plain-valued attributes of a model: its slider parameters and the like
+    skip = {'seed', 'width', 'height'}
+    return {name: value.item() if isinstance(value, np.generic) else value
+            for name, value in vars(model).items()
+            if not name.startswith('_') and name not in skip
+            and isinstance(value, (bool, int, float, str, np.generic))}
+
+
+class RecordingWriter:
+    # Writes a .genrec file frame by frame; add() takes (n, 2) canvas positions
+
+    def __init__(self, path, header, keyframe_interval=30, max_patched=1 / 8):
+        self.file = open(path, 'wb')
+        self.header = dict(header, keyframe_interval=keyframe_interval)
+        self.width, self.height = header['width'], header['height']
+        self.keyframe_interval = keyframe_interval
+        self.max_patched = max_patched
+        self.index = []  # (offset, count, kind) per frame
+        self.previous = None  # Levels of the last frame
+        self.move = None  # Levels moved from the frame before it to the last one
+        data = json.dumps(self.header).encode()
+        self.file.write(MAGIC + struct.pack('<I', len(data)) + data + self._padding(len(data) + 12))
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, points):
+        count = len(points)
+        levels = quantize(points, self.width, self.height)
+        patches = []
+        if (self.previous is None or self.previous.shape[1] != count or
+                len(self.index) % self.keyframe_interval == 0):
+            kind, payload = b'KEY ', levels
+            move = np.zeros_like(levels)
+        else:
+            # uint16 arithmetic wraps, matching the wrapped positions
+            move = levels - self.previous
+            delta = (move - self.move).view(np.int16)
+            wide = np.flatnonzero((delta < -128) | (delta > 127))
+            if len(wide) > self.max_patched * delta.size:
+                kind, payload = b'D16 ', delta
+            else:
+                kind, payload = b'D8  ', delta.astype(np.int8)
+                patches = [wide.astype(np.int32), delta.reshape(-1)[wide]]
+        self.previous, self.move = levels, move
+        self.index.append((self.file.tell(), count, kind))
+        self.file.write(FRAME.pack(kind, count, len(patches[0]) if patches else 0))
+        for array in [payload] + patches:
+            self.file.write(array.tobytes())
+            self.file.write(self._padding(array.nbytes))
+
+    @staticmethod
+    def _padding(size):
+        # Keeps every record 8-byte aligned in the file
+        return b'\0' * (-size % 8)
+
+    def close(self):
+        offset = self.file.tell()
+        kinds = list(KINDS)
+        index = np.array([(at, count, kinds.index(kind)) for at, count, kind in self.index], dtype=np.int64)
+        self.file.write(index.reshape(-1, 3).tobytes())
+        self.file.write(INDEX_MAGIC + struct.pack('<qq', offset, len(self.index)))
+        self.file.close()
+
+
+class Recording:
+    # A .genrec file opened for replay. frame(k) returns (n, 2) float32 canvas
+    # positions, levels(k) the stored (2, n) uint16 ones.
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"'{path}' is not a gen-art recording")
+        size, = struct.unpack('<I', bytes(self.data[8:12]))
+        self.header = json.loads(bytes(self.data[12:12 + size]))
+        self.width, self.height = self.header['width'], self.header['height']
+        self.start = 12 + size + (-(12 + size) % 8)
+        self.offsets, self.counts, self.kinds = self._read_index()
+        self._cached = (None, None, None)  # (frame, levels, move) last decoded, so playing forward is one delta per frame
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _read_index(self):
+        tail = len(INDEX_MAGIC) + 16
+        if len(self.data) >= self.start + tail and bytes(self.data[-tail:-16]) == INDEX_MAGIC:
+            offset, frames = struct.unpack('<qq', bytes(self.data[-16:]))
+            index = np.frombuffer(self.data, dtype=np.int64, count=frames * 3, offset=offset).reshape(-1, 3)
+            return index[:, 0], index[:, 1], index[:, 2]
+        # Unfinished: walk the frame records, dropping a partly written last one
+        offsets, counts, kinds = [], [], []
+        at = self.start
+        kind_names = list(KINDS)
+        while at + FRAME.size <= len(self.data):
+            kind, count, patches = FRAME.unpack(bytes(self.data[at:at + FRAME.size]))
+            if kind not in KINDS:
+                break
+            end = self._layout(at, kind, count, patches)[-1]
+            if end > len(self.data):
+                break
+            offsets.append(at)
+            counts.append(count)
+            kinds.append(kind_names.index(kind))
+            at = end
+        return np.array(offsets, dtype=np.int64), np.array(counts, dtype=np.int64), np.array(kinds, dtype=np.int64)
+
+    @staticmethod
+    def _layout(at, kind, count, patches):
+        # Offsets of a record's values, patch indices and patch values, and where the next record starts
+        values = at + FRAME.size
+        size = 2 * count * np.dtype(KINDS[kind]).itemsize
+        indices = values + size + (-size % 8)
+        patched = indices + 4 * patches + (-4 * patches % 8)
+        return values, indices, patched, patched + 2 * patches + (-2 * patches % 8)
+
+    def _payload(self, frame):
+        # uint16 levels of a keyframe, int16 change of move of a delta frame
+        at = int(self.offsets[frame])
+        kind, count, patches = FRAME.unpack(bytes(self.data[at:at + FRAME.size]))
+        values, indices, patched, _ = self._layout(at, kind, count, patches)
+        payload = np.frombuffer(self.data, dtype=KINDS[kind], count=2 * count, offset=values).reshape(2, count)
+        if kind != b'D8  ':
+            return payload
+        delta = payload.astype(np.int16)
+        if patches:
+            wide = np.frombuffer(self.data, dtype=np.int32, count=patches, offset=indices)
+            delta.reshape(-1)[wide] = np.frombuffer(self.data, dtype=np.int16, count=patches, offset=patched)
+        return delta
+
+    def levels(self, frame):
+        if not 0 <= frame < len(self):
+            raise IndexError(f'frame {frame} is outside the recording (0..{len(self) - 1})')
+        cached, levels, move = self._cached
+        if cached == frame:
+            return levels.copy()
+        if cached == frame - 1 and self.kinds[frame]:
+            start = frame  # One delta on from the previous frame
+        else:
+            start = frame
+            while self.kinds[start]:
+                start -= 1  # Back to the keyframe
+            levels = self._payload(start).copy()
+            move = np.zeros_like(levels)
+            start += 1
+        for k in range(start, frame + 1):
+            move += self._payload(k).view(np.uint16)  # Wraps like the writer's subtraction
+            levels += move
+        self._cached = (frame, levels, move)
+        return levels.copy()
+
+    def frame(self, frame):
+        return dequantize(self.levels(frame), self.width, self.height)
+
+    def close(self):
+        # The file is unmapped once the index views and this go
+        self.offsets = self.counts = self.kinds = None
+        self.data = None
+        self._cached = (None, None, None)
+
+
+class PositionRecorder:
+    # Pipeline listener writing the model's positions after every published
+    # step; same attach/close/stats interface as common.recorder.Recorder, so
+    # the demo windows record either through one button. Quantizing runs on
+    # the simulation thread, which owns the model; the file is buffered. A
+    # lock keeps close() on the GUI thread from finishing the file while a
+    # capture is still writing to it, and captures after close() do nothing.
+
+    def __init__(self, model, path, keyframe_interval=30, rate=None):
+        header = {'demo': DEMOS[type(model).__name__], 'seed': model.seed, 'width': model.width,
+                  'height': model.height, 'rate': rate, 'params': model_params(model)}
+        self.model = model
+        self.writer = RecordingWriter(path, header, keyframe_interval)
+        self.pipeline = None
+        self.encode_time = 0.0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def attach(self, pipeline):
+        self.pipeline = pipeline
+        pipeline.listeners.append(self.capture)
+        return self
+
+    def capture(self, state=None):
+        with self._lock:
+            if self.closed:
+                return
+            started = time.perf_counter()
+            self.writer.add(self.model.positions())
+            self.encode_time += time.perf_counter() - started
+
+    def close(self):
+        if self.pipeline is not None and self.capture in self.pipeline.listeners:
+            self.pipeline.listeners.remove(self.capture)
+        with self._lock:
+            if not self.closed:
+                self.closed = True
+                self.writer.close()
+        return self.stats()
+
+    def stats(self):
+        written = len(self.writer)
+        return {'written': written, 'dropped': 0, 'encode_ms': self.encode_time * 1000 / max(written, 1)}
+
+
+def record(demo, steps, path, seed=0, params=None, size=None, keyframe_interval=30):
+    # Runs a demo headless for `steps` steps and records every one
+    from common.headless import create_model, step_model
+
+    model = create_model(demo, seed, params, size)
+    recorder = PositionRecorder(model, path, keyframe_interval)
+    try:
+        for _ in range(steps):
+            step_model(model, draw=False)
+            recorder.capture()
+    finally:
+        recorder.close()
+        if hasattr(model, 'close'):
+            model.close()
+    return len(recorder.writer)
+
+
+def render(path, frames=None, out_dir='frames', fmt='png', scale=1.0, params=None):
+    # Draws recorded frames (a range, default all) with the recorded or given
+    # parameters; nothing is simulated
+    from common.headless import create_model, frame_path, render_frame, TITLES
+
+    recording = Recording(path)
+    header = recording.header
+    model = create_model(header['demo'], header['seed'], dict(header['params'], **(params or {})),
+                         (header['width'], header['height']))
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for frame in frames if frames is not None else range(len(recording)):
+        model.set_positions(recording.frame(frame))
+        paths.append(render_frame(model, frame_path(out_dir, header['demo'], frame, fmt), fmt, scale,
+                                  TITLES.get(header['demo'])))
+    recording.close()
+    return paths
+
+
+def parse_frames(text, count):
+    # 'a:b' or a single frame; negative numbers count from the end
+    start, colon, stop = text.partition(':')
+    start = int(start) if start else 0
+    stop = (int(stop) if stop else count) if colon else start + 1
+    return range(*slice(start, stop).indices(count))
+
+
+def main(argv=None):
+    from common.headless import MODELS, parse_params
+
+    parser = argparse.ArgumentParser(description='Record a run to a .genrec file, or inspect and re-render one.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='simulate headless and record every step')
+    record_parser.add_argument('demo', choices=sorted(name for name in MODELS if name in DEMOS.values()))
+    record_parser.add_argument('--steps', type=int, default=600)
+    record_parser.add_argument('--seed', type=int, default=0)
+    record_parser.add_argument('--size', help='canvas size as WIDTHxHEIGHT (defaults to the demo\'s own)')
+    record_parser.add_argument('--keyframes', type=int, default=30, help='frames between keyframes')
+    record_parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE')
+    record_parser.add_argument('--out', default='run' + EXTENSION)
+    info_parser = commands.add_parser('info', help='show the header and size of a recording')
+    info_parser.add_argument('path')
+    render_parser = commands.add_parser('render', help='draw recorded frames to PNG or SVG without simulating')
+    render_parser.add_argument('path')
+    render_parser.add_argument('--frames', help='frame or START:STOP range (default all)')
+    render_parser.add_argument('--scale', type=float, default=1.0, help='output pixels per canvas unit')
+    render_parser.add_argument('--format', choices=['png', 'svg'], default='png')
+    render_parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                               help='override a recorded parameter, e.g. --set particle_size=3')
+    render_parser.add_argument('--out', default='frames', help='output directory')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        size = tuple(int(v) for v in args.size.lower().split('x')) if args.size else None
+        started = time.perf_counter()
+        frames = record(args.demo, args.steps, args.out, args.seed, parse_params(args.set), size, args.keyframes)
+        print(f"Recorded {frames} frames to '{args.out}' ({os.path.getsize(args.out) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - started:.1f} s")
+    elif args.command == 'info':
+        recording = Recording(args.path)
+        print(json.dumps(recording.header, indent=2))
+        keys = int((recording.kinds == 0).sum())
+        print(f'{len(recording)} frames ({keys} keyframes), up to {int(recording.counts.max(initial=0))} '
+              f'positions, {os.path.getsize(args.path) / 1e6:.1f} MB')
+        recording.close()
+    else:
+        frames = parse_frames(args.frames, len(Recording(args.path))) if args.frames else None
+        paths = render(args.path, frames, args.out, args.format, args.scale, parse_params(args.set))
+        print(f"Wrote {len(paths)} frames to '{args.out}'")
+
+
+if __name__ == '__main__':
+    main()
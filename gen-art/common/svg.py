@@ -0,0 +1,145 @@
+import numpy as np
+
+from common.raster import rgb_array
+
+
+def hex_color(rgb):
+    return '#%02x%02x%02x' % tuple(int(c) for c in rgb)
+
+
+class SvgCanvas:
+    # Writes the RasterCanvas drawing calls straight to an SVG file without Qt.
+    # Instead of one element per primitive, each call is cut into chunks of at
+    # most `chunk` primitives, and every color in a chunk becomes one <path>
+    # whose commands are relative moves between integer coordinates. The whole
+    # drawing sits in a group scaled by 10**-precision, so `precision` decimals
+    # survive as plain integers. Colors are snapped to `color_levels` steps per
+    # channel first so near-identical grays share a path. Text is built per
+    # chunk from NumPy arrays, so memory stays flat however many primitives
+    # there are.
+    #
+    # Grouping reorders primitives by color within a chunk, and a translucent
+    # path doesn't darken where it overlaps itself. Both match RasterCanvas,
+    # which composites each call once. The view box is in canvas units and
+    # scale only sets the document's pixel size.
+
+    def __init__(self, path, width, height, scale=1.0, background=(255, 255, 255),
+                 title=None, description=None, precision=1, color_levels=64, chunk=65536):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.precision = precision
+        self.factor = 10 ** precision
+        self.color_levels = color_levels
+        self.chunk = chunk
+        self.file = open(path, 'w', encoding='utf-8', newline='\n')
+        self.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n')
+        self.write('<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+                   'width="%g" height="%g" viewBox="0 0 %g %g">\n'
+                   % (width * scale, height * scale, width, height))
+        if title:
+            self.write('<title>%s</title>\n' % escape(title))
+        if description:
+            self.write('<desc>%s</desc>\n' % escape(description))
+        self.write('<rect width="%g" height="%g" fill="%s"/>\n' % (width, height, hex_color(background)))
+        self.write('<g transform="scale(%g)" stroke-linecap="square">\n' % (1 / self.factor))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, text):
+        self.file.write(text)
+
+    def points(self, points, colors, size=1):
+        # Squares snapped to whole units, matching RasterCanvas.points at scale 1
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        colors = rgb_array(colors, len(points))
+        size = max(int(round(size)), 1)
+        side = size * self.factor
+        square = 'h%dv%dh%dz' % (side, side, -side)
+        for start, keys, order in self._groups(colors):
+            # After z the pen is back at the square's corner, so each move is corner to corner
+            xy = (np.floor(points[start:start + len(keys)][order]).astype(np.int64) - size // 2) * self.factor
+            self._paths(keys, xy, 'm%d %d' + square, lambda xy: np.diff(xy, axis=0, prepend=0),
+                        lambda color: 'fill="%s"' % color)
+
+    def segments(self, segments, colors, width=1.0, alpha=1.0):
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        colors = rgb_array(colors, len(segments))
+        stroke = self._stroke(width, alpha)
+        for start, keys, order in self._groups(colors):
+            ends = np.round(segments[start:start + len(keys)][order] * self.factor).astype(np.int64)
+            self._paths(keys, ends, 'm%d %dl%d %d', self._segment_moves,
+                        lambda color: 'fill="none" stroke="%s"%s' % (color, stroke))
+
+    def polylines(self, lines, colors, width=1.0, alpha=1.0):
+        lines = np.asarray(lines, dtype=np.float64)
+        colors = rgb_array(colors, len(lines))
+        if len(lines) == 0 or lines.shape[1] < 2:
+            return
+        stroke = self._stroke(width, alpha)
+        # All polylines share a point count, so one format string covers a whole line
+        template = 'm%d %dl' + ' '.join(['%d %d'] * (lines.shape[1] - 1))
+        chunk = max(self.chunk // lines.shape[1], 1)
+        for start in range(0, len(lines), chunk):
+            vertices = np.round(lines[start:start + chunk] * self.factor).astype(np.int64)
+            for _, keys, order in self._groups(colors[start:start + chunk]):
+                self._paths(keys, vertices[order], template, self._polyline_moves,
+                            lambda color: 'fill="none" stroke="%s"%s' % (color, stroke))
+
+    def _groups(self, colors):
+        # (start, sorted color keys, order) per chunk of primitives
+        for start in range(0, len(colors), self.chunk):
+            keys = self._color_keys(colors[start:start + self.chunk])
+            order = np.argsort(keys, kind='stable')
+            yield start, keys[order], order
+
+    def _color_keys(self, colors):
+        colors = colors.astype(np.int64)
+        if self.color_levels and self.color_levels < 256:
+            step = 255 / (self.color_levels - 1)
+            colors = np.round(np.round(colors / step) * step).astype(np.int64)
+        return colors[:, 0] << 16 | colors[:, 1] << 8 | colors[:, 2]
+
+    def _paths(self, keys, items, template, moves, attrs):
+        # One <path> per run of equal keys; items are absolute integer
+        # coordinates that moves() turns into relative ones for the template
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        for first, last in zip(np.r_[0, bounds], np.r_[bounds, len(keys)]):
+            values = moves(items[first:last])
+            d = (template * (last - first)) % tuple(values.ravel().tolist())
+            self.write('<path %s d="M%s"/>\n' % (attrs('#%06x' % keys[first]), d[1:]))
+
+    @staticmethod
+    def _segment_moves(ends):
+        # Move from the previous segment's end to this one's start, then draw it
+        moves = np.empty_like(ends)
+        moves[:, :2] = ends[:, :2]
+        moves[1:, :2] -= ends[:-1, 2:]
+        moves[:, 2:] = ends[:, 2:] - ends[:, :2]
+        return moves
+
+    @staticmethod
+    def _polyline_moves(vertices):
+        # Each vertex relative to the one before, the first one relative to the previous line's end
+        moves = np.diff(vertices, axis=1, prepend=0)
+        moves[1:, 0] -= vertices[:-1, -1]
+        return moves
+
+    def _stroke(self, width, alpha):
+        attrs = ' stroke-width="%g"' % (width * self.factor)
+        if alpha < 1:
+            attrs += ' stroke-opacity="%.3f"' % alpha
+        return attrs
+
+    def close(self):
+        if not self.file.closed:
+            self.write('</g>\n</svg>\n')
+            self.file.close()
+
+
+def escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
@@ -0,0 +1,213 @@
+import argparse
+import ast
+import copy
+import itertools
+import os
+import sys
+
+import numpy as np
+
+# Parameter sweeps rendered to a labelled contact sheet. Every combination of
+# the varied model parameters is stepped headless from the same seed and
+# drawn into one cell; columns follow the last parameter and rows the rest.
+#
+#   python gen-art/common/sweep.py fabric --vary noise_scale=0.05:0.7:4 --vary wave_size=1,4,8 \
+#       --vary movement=0.5,1.5 --steps 30 --out fabric-sweep.png
+#   python gen-art/common/sweep.py fluid_flow --vary num_particles=2000,10000 \
+#       --vary flow_scale=0.001:0.01:3 --vary speed=0.5,2 --steps 120
+#
+# Values are in model units (what the sliders set, e.g. flow_scale=0.0005 for
+# the slider at 5), not slider positions.
+#
+# Cells that agree on a demo's SHARED parameters form one group. The group
+# builds that state once in a template model (the seeded initial particles,
+# or the fabric noise field of every frame) and each cell starts from a copy,
+# so sweeping speed or movement never redoes it. Results are the same as
+# rendering each cell on its own. With workers, every group's cells are split
+# into chunks so all the workers stay busy even when there is only one group;
+# each chunk builds its own template rather than shipping one between
+# processes (a fabric template holds every frame's noise field).
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.bitmap_font import draw_text, text_size
+from common.headless import MODELS, create_model, parse_params, step_model
+from common.png import write_png
+from common.raster import RasterCanvas
+
+# Parameters that decide the expensive state prepare() builds once per group
+SHARED = {
+    'fluid_flow': ('num_particles',),
+    'voronoi': (),
+    'fabric': ('num_points', 'num_threads', 'noise_scale', 'wave_size'),
+}
+
+
+def prepare(demo, model, steps):
+    # Builds the state shared by every cell of a group into the template model
+    if demo == 'fluid_flow':
+        # The particles the first step would spawn, from the same seeded rng
+        model.particles.resize(model.num_particles, model.width, model.height, model.rng)
+    elif demo == 'fabric':
+        # Fills the noise cache for every frame the cells will step through
+        for frame in range(steps):
+            model.build_lines(frame * 0.01)
+
+
+def expand_grid(vary):
+    # {name: values} -> one {name: value} dict per combination, last name fastest
+    names = list(vary)
+    return [dict(zip(names, values)) for values in itertools.product(*vary.values())]
+
+
+def render_cell(demo, model, steps, scale):
+    for step in range(steps):
+        step_model(model, step == steps - 1)
+    canvas = RasterCanvas(round(model.width * scale), round(model.height * scale), scale)
+    model.draw(canvas)
+    return canvas.rgba
+
+
+def build_template(demo, seed, params, size, steps, shared):
+    # Model holding the state shared by every cell of a group
+    template = create_model(demo, seed, params, size)
+    for name, value in shared.items():
+        setattr(template, name, value)
+    prepare(demo, template, steps)
+    return template
+
+
+def render_cells(demo, template, steps, scale, cells):
+    # cells is [(index, varied params)] of one group
+    results = []
+    for index, values in cells:
+        model = copy.deepcopy(template)
+        for name, value in values.items():
+            setattr(model, name, value)
+        results.append((index, render_cell(demo, model, steps, scale)))
+    return results
+
+
+def render_job(demo, seed, params, size, steps, scale, shared, cells):
+    # Some or all cells of one group, from a template built here
+    return render_cells(demo, build_template(demo, seed, params, size, steps, shared), steps, scale, cells)
+
+
+def chunks(cells, count):
+    # cells split into count contiguous runs of about equal length
+    return [cells[len(cells) * i // count:len(cells) * (i + 1) // count] for i in range(count)]
+
+
+def sweep(demo, vary, seed=0, params=None, size=None, steps=60, scale=0.5, workers=None):
+    # Renders every combination of vary; returns [(varied params, rgba)] in grid order
+    grid = expand_grid(vary)
+    model = create_model(demo, seed, params, size)
+    for name in vary:
+        if not hasattr(model, name):
+            raise ValueError(f"{demo} has no parameter '{name}'")
+    groups = {}
+    for index, values in enumerate(grid):
+        shared = {name: values[name] for name in SHARED[demo] if name in values}
+        groups.setdefault(tuple(shared.items()), []).append((index, values))
+
+    images = [None] * len(grid)
+    workers = min(workers or os.cpu_count() or 1, len(grid))
+    if workers <= 1:
+        results = [render_job(demo, seed, params, size, steps, scale, dict(key), cells)
+                   for key, cells in groups.items()]
+    else:
+        from concurrent.futures import ProcessPoolExecutor  # Only pays for multiprocessing when it is used
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for key, cells in groups.items():
+                # Each group gets its share of the workers
+                count = min(len(cells), max(1, round(workers * len(cells) / len(grid))))
+                futures += [pool.submit(render_job, demo, seed, params, size, steps, scale, dict(key), chunk)
+                            for chunk in chunks(cells, count)]
+            results = [future.result() for future in futures]
+    for job in results:
+        for index, rgba in job:
+            images[index] = rgba
+    return list(zip(grid, images))
+
+
+def format_value(value):
+    return '%g' % value if isinstance(value, float) else str(value)
+
+
+def contact_sheet(cells, columns, title=None, gap=12, label_scale=2, background=(255, 255, 255)):
+    # Lays out [(params, rgba)] row by row with each cell's params printed under it
+    cell_height = max(rgba.shape[0] for _, rgba in cells)
+    cell_width = max(rgba.shape[1] for _, rgba in cells)
+    labels = [[f'{name}={format_value(value)}' for name, value in params.items()] for params, _ in cells]
+    label_height = max(text_size(lines, label_scale)[1] for lines in labels) + gap // 2
+    title_lines = [title] if title else []
+    title_height = text_size(title_lines, label_scale)[1] + gap if title else 0
+
+    rows = -(-len(cells) // columns)
+    width = columns * cell_width + (columns + 1) * gap
+    height = title_height + rows * (cell_height + label_height) + (rows + 1) * gap
+    sheet = np.empty((height, width, 4), dtype=np.uint8)
+    sheet[..., :3] = background
+    sheet[..., 3] = 255
+    draw_text(sheet, gap, gap, title_lines, label_scale)
+
+    for i, ((_, rgba), lines) in enumerate(zip(cells, labels)):
+        row, column = divmod(i, columns)
+        x = gap + column * (cell_width + gap)
+        y = title_height + gap + row * (cell_height + label_height + gap)
+        sheet[y:y + rgba.shape[0], x:x + rgba.shape[1]] = rgba
+        draw_text(sheet, x, y + cell_height + gap // 2, lines, label_scale)
+    return sheet
+
+
+def parse_values(text):
+    # 'start:stop:count' for evenly spaced values, or a comma separated list
+    if ':' in text:
+        start, stop, count = text.split(':')
+        values = np.linspace(float(start), float(stop), int(count))
+        if all(part.lstrip('-').isdigit() for part in (start, stop)) and np.allclose(values, np.round(values)):
+            return [int(round(v)) for v in values]
+        return [float(v) for v in values]
+    values = []
+    for item in text.split(','):
+        try:
+            values.append(ast.literal_eval(item))
+        except (ValueError, SyntaxError):
+            values.append(item)
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render a grid of gen-art parameter combinations.')
+    parser.add_argument('demo', choices=sorted(MODELS))
+    parser.add_argument('--vary', action='append', default=[], metavar='NAME=VALUES', required=True,
+                        help="parameter values as start:stop:count or a,b,c, e.g. --vary speed=0.5:2:4")
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='fixed model parameter, e.g. --set num_threads=40')
+    parser.add_argument('--steps', type=int, default=60, help='simulation steps before each cell is drawn')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', help='canvas size as WIDTHxHEIGHT (defaults to the demo\'s own)')
+    parser.add_argument('--scale', type=float, default=0.5, help='cell pixels per canvas unit')
+    parser.add_argument('--columns', type=int, help='cells per row (default: one per value of the last parameter)')
+    parser.add_argument('--out', default='sweep.png')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    vary = {}
+    for item in args.vary:
+        name, _, values = item.partition('=')
+        vary[name] = parse_values(values)
+    size = tuple(int(v) for v in args.size.lower().split('x')) if args.size else None
+    params = parse_params(args.set)
+
+    cells = sweep(args.demo, vary, args.seed, params, size, args.steps, args.scale, args.workers)
+    fixed = ' '.join(f'{name}={format_value(value)}' for name, value in params.items())
+    title = f'{args.demo} seed={args.seed} steps={args.steps} {fixed}'.strip()
+    write_png(args.out, contact_sheet(cells, args.columns or len(list(vary.values())[-1]), title))
+    print(f"Wrote {len(cells)} cells to '{args.out}'")
+
+
+if __name__ == '__main__':
+    main()
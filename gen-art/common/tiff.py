@@ -0,0 +1,83 @@
+import struct
+import zlib
+
+import numpy as np
+
+# Minimal tiled TIFF writer (stdlib zlib + NumPy) for images too large to
+# hold in memory: tiles are read from the source array, usually a
+# numpy.memmap, one at a time and deflate-compressed as they are written.
+# Classic TIFF, so the file itself must stay under 4 GB.
+
+SHORT, LONG, RATIONAL = 3, 4, 5
+
+
+def write_tiled_tiff(path, pixels, tile=256, dpi=None, compress_level=6):
+    # pixels is an (height, width) gray or (height, width, 3) RGB uint8 array;
+    # tile must be a multiple of 16. Edge tiles are padded with zeros.
+    if tile % 16:
+        raise ValueError('TIFF tile size must be a multiple of 16')
+    height, width = pixels.shape[:2]
+    channels = pixels.shape[2] if pixels.ndim == 3 else 1
+    offsets = []
+    byte_counts = []
+    with open(path, 'wb') as f:
+        f.write(b'II*\x00' + struct.pack('<I', 0))  # IFD offset patched below
+        block = np.zeros((tile, tile, channels), dtype=np.uint8)
+        for top in range(0, height, tile):
+            for left in range(0, width, tile):
+                region = pixels[top:top + tile, left:left + tile].reshape(-1, min(tile, width - left), channels)
+                block.fill(0)
+                block[:region.shape[0], :region.shape[1]] = region
+                data = zlib.compress(block.tobytes(), compress_level)
+                offsets.append(f.tell())
+                byte_counts.append(len(data))
+                f.write(data)
+                if f.tell() & 1:
+                    f.write(b'\x00')  # TIFF values start on word boundaries
+        if f.tell() >= 1 << 32:
+            raise ValueError('Image is too large for a classic TIFF; write a PNG instead')
+
+        extra = []  # Values that don't fit in an IFD entry, written after it
+
+        def entry(tag, kind, values):
+            values = list(values)
+            fmt = {SHORT: 'H', LONG: 'I', RATIONAL: 'II'}[kind]
+            count = len(values) // 2 if kind == RATIONAL else len(values)
+            data = struct.pack('<' + fmt[0] * len(values), *values)
+            if len(data) <= 4:
+                return struct.pack('<HHI', tag, kind, count) + data.ljust(4, b'\x00'), b''
+            return struct.pack('<HHI', tag, kind, count), data
+
+        tags = [
+            (256, LONG, [width]),
+            (257, LONG, [height]),
+            (258, SHORT, [8] * channels),
+            (259, SHORT, [8]),  # Deflate
+            (262, SHORT, [2 if channels == 3 else 1]),  # RGB or min-is-black
+            (277, SHORT, [channels]),
+            (284, SHORT, [1]),  # Chunky
+            (322, LONG, [tile]),
+            (323, LONG, [tile]),
+            (324, LONG, offsets),
+            (325, LONG, byte_counts),
+        ]
+        if dpi:
+            tags += [(282, RATIONAL, [int(dpi * 100), 100]), (283, RATIONAL, [int(dpi * 100), 100]),
+                     (296, SHORT, [2])]  # Inches
+        tags.sort()
+
+        ifd_offset = f.tell()
+        extra_offset = ifd_offset + 2 + 12 * len(tags) + 4
+        entries = []
+        for tag, kind, values in tags:
+            head, data = entry(tag, kind, values)
+            if data:
+                entries.append(head + struct.pack('<I', extra_offset))
+                extra.append(data)
+                extra_offset += len(data)
+            else:
+                entries.append(head)
+        f.write(struct.pack('<H', len(tags)) + b''.join(entries) + struct.pack('<I', 0))
+        f.write(b''.join(extra))
+        f.seek(4)
+        f.write(struct.pack('<I', ifd_offset))
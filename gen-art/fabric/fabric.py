@@ -1,32 +1,49 @@
 import sys
 import numpy as np
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QSlider, QPushButton, QLabel, QFileDialog
-from PyQt5.QtCore import Qt, QTimer, QPoint, QSize, QRectF, QPointF
-from PyQt5.QtGui import QOpenGLVersionProfile, QSurfaceFormat, QVector3D, QMatrix4x4, QImage, QPainter, QOpenGLFramebufferObject, QColor
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QSlider, QPushButton, QLabel, QFileDialog, QInputDialog, QMessageBox, QShortcut
+from PyQt5.QtCore import Qt, QTimer, QPoint
+from PyQt5.QtGui import QOpenGLVersionProfile, QSurfaceFormat, QVector3D, QMatrix4x4, QImage, QOpenGLFramebufferObject, QKeySequence
 from PyQt5.QtOpenGL import QGLWidget
-from PyQt5.QtSvg import QSvgGenerator
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from noise import pnoise2  # Perlin noise function
 import io
 import os
-
-# Add this import for QPainterPath
-from PyQt5.QtGui import QPainterPath
+import time
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fabric.model import FabricModel
+from fabric.gl_lines import LineRenderer
+from fabric.lod import ThreadLod, ThreadStrips
+from common.pipeline import SimulationPipeline
+from common.profiling import FrameProfiler
+from common.hud import render_hud_gl
+from common.recorder import Recorder, open_writer
+from common.svg import SvgCanvas
+from common.poster import PosterJob
+from common.quality import QualityController, scaled
 
 class OpenGLWidget(QGLWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, seed=None):
         super(OpenGLWidget, self).__init__(parent)
         self.setMinimumSize(600, 400)
-        self.lines = []
-        self.num_points = 50
-        self.num_threads = 1
-        self.noise_scale = 0.2
-        self.wave_size = 4
-        self.movement = 1.0
+        self.model = FabricModel(seed=seed)  # Thread parameters and geometry; see fabric/model.py
+        # Stage timings; off unless GENART_PROFILE is set or the HUD is toggled with F3
+        self.profiler = FrameProfiler.from_env(target_fps=20)
+        self.model.profiler = self.profiler  # Times the noise field inside each step
+        # Steps on the GUI thread until the window starts it on a worker thread
+        self.pipeline = SimulationPipeline(self.model, profiler=self.profiler)
+        self.shown_error = None
+        self.shown_frame = -1
         self.line_thickness = 0.5
-        self.line_spacing = 0.05
-        self.frame = 0
+        self.line_renderer = LineRenderer()  # Uploaded once per step, redrawn on every repaint
+        # Threads are sampled for the current zoom instead of num_points times each
+        self.lod = ThreadLod()
+        self.model.lod = self.lod
+        # Scales the samples per thread and the noise octaves down while frames
+        # run over budget and back up when there is room
+        self.quality = QualityController({'num_points': scaled(10), 'wave_size': scaled(1)}, budget_ms=1000 / 20)
+        self.quality.request(num_points=self.model.num_points, wave_size=self.model.wave_size)
         
         # New variables for interaction
         self.last_pos = QPoint()
@@ -38,10 +55,24 @@ class OpenGLWidget(QGLWidget):
         glClearColor(1.0, 1.0, 1.0, 1.0)
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        self.line_renderer.invalidate()  # New context, so the vertex buffer must be recreated
 
     def resizeGL(self, width, height):
         glViewport(0, 0, width, height)
         self.update_projection(width, height)
+        self.update_detail(height)
+
+    def update_detail(self, height=None):
+        # The projection spans 20 units of height before the view scale. Rounded
+        # up to half octaves so small zoom steps don't resample every thread.
+        pixels_per_unit = (self.height() if height is None else height) / 20 * self.scale
+        pixels_per_unit = 2 ** (np.ceil(np.log2(max(pixels_per_unit, 1e-3)) * 2) / 2)
+        if pixels_per_unit != self.model.pixels_per_unit:
+            self.pipeline.set(pixels_per_unit=pixels_per_unit)
+
+    def set_adaptive(self, enabled):
+        self.pipeline.set(lod=self.lod if enabled else None)
+        self.refresh()
 
     def update_projection(self, width, height):
         glMatrixMode(GL_PROJECTION)
@@ -66,41 +97,72 @@ class OpenGLWidget(QGLWidget):
         glColor4f(0.2, 0.2, 0.2, 0.7)  # Dark grey with alpha
         glLineWidth(self.line_thickness)
 
-        for line in self.lines:
-            glBegin(GL_LINE_STRIP)
-            for x, y in line:
-                glVertex3f(x, y, 0)  # Remove the offset here
-            glEnd()
+        # All threads in one draw call; geometry is only re-uploaded after a simulation step
+        started = time.perf_counter()
+        with self.profiler.stage('paint'):
+            self.line_renderer.draw()
+        self.observe_quality((time.perf_counter() - started) * 1000)
+        self.profiler.frame()
+        if self.profiler.hud:
+            glColor4f(0.0, 0.0, 0.0, 1.0)
+            render_hud_gl(self, self.profiler, extra=[self.quality.summary()])
+
+    def toggle_hud(self):
+        self.profiler.hud = not self.profiler.hud
+        if self.profiler.hud and not self.profiler.enabled:
+            self.profiler.enable()
+        self.updateGL()
 
-    def update_simulation(self):
-        y_base = np.linspace(0, 10, self.num_points)
-        distortion_field = self.multi_layer_perlin_noise(self.num_points, self.num_threads, self.noise_scale, 
-                                                         octaves=int(self.wave_size), seed=self.frame * 0.01)
-        
-        self.lines = []
-        total_width = (self.num_threads - 1) * self.line_spacing
-        start_x = -total_width / 2  # Start from the left of the center
+    def set_params(self, **values):
+        # Slider values, applied at the current quality
+        self.quality.request(**values)
+        self.pipeline.set(**self.quality.values())
+
+    def set_max_quality(self, enabled):
+        # Ignore the frame budget, e.g. before exporting
+        self.quality.set_max_quality(enabled)
+        self.pipeline.set(**self.quality.values())
+        self.refresh()
+
+    def observe_quality(self, paint_ms):
+        # Cost of the frame just painted; changes the quality level when it is over or well under budget
+        if self.quality.observe(self.pipeline.step_time * 1000, paint_ms):
+            self.pipeline.set(**self.quality.values())
 
-        for i in range(self.num_threads):
-            x_base = np.full(self.num_points, start_x + i * self.line_spacing)
-            x = x_base + distortion_field[:, i] * self.movement
-            y = y_base + distortion_field[:, i] * self.movement * 2
-            self.lines.append(list(zip(x, y)))
+    def report_error(self):
+        # Shows the worker's error once; the threads hold still from then on
+        if self.shown_error is not self.pipeline.error:
+            self.shown_error = self.pipeline.error
+            QMessageBox.warning(self, "Simulation", f"The simulation stopped: {self.shown_error!r}")
 
-        self.frame += 1
+    def update_simulation(self):
+        # Timer slot: steps the model unless the pipeline runs on its own thread,
+        # then uploads and draws the newest lines if there are any
+        if self.pipeline.error is not None:
+            self.report_error()
+            return
+        if not self.pipeline.running:
+            self.pipeline.step()
+        if self.take_latest():
+            self.updateGL()
+
+    def refresh(self):
+        # Re-layout the frame on screen after a parameter change without advancing the animation
+        self.pipeline.call(FabricModel.refresh)
+        self.take_latest()
         self.updateGL()
 
-    def multi_layer_perlin_noise(self, num_points, num_threads, scale, octaves, seed=0):
-        noise_field = np.zeros((num_points, num_threads))
-        for octave in range(octaves):
-            frequency = 2 ** octave
-            amplitude = 1 / (frequency ** 0.5)
-            for i in range(num_points):
-                for j in range(num_threads):
-                    x = (i / num_points) * scale * frequency + seed
-                    y = (j / num_threads) * scale * frequency + seed
-                    noise_field[i][j] += pnoise2(x, y, octaves=1, repeatx=1024, repeaty=1024, base=0) * amplitude
-        return noise_field
+    def take_latest(self):
+        # Hand the newest finished lines to the renderer; False if there are none
+        if self.pipeline.frame == self.shown_frame:
+            return False
+        with self.pipeline.front() as lines:
+            self.shown_frame = self.pipeline.frame
+            if isinstance(lines, ThreadStrips):
+                self.line_renderer.set_lines(lines.vertices, lines.counts)
+            else:
+                self.line_renderer.set_strips(lines)
+        return True
 
     def mousePressEvent(self, event):
         self.last_pos = event.pos()
@@ -187,28 +249,63 @@ class OrganicMotionSimulation(QMainWindow):
         reset_button.clicked.connect(self.reset_sliders)
         export_button = QPushButton("Export SVG")
         export_button.clicked.connect(self.export_svg)
+        self.poster_button = QPushButton("Export Poster")
+        self.poster_button.clicked.connect(self.export_poster)
+        self.poster_job = None
+        self.record_button = QPushButton("Record")
+        self.record_button.setCheckable(True)
+        self.record_button.toggled.connect(self.toggle_recording)
+        self.recorder = None
+        adaptive_button = QPushButton("Adaptive Detail")
+        adaptive_button.setCheckable(True)
+        adaptive_button.setChecked(True)
+        adaptive_button.toggled.connect(self.gl_widget.set_adaptive)
+        max_quality_button = QPushButton("Max Quality")
+        max_quality_button.setCheckable(True)
+        max_quality_button.toggled.connect(self.gl_widget.set_max_quality)
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(reset_button)
         button_layout.addWidget(export_button)
+        button_layout.addWidget(self.poster_button)
+        button_layout.addWidget(self.record_button)
+        button_layout.addWidget(adaptive_button)
+        button_layout.addWidget(max_quality_button)
         control_layout.addLayout(button_layout)
 
         main_layout.addWidget(self.gl_widget, 3)
         main_layout.addWidget(control_panel, 1)
 
+        # Noise fields are built on a worker thread at 20 steps per second, so
+        # dragging the view stays smooth at high thread counts
+        self.gl_widget.pipeline.start(rate=20)
+        QShortcut(QKeySequence('F3'), self, activated=self.gl_widget.toggle_hud)
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.gl_widget.update_simulation)
-        self.timer.start(50)  # Update every 50 ms
+        self.timer.start(16)  # Check for new lines every 16 ms
+
+    def closeEvent(self, event):
+        self.record_button.setChecked(False)  # Finish the file before the worker goes away
+        self.timer.stop()  # First, so no late tick steps the model on the GUI thread
+        self.gl_widget.pipeline.stop()
+        self.gl_widget.makeCurrent()  # The vertex buffer belongs to the widget's context
+        self.gl_widget.line_renderer.release()
+        self.gl_widget.doneCurrent()
+        if self.poster_job is not None:
+            self.poster_job.wait()  # Let the file be finished rather than cut off
+        super().closeEvent(event)
 
     def update_simulation(self):
-        self.gl_widget.num_threads = self.sliders['num_threads'].value()
-        self.gl_widget.noise_scale = self.sliders['noise_scale'].value() / 100
-        self.gl_widget.wave_size = self.sliders['wave_size'].value()
-        self.gl_widget.movement = self.sliders['movement'].value() / 100
+        self.gl_widget.set_params(
+            num_threads=self.sliders['num_threads'].value(),
+            noise_scale=self.sliders['noise_scale'].value() / 100,
+            wave_size=self.sliders['wave_size'].value(),
+            movement=self.sliders['movement'].value() / 100,
+            line_spacing=self.sliders['line_spacing'].value() / 100)
         self.gl_widget.line_thickness = self.sliders['line_thickness'].value() / 10
-        self.gl_widget.line_spacing = self.sliders['line_spacing'].value() / 100
         self.gl_widget.scale = self.sliders['scale'].value() / 100
-        self.gl_widget.update_simulation()  # Call this to update immediately
+        self.gl_widget.update_detail()
+        self.gl_widget.refresh()  # Call this to update immediately
 
     def reset_sliders(self):
         for name, slider in self.sliders.items():
@@ -218,76 +315,111 @@ class OrganicMotionSimulation(QMainWindow):
                 slider.setValue(70)  # Set scale to 70% when resetting
             else:
                 slider.setValue(slider.minimum() + (slider.maximum() - slider.minimum()) // 2)
-        self.gl_widget.frame = 0
+        self.gl_widget.pipeline.call(FabricModel.reset)
         self.gl_widget.displacement = QVector3D(0, -5, 0)  # Reset to initial position
         self.gl_widget.rotation = QVector3D(0, 0, 0)
         self.gl_widget.updateGL()
 
+    def toggle_recording(self, checked):
+        # Every frame the pipeline publishes goes through a bounded queue to an
+        # encoder thread; frames it can't keep up with are dropped and counted
+        if checked:
+            file_path, _ = QFileDialog.getSaveFileName(self, "Record", "", "GIF files (*.gif);;Animated PNG (*.png);;Video (*.mp4 *.webm)")
+            if not file_path:
+                self.record_button.setChecked(False)  # User cancelled the dialog
+                return
+            pipeline = self.gl_widget.pipeline
+            try:
+                self.recorder = Recorder(pipeline.model, open_writer(file_path, pipeline.rate)).attach(pipeline)
+            except (OSError, RuntimeError, ValueError) as error:
+                # E.g. a video without ffmpeg, or an extension there is no writer for
+                QMessageBox.warning(self, "Record", f"Could not record to '{file_path}': {error}")
+                self.record_button.setChecked(False)
+                return
+            self.record_button.setText("Stop")
+        elif self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
+            self.record_button.setText("Record")
+            try:
+                stats = recorder.close()
+            except Exception as error:
+                # The encoder's error, re-raised once the file is closed
+                QMessageBox.warning(self, "Record", f"Recording failed: {error}")
+                return
+            print(f"Recorded {stats['written']} frames, {stats['dropped']} dropped, "
+                  f"{stats['encode_ms']:.1f} ms per frame")
+
     def export_svg(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save SVG", "", "SVG files (*.svg)")
         if not file_path:
             return  # User cancelled the dialog
 
-        # A4 size in pixels (assuming 96 DPI)
-        width, height = 794, 1123
-        margin = 50  # 50 pixel margin
-
-        generator = QSvgGenerator()
-        generator.setFileName(file_path)
-        generator.setSize(QSize(width, height))
-        generator.setViewBox(QRectF(0, 0, width, height))
-        generator.setTitle("Organic Fabric")
-        generator.setDescription("Generated by Fabric gen @ https://github.com/swap357/pyx")
-
-        painter = QPainter()
-        painter.begin(generator)
-
-        # Set the background to white
-        painter.fillRect(QRectF(0, 0, width, height), QColor(255, 255, 255))
-
-        # Calculate the bounding box of the art
-        min_x = min(min(point[0] for point in line) for line in self.gl_widget.lines)
-        max_x = max(max(point[0] for point in line) for line in self.gl_widget.lines)
-        min_y = min(min(point[1] for point in line) for line in self.gl_widget.lines)
-        max_y = max(max(point[1] for point in line) for line in self.gl_widget.lines)
-
-        # Calculate the scale factor to fit the fabric within the margins
-        art_width = max_x - min_x
-        art_height = max_y - min_y
-        scale_x = (width - 2 * margin) / art_width
-        scale_y = (height - 2 * margin) / art_height
-        scale = min(scale_x, scale_y)
-
-        # Calculate translation to center the art
-        translate_x = (width - art_width * scale) / 2 - min_x * scale
-        translate_y = (height - art_height * scale) / 2 - min_y * scale
-
-        # Set up the painter for drawing the lines
-        painter.setPen(QColor(64, 64, 64, 180))  # Dark grey with some transparency
-        painter.setRenderHint(QPainter.Antialiasing)
-
-        # Draw each line as a path
-        for line in self.gl_widget.lines:
-            path = QPainterPath()
-            first_point = line[0]
-            path.moveTo(QPointF(first_point[0] * scale + translate_x, first_point[1] * scale + translate_y))
-            for point in line[1:]:
-                path.lineTo(QPointF(point[0] * scale + translate_x, point[1] * scale + translate_y))
-            painter.drawPath(path)
-
-        painter.end()
-
+        with self.gl_widget.profiler.stage('export'):
+            self.write_svg(file_path)
         print(f"SVG exported as '{file_path}'")
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    
+    def export_poster(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Poster", "", "TIFF files (*.tif);;PNG files (*.png)")
+        if not file_path:
+            return  # User cancelled the dialog
+        scale, ok = QInputDialog.getDouble(self, "Poster Scale", "Output pixels per canvas pixel:", 8, 1, 64, 1)
+        if not ok:
+            return
+
+        # Tiles are rendered by a process pool from a copy of the frame on
+        # screen, on a background thread; the simulation is only paused while
+        # the model is copied
+        pipeline = self.gl_widget.pipeline
+        running = pipeline.running
+        pipeline.stop()
+        try:
+            with self.gl_widget.profiler.stage('export'), pipeline.front() as state:
+                self.poster_job = PosterJob(pipeline.model, file_path, scale, state)
+        except Exception as error:
+            QMessageBox.warning(self, "Export Poster", f"Could not export '{file_path}': {error}")
+            return
+        finally:
+            if running:
+                pipeline.start()
+        self.poster_button.setEnabled(False)
+        self.poster_button.setText("Rendering...")
+        QTimer.singleShot(100, self.finish_poster)
+
+    def finish_poster(self):
+        # Polls the poster job until it is done, then reports how it went
+        job = self.poster_job
+        if job is None:
+            return
+        if not job.done():
+            QTimer.singleShot(100, self.finish_poster)
+            return
+        self.poster_job = None
+        self.poster_button.setEnabled(True)
+        self.poster_button.setText("Export Poster")
+        if job.error is not None:
+            QMessageBox.warning(self, "Export Poster", f"Could not export '{job.path}': {job.error}")
+        else:
+            print(f"{job.size[0]}x{job.size[1]} poster exported as '{job.path}'")
+
+    def write_svg(self, file_path):
+        # A4 size in pixels (assuming 96 DPI); all threads go into one shared path
+        model = self.gl_widget.model
+        with SvgCanvas(file_path, model.width, model.height, title="Organic Fabric",
+                       description="Generated by Fabric gen @ https://github.com/swap357/pyx") as svg:
+            model.draw(svg)
+
+def main(argv=None):
+    app = QApplication.instance() or QApplication(sys.argv if argv is None else argv)
+
     # Set OpenGL format
     gl_format = QSurfaceFormat()
     gl_format.setVersion(2, 1)
     gl_format.setProfile(QSurfaceFormat.CoreProfile)
     QSurfaceFormat.setDefaultFormat(gl_format)
-    
+
     main_window = OrganicMotionSimulation()
     main_window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    return app.exec_()
+
+if __name__ == '__main__':
+    sys.exit(main())
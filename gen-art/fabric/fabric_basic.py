@@ -3,25 +3,30 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Slider, Button
 from matplotlib.animation import FuncAnimation
-from noise import pnoise2  # Perlin noise function
+from matplotlib.collections import LineCollection
 import io
 import os
-# Function to create a multi-layered Perlin noise field with larger waves
-def multi_layer_perlin_noise(num_points, num_threads, scale, octaves, seed=0):
-    noise_field = np.zeros((num_points, num_threads))
-    for octave in range(octaves):
-        frequency = 2 ** octave
-        amplitude = 1 / (frequency ** 0.5)  # Slower amplitude decrease for larger waves
-        for i in range(num_points):
-            for j in range(num_threads):
-                x = (i / num_points) * scale * frequency + seed
-                y = (j / num_threads) * scale * frequency + seed
-                noise_field[i][j] += pnoise2(x, y, octaves=1, repeatx=1024, repeaty=1024, base=0) * amplitude
-    return noise_field
-
-# Function to update the plot
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Multi-layered Perlin noise fields with larger waves, memoized per octave so
+# slider changes that don't touch the noise reuse the last field
+from fabric.noise_cache import NoiseFieldCache
+
+# (num_threads, num_points, 2) thread vertices from a (num_points, num_threads)
+# distortion field, written into out when it has the right shape
+def thread_lines(distortion_field, distortion_amplitude, line_density, out=None):
+    displacement = distortion_field.T * distortion_amplitude
+    if out is None or out.shape[:2] != displacement.shape:
+        out = np.empty(displacement.shape + (2,))
+    np.add(np.arange(len(displacement))[:, None] * line_density, displacement, out=out[..., 0])
+    np.add(y_base, displacement * 2, out=out[..., 1])  # Increased y-distortion
+    return out
+
+# Function to update the plot: only the thread collection changes, so with
+# blitting each frame redraws just its segments over the cached background
 def update(frame):
-    global slowdown_factor
+    global slowdown_factor, current_seed, lines
     # Get current slider values
     num_threads = int(slider_threads.val)
     noise_scale = slider_noise.val
@@ -32,28 +37,21 @@ def update(frame):
     line_density = slider_density.val
 
     # Update distortion field
-    distortion_field = multi_layer_perlin_noise(num_points, num_threads, noise_scale, octaves=int(wave_size), seed=frame * speed)
+    current_seed = frame * speed
+    distortion_field = noise_cache.field(num_points, num_threads, noise_scale, int(wave_size), seed=current_seed)
 
     # Apply slow-down effect
     slowdown_factor *= 0.995  # Adjust this value for desired slow-down rate
 
-    ax.clear()
-
-    # Generate and plot threads
-    for i in range(num_threads):
-        # Base x-coordinates for each thread
-        x_base = np.full(num_points, i * line_density)
+    lines = thread_lines(distortion_field, distortion_amplitude * slowdown_factor, line_density, lines)
+    threads.set_segments(lines)
+    threads.set_linewidth(line_thickness)
+    return threads,
 
-        # Apply distortions with slow-down factor
-        x = x_base + distortion_field[:, i] * distortion_amplitude * slowdown_factor
-        y = y_base + distortion_field[:, i] * distortion_amplitude * slowdown_factor * 2  # Increased y-distortion
-
-        ax.plot(x, y, color='darkblue', linewidth=line_thickness, alpha=0.7)
-
-    ax.axis('off')
-    ax.set_aspect('equal', adjustable='box')
-    ax.set_title('Organic Motion Simulation', fontsize=16)
-    ax.set_xlim(-1, num_threads * line_density + 1)
+# Axes limits follow the number and spacing of the threads; they are part of
+# the static background, so they only change with the sliders
+def update_limits():
+    ax.set_xlim(-1, int(slider_threads.val) * slider_density.val + 1)
     ax.set_ylim(-2, 12)  # Increased y-range
 
 # Function to reset sliders
@@ -73,7 +71,8 @@ def on_slider_change(val):
     global slowdown_factor
     slowdown_factor = 1.0  # Reset slowdown factor when parameters change
     update(0)  # Call update function directly
-    fig.canvas.draw_idle()  # Redraw the figure
+    update_limits()
+    fig.canvas.draw_idle()  # Redraw the figure, which also refreshes the blitting background
 
 # Function to export the current frame as SVG
 def export_svg(event):
@@ -88,15 +87,12 @@ def export_svg(event):
     line_thickness = slider_thickness.val
     line_density = slider_density.val
 
-    # Update distortion field
-    distortion_field = multi_layer_perlin_noise(num_points, num_threads, noise_scale, octaves=int(wave_size))
+    # Reuse the distortion field that is on screen
+    distortion_field = noise_cache.field(num_points, num_threads, noise_scale, int(wave_size), seed=current_seed)
 
-    # Generate and plot threads
-    for i in range(num_threads):
-        x_base = np.full(num_points, i * line_density)
-        x = x_base + distortion_field[:, i] * distortion_amplitude
-        y = y_base + distortion_field[:, i] * distortion_amplitude * 2  # Increased y-distortion
-        ax_export.plot(x, y, color='black', linewidth=line_thickness, alpha=0.7)
+    # All threads as one collection
+    ax_export.add_collection(LineCollection(thread_lines(distortion_field, distortion_amplitude, line_density),
+                                            colors='black', linewidths=line_thickness, alpha=0.7))
 
     ax_export.axis('off')
     ax_export.set_aspect('equal', adjustable='box')
@@ -124,15 +120,22 @@ num_threads = 1
 num_points = 200
 y_base = np.linspace(0, 10, num_points)
 slowdown_factor = 1.0  # Initialize slowdown factor
+current_seed = 0
+noise_cache = NoiseFieldCache()
+lines = None  # (num_threads, num_points, 2) vertices, reused between frames
 
 # Modify the figure creation and layout
 fig = plt.figure(figsize=(16, 9))
 grid = plt.GridSpec(1, 2, width_ratios=[3, 1])
 
-# Main plot area
+# Main plot area; title, axes and limits are drawn once, the threads are
+# one persistent collection updated in place every frame
 ax = fig.add_subplot(grid[0, 0])
 ax.set_aspect('equal', adjustable='box')
 ax.axis('off')
+ax.set_title('Organic Motion Simulation', fontsize=16)
+threads = LineCollection([], colors='darkblue', alpha=0.7, animated=True)
+ax.add_collection(threads)
 
 # Control panel area
 control_panel = fig.add_subplot(grid[0, 1])
@@ -195,6 +198,7 @@ for slider in sliders:
     slider.valtext.set_fontsize(8)
 
 # Start the animation
-anim = FuncAnimation(fig, update, interval=50)
+update_limits()
+anim = FuncAnimation(fig, update, interval=50, blit=True, cache_frame_data=False)
 
 plt.show()
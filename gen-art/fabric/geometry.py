@@ -0,0 +1,38 @@
+import numpy as np
+
+# Fabric geometry as one (num_threads, num_points, 2) float32 array. The GL
+# renderer, the exporters and other callers all share this buffer.
+
+
+def thread_geometry(distortion_field, line_spacing, movement):
+    # Threads are spaced line_spacing apart and centered on x = 0, run from
+    # y = 0 to 10, and are displaced by the (num_points, num_threads) field
+    num_points, num_threads = distortion_field.shape
+    x_base = (np.arange(num_threads) - (num_threads - 1) / 2) * line_spacing
+    y_base = np.linspace(0, 10, num_points)
+    displacement = distortion_field.T * movement
+
+    lines = np.empty((num_threads, num_points, 2), dtype=np.float32)
+    np.add(x_base[:, None], displacement, out=lines[..., 0])
+    np.add(y_base[None, :], displacement * 2, out=lines[..., 1])
+    return lines
+
+
+def bounds(lines):
+    # (min_x, min_y), (max_x, max_y) over every vertex
+    points = lines.reshape(-1, 2)
+    return points.min(axis=0), points.max(axis=0)
+
+
+def page_transform(lines, width, height, margin):
+    # (scale, translate) that uniformly scales and centers the geometry inside a width x height page
+    low, high = bounds(lines)
+    size = np.maximum(high - low, 1e-12)
+    scale = min((width - 2 * margin) / size[0], (height - 2 * margin) / size[1])
+    translate = (np.array([width, height]) - size * scale) / 2 - low * scale
+    return scale, translate
+
+
+def fit_to_page(lines, width, height, margin):
+    scale, translate = page_transform(lines, width, height, margin)
+    return lines * scale + translate
@@ -0,0 +1,73 @@
+import numpy as np
+from OpenGL.GL import (GL_ARRAY_BUFFER, GL_DYNAMIC_DRAW, GL_FLOAT, GL_LINE_STRIP, GL_VERTEX_ARRAY,
+                       glBindBuffer, glBufferData, glDeleteBuffers, glDisableClientState,
+                       glEnableClientState, glGenBuffers, glMultiDrawArrays, glVertexPointer)
+
+
+class LineRenderer:
+    # Retained-mode line strips for the fabric widget. All vertices live in one
+    # float32 array that is uploaded to a vertex buffer once per simulation step
+    # and drawn with a single glMultiDrawArrays call, so view-only repaints (pan,
+    # rotate, zoom) just re-issue the draw. Only fixed-function GL 1.5 calls are
+    # used, which Mesa's llvmpipe/softpipe renderers support. Without buffer
+    # objects it falls back to a client-side vertex array, still in one call.
+
+    def __init__(self):
+        self.vertices = np.empty((0, 2), dtype=np.float32)
+        self.first = np.empty(0, dtype=np.int32)
+        self.count = np.empty(0, dtype=np.int32)
+        self.vbo = None
+        self.dirty = False
+        self.uploads = 0  # Counters make it easy to check that views don't re-upload
+        self.draws = 0
+
+    def set_strips(self, lines):
+        # lines is a (num_threads, num_points, 2) array or a list of equal-length strips
+        lines = np.asarray(lines, dtype=np.float32)
+        num_strips, num_points = lines.shape[:2]
+        self.set_lines(lines.reshape(-1, 2), np.full(num_strips, num_points, dtype=np.int32))
+
+    def set_lines(self, vertices, counts):
+        # vertices is (n, 2) with strips stored back to back; counts gives each strip's length
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.count = np.ascontiguousarray(counts, dtype=np.int32)
+        self.first = (np.cumsum(self.count) - self.count).astype(np.int32)
+        self.dirty = True
+
+    def invalidate(self):
+        # Call when the GL context is (re)created; the buffer is re-uploaded on the next draw
+        self.vbo = None
+        self.dirty = True
+
+    def upload(self):
+        if self.vbo is None and bool(glGenBuffers):
+            self.vbo = glGenBuffers(1)
+        if self.vbo is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_DYNAMIC_DRAW)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.dirty = False
+        self.uploads += 1
+
+    def draw(self):
+        if self.dirty:
+            self.upload()
+        if not len(self.count):
+            return
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        if self.vbo is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glVertexPointer(2, GL_FLOAT, 0, None)
+        else:
+            glVertexPointer(2, GL_FLOAT, 0, self.vertices)
+        glMultiDrawArrays(GL_LINE_STRIP, self.first, self.count, len(self.count))
+        if self.vbo is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        self.draws += 1
+
+    def release(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+        self.invalidate()
@@ -0,0 +1,108 @@
+import numpy as np
+
+from common.perlin import multi_layer_perlin_points
+
+
+class ThreadStrips:
+    # Adaptively sampled fabric threads, ready for LineRenderer.set_lines:
+    # (n, 2) float32 vertices stored thread after thread and each thread's
+    # vertex count. time and params are what they were sampled from, so
+    # exports can build the fixed grid of the same frame instead.
+
+    def __init__(self, vertices, counts, time, params):
+        self.vertices = vertices
+        self.counts = counts
+        self.time = time
+        self.params = params
+
+
+class ThreadLod:
+    # Level of detail for the fabric threads. Instead of num_points vertices
+    # per thread, each thread starts from a coarse uniform sampling and every
+    # segment is halved while its curve is predicted to stray more than
+    # `tolerance` screen pixels from the straight segment, is longer than
+    # `min_length` pixels and is not already max_density times finer than the
+    # fixed grid. Straight or sub-pixel stretches stay coarse, and more pixels
+    # per unit refine the same threads further. Threads too wiggly to resolve
+    # on screen stop at `budget` times the fixed grid's vertex count,
+    # splitting the worst segments first; the default of 1 means adaptive
+    # detail never draws more vertices than the fixed grid.
+    #
+    # The prediction needs no extra noise samples: for three equally spaced
+    # samples a, m, b the segments either side of m stray about
+    # |a - 2m + b| / 8 from their midpoints (the curvature times the squared
+    # step over 8). It is doubled since noise isn't a parabola between
+    # samples. Noise is only evaluated at the samples that are kept.
+    #
+    # The sample positions are those of thread_geometry, so where a sample
+    # falls on one of the fixed grid's points it lands on the same vertex.
+
+    def __init__(self, tolerance=0.5, min_length=2.0, max_density=4, base_segments=8, budget=1.0):
+        self.tolerance = tolerance
+        self.min_length = min_length
+        self.max_density = max_density
+        self.base_segments = base_segments
+        self.budget = budget
+        self.vertices = 0  # Kept by the last build, for comparing against the fixed grid
+
+    def coarse_segments(self, params):
+        # Segments per thread to start from: coarse enough to be cheap, fine
+        # enough that the highest octave gets a few samples per lattice cell,
+        # but never finer than the fixed grid
+        last = params['num_points'] - 1
+        cells = params['noise_scale'] * 2 ** (int(params['wave_size']) - 1) * last / params['num_points']
+        return int(min(max(self.base_segments, np.ceil(4 * cells)), last))
+
+    def saves_vertices(self, params):
+        # False when the starting samples already are the fixed grid and the
+        # budget allows no more; the fixed grid is then the same vertices,
+        # built faster from whole noise layers
+        return self.coarse_segments(params) < params['num_points'] - 1 or self.budget > 1
+
+    def build(self, params, time, pixels_per_unit):
+        # params is FabricModel.thread_params(); time is the frame's noise seed
+        num_points, num_threads = params['num_points'], params['num_threads']
+        last = num_points - 1
+        segments = self.coarse_segments(params)
+        s = np.tile(np.linspace(0, last, segments + 1), num_threads)
+        thread = np.repeat(np.arange(num_threads), segments + 1)
+        points = self.positions(params, time, s, thread)
+
+        # Predicted deviation of each segment from the samples around it, in pixels
+        bend = np.zeros(len(s))
+        bend[1:-1] = np.hypot(*(points[:-2] - 2 * points[1:-1] + points[2:]).T) * (thread[:-2] == thread[2:])
+        estimate = np.maximum(bend[:-1], bend[1:]) * (pixels_per_unit / 4)
+        estimate[thread[:-1] != thread[1:]] = 0  # Not a segment, the gap between two threads
+
+        min_step = 2 / self.max_density  # Halving a segment this short would pass max_density
+        budget = int(self.budget * num_points * num_threads)
+        while True:
+            k = np.flatnonzero(estimate > self.tolerance)
+            k = k[s[k + 1] - s[k] >= min_step]
+            k = k[np.hypot(*(points[k + 1] - points[k]).T) * pixels_per_unit > self.min_length]
+            if len(k) > budget - len(points):
+                k = np.sort(k[np.argsort(estimate[k])[len(k) - max(budget - len(points), 0):]])
+            if not len(k):
+                break
+            middle = (s[k] + s[k + 1]) / 2
+            added = self.positions(params, time, middle, thread[k])
+            child = np.hypot(*(points[k] - 2 * added + points[k + 1]).T) * (pixels_per_unit / 4)
+            s = np.insert(s, k + 1, middle)
+            thread = np.insert(thread, k + 1, thread[k])
+            points = np.insert(points, k + 1, added, axis=0)
+            estimate = np.insert(estimate, k + 1, child)
+            estimate[k + np.arange(len(k))] = child  # The first half of each split segment
+
+        self.vertices = len(points)
+        counts = np.bincount(thread, minlength=num_threads).astype(np.int32)
+        return ThreadStrips(points.astype(np.float32), counts, time, params)
+
+    @staticmethod
+    def positions(params, time, s, thread):
+        # Points of thread_geometry at fractional sample indices s of the given threads
+        num_points, num_threads = params['num_points'], params['num_threads']
+        displacement = multi_layer_perlin_points(
+            s / num_points, thread / num_threads, params['noise_scale'], int(params['wave_size']),
+            seed=time, base=params['base']) * params['movement']
+        x_base = (thread - (num_threads - 1) / 2) * params['line_spacing']
+        return np.stack([x_base + displacement, s * (10 / (num_points - 1)) + displacement * 2], axis=1)
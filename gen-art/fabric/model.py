@@ -0,0 +1,113 @@
+import threading
+
+import numpy as np
+
+from fabric.noise_cache import NoiseFieldCache
+from common.profiling import FrameProfiler
+from fabric.geometry import thread_geometry, fit_to_page
+from fabric.lod import ThreadStrips
+
+
+class FabricModel:
+    # Parameters and thread geometry of the fabric demo, free of Qt and OpenGL
+    # so it can be stepped and drawn headless. The animation is a pure function
+    # of the frame number; seed picks the Perlin lattice (None and 0 give the
+    # original look). width, height and margin describe the page the threads
+    # are fitted to when drawn, A4 at 96 DPI like the SVG export.
+    #
+    # With a ThreadLod in lod, lines is a ThreadStrips sampled for a view of
+    # pixels_per_unit screen pixels per model unit instead of the fixed
+    # (num_threads, num_points, 2) grid, unless it would have as many
+    # vertices; see fabric/lod.py.
+
+    def __init__(self, seed=None):
+        self.lines = np.empty((0, 0, 2), dtype=np.float32)  # (num_threads, num_points, 2)
+        self.num_points = 50
+        self.num_threads = 1
+        self.noise_scale = 0.2
+        self.wave_size = 4
+        self.movement = 1.0
+        self.line_spacing = 0.05
+        self.frame = 0
+        self.time = 0.0  # Noise seed of the current lines
+        self.lod = None
+        self.pixels_per_unit = 30.0
+        self.seed = seed
+        self.noise_cache = NoiseFieldCache(base=(seed or 0) % 256)
+        self.width, self.height = 794, 1123
+        self.margin = 50
+        self.profiler = FrameProfiler()  # Disabled unless a widget shares its own; times the 'noise' stage
+        self._export_cache = NoiseFieldCache(max_bytes=8 * 1024 * 1024, base=self.noise_cache.base)
+        self._export_lock = threading.Lock()
+
+    def reset(self):
+        self.frame = 0
+
+    def step(self):
+        self.build_lines(self.frame * 0.01)
+        self.frame += 1
+
+    def refresh(self):
+        # Rebuild the current frame after a parameter change without advancing
+        # the animation; the noise field comes from the cache unless it changed
+        self.build_lines(max(self.frame - 1, 0) * 0.01)
+
+    def build_lines(self, seed):
+        self.time = seed
+        if self.lod is not None and self.lod.saves_vertices(self.thread_params()):
+            with self.profiler.stage('noise'):
+                self.lines = self.lod.build(self.thread_params(), seed, self.pixels_per_unit)
+            return
+        with self.profiler.stage('noise'):
+            distortion_field = self.noise_cache.field(self.num_points, self.num_threads, self.noise_scale,
+                                                      int(self.wave_size), seed=seed)
+        # Threads are centered on x = 0
+        self.lines = thread_geometry(distortion_field, self.line_spacing, self.movement)
+
+    def grid_lines(self, strips):
+        # The fixed (num_threads, num_points, 2) grid of the frame a ThreadStrips
+        # was sampled from. draw() runs on the GUI and recorder threads while
+        # the worker steps, so this has its own noise cache and lock instead of
+        # sharing the worker's.
+        params = strips.params
+        with self._export_lock:
+            distortion_field = self._export_cache.field(params['num_points'], params['num_threads'],
+                                                        params['noise_scale'], int(params['wave_size']),
+                                                        seed=strips.time)
+        return thread_geometry(distortion_field, params['line_spacing'], params['movement'])
+
+    def thread_params(self):
+        # Everything the thread geometry depends on besides the frame
+        return {'num_points': self.num_points, 'num_threads': self.num_threads,
+                'noise_scale': self.noise_scale, 'wave_size': self.wave_size, 'movement': self.movement,
+                'line_spacing': self.line_spacing, 'base': self.noise_cache.base}
+
+    def snapshot(self, buffer=None):
+        # Every build makes a new lines array, so handing it out needs no copy
+        return self.lines
+
+    def page_lines(self, lines=None):
+        # Scale the art to fit within the margins and center it, all threads at once
+        lines = self.lines if lines is None else lines
+        return fit_to_page(lines, self.width, self.height, self.margin)
+
+    def draw(self, target, state=None):
+        # Dark grey with some transparency, like the SVG export's pen; state is
+        # a snapshot() to draw instead of the current lines
+        lines = self.lines if state is None else state
+        if isinstance(lines, ThreadStrips):
+            # Sampled for the screen; targets get the fixed grid of the same
+            # frame, as with Adaptive Detail off, which costs a cached noise
+            # field instead of another adaptive build at page resolution
+            lines = self.grid_lines(lines)
+        target.polylines(self.page_lines(lines), (64, 64, 64), 1, 180 / 255)
+
+    def __getstate__(self):
+        # Copies (e.g. for poster workers) get a lock of their own
+        state = self.__dict__.copy()
+        del state['_export_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._export_lock = threading.Lock()
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from common import kernels
+import common.perlin  # Registers the perlin_layer reference kernel
+
+
+class NoiseFieldCache:
+    # Memoizes Perlin distortion fields keyed by (num_points, num_threads,
+    # noise_scale, octaves, seed). Fields are built from per-octave layers that
+    # are cached on their own, so asking for more octaves only computes the new
+    # ones. Entries are evicted least-recently-used first once the cached arrays
+    # exceed max_bytes. base picks one of 256 Perlin lattices, so differently
+    # seeded fabrics use separate caches.
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, dtype=np.float32, base=0):
+        self.max_bytes = max_bytes
+        self.dtype = dtype
+        self.base = base
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def field(self, num_points, num_threads, scale, octaves, seed=0):
+        # The returned array is shared with the cache and read-only
+        key = ('field', num_points, num_threads, scale, octaves, seed)
+        field = self._get(key)
+        if field is not None:
+            return field
+        field = np.zeros((num_points, num_threads), dtype=self.dtype)
+        for octave in range(octaves):
+            field += self.layer(num_points, num_threads, scale, octave, seed)
+        return self._put(key, field)
+
+    def layer(self, num_points, num_threads, scale, octave, seed=0):
+        key = ('layer', num_points, num_threads, scale, octave, seed)
+        layer = self._get(key)
+        if layer is not None:
+            return layer
+        layer = kernels.get('perlin_layer')(num_points, num_threads, scale, octave, seed=seed,
+                                            repeatx=1024, repeaty=1024, base=self.base, dtype=self.dtype)
+        return self._put(key, layer)
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+        }
+
+    def _get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _put(self, key, value):
+        value.setflags(write=False)
+        if value.nbytes > self.max_bytes:
+            return value  # Too big to ever fit, hand it back uncached
+        self.entries[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+        return value
@@ -0,0 +1,172 @@
+import numpy as np
+
+from common.perlin import pnoise2
+from fluid_flow.particles import wrap_into
+
+# Field generators take canvas coordinates, the simulation time and the flow
+# scale, and return the flow angle in radians. They are only evaluated on grid
+# nodes, so an expensive generator costs nothing extra per particle.
+
+
+def sine_field(x, y, time, flow_scale):
+    # The analytic field FluidFlowWidget uses
+    return (np.sin(x * flow_scale + time) +
+            np.sin(y * flow_scale + time) +
+            np.sin((x + y) * flow_scale + time)) * np.pi
+
+
+def perlin_field(x, y, time, flow_scale):
+    return pnoise2(x * flow_scale + time, y * flow_scale + time) * 2 * np.pi
+
+
+def curl_field(x, y, time, flow_scale, eps=1e-3):
+    # Direction of the curl of a Perlin potential, giving divergence-free swirls
+    def potential(px, py):
+        return pnoise2(px * flow_scale + time, py * flow_scale)
+    h = eps / flow_scale
+    vx = (potential(x, y + h) - potential(x, y - h)) / (2 * h)
+    vy = -(potential(x + h, y) - potential(x - h, y)) / (2 * h)
+    return np.arctan2(vy, vx)
+
+
+FIELDS = {
+    'sine': sine_field,
+    'perlin': perlin_field,
+    'curl': curl_field,
+}
+
+
+class FlowFieldGrid:
+    # Flow direction sampled on a grid of nodes cell_size pixels apart and looked
+    # up per particle with bilinear interpolation. With keyframe_dt = None the
+    # grid is resampled at every new time; otherwise it is sampled at multiples
+    # of keyframe_dt and blended linearly in between. Directions are stored as
+    # complex unit vectors so interpolation is safe across angle wrap-around and
+    # each corner lookup is a single gather.
+
+    def __init__(self, field=sine_field, cell_size=8, keyframe_dt=None):
+        self.field = FIELDS.get(field, field)
+        self.cell_size = cell_size
+        self.keyframe_dt = keyframe_dt
+        self.vectors = None  # (rows * cols,) complex64 directions at the current time
+        self.shape = (0, 0)
+        self._key = None
+        self._keyframes = {}
+        self._scratch = {}
+
+    def update(self, time, flow_scale, width, height):
+        key = (flow_scale, width, height, self.cell_size)
+        if key != self._key:
+            self._key = key
+            self._keyframes = {}
+            cols = int(np.ceil(width / self.cell_size)) + 2
+            rows = int(np.ceil(height / self.cell_size)) + 2
+            self.shape = (rows, cols)
+            gy, gx = np.mgrid[0:rows, 0:cols] * float(self.cell_size)
+            self._nodes = (gx.ravel(), gy.ravel())
+
+        if self.keyframe_dt is None:
+            self.vectors = self._sample(time, flow_scale)
+            return self.vectors
+
+        k = int(np.floor(time / self.keyframe_dt))
+        for frame in (k, k + 1):
+            if frame not in self._keyframes:
+                self._keyframes[frame] = self._sample(frame * self.keyframe_dt, flow_scale)
+        for frame in list(self._keyframes):
+            if frame not in (k, k + 1):
+                del self._keyframes[frame]
+        alpha = np.float32(time / self.keyframe_dt - k)
+        v0, v1 = self._keyframes[k], self._keyframes[k + 1]
+        self.vectors = v0 + alpha * (v1 - v0)
+        return self.vectors
+
+    def _sample(self, time, flow_scale):
+        angle = self.field(self._nodes[0], self._nodes[1], time, flow_scale)
+        return np.exp(1j * angle).astype(np.complex64)
+
+    def _buffers(self, count):
+        if self._scratch.get('count', 0) < count:
+            self._scratch = {
+                'count': count,
+                'fx': np.empty(count, dtype=np.float32),
+                'fy': np.empty(count, dtype=np.float32),
+                'tmp': np.empty(count, dtype=np.float32),
+                'index': np.empty(count, dtype=np.intp),
+                'row': np.empty(count, dtype=np.intp),
+                'corner': np.empty(count, dtype=np.complex64),
+                'bottom': np.empty(count, dtype=np.complex64),
+                'out': np.empty(count, dtype=np.complex64),
+            }
+        return {name: buf[:count] for name, buf in self._scratch.items() if name != 'count'}
+
+    def sample(self, x, y):
+        # Bilinear lookup of the direction at each (x, y); returns complex unit
+        # vectors (real = dx, imag = dy) in a scratch buffer reused by the next call
+        rows, cols = self.shape
+        b = self._buffers(len(x))
+        fx, fy, tmp, index, row = b['fx'], b['fy'], b['tmp'], b['index'], b['row']
+        corner, bottom, out = b['corner'], b['bottom'], b['out']
+
+        inv_cell = 1 / self.cell_size
+        np.multiply(x, inv_cell, out=fx)
+        np.floor(fx, out=tmp)
+        np.clip(tmp, 0, cols - 2, out=tmp)
+        np.copyto(index, tmp, casting='unsafe')
+        fx -= tmp
+        np.multiply(y, inv_cell, out=fy)
+        np.floor(fy, out=tmp)
+        np.clip(tmp, 0, rows - 2, out=tmp)
+        np.copyto(row, tmp, casting='unsafe')
+        fy -= tmp
+        row *= cols
+        index += row  # Flat index of the top-left node
+
+        # Top edge: out = v00 + fx * (v10 - v00)
+        np.take(self.vectors, index, out=out)
+        index += 1
+        np.take(self.vectors, index, out=corner)
+        corner -= out
+        corner *= fx
+        out += corner
+        # Bottom edge: bottom = v01 + fx * (v11 - v01), then blend with fy
+        index += cols
+        np.take(self.vectors, index, out=bottom)
+        index -= 1
+        np.take(self.vectors, index, out=corner)
+        bottom -= corner
+        bottom *= fx
+        bottom += corner
+        bottom -= out
+        bottom *= fy
+        out += bottom
+
+        # Renormalize so particles keep moving at the configured speed
+        np.abs(out, out=tmp)
+        np.maximum(tmp, 1e-12, out=tmp)
+        np.reciprocal(tmp, out=tmp)
+        out *= tmp
+        return out
+
+    def max_error(self, width, height, time, flow_scale, samples=4096, rng=None):
+        # Largest angle difference (radians) between the grid and the analytic
+        # field at random probe points, for tuning cell_size / keyframe_dt
+        rng = np.random.default_rng(0) if rng is None else rng
+        x = (rng.random(samples) * width).astype(np.float32)
+        y = (rng.random(samples) * height).astype(np.float32)
+        self.update(time, flow_scale, width, height)
+        approx = self.sample(x, y)
+        exact = self.field(x.astype(np.float64), y.astype(np.float64), time, flow_scale)
+        diff = np.angle(approx) - exact
+        return float(np.abs((diff + np.pi) % (2 * np.pi) - np.pi).max())
+
+
+def advect_grid(particles, grid, speed, width, height):
+    # Same step as particles.advect, with directions looked up from the grid
+    x, y, tmp = particles.x, particles.y, particles.tmp
+    direction = grid.sample(x, y)
+    direction *= speed
+    x += direction.real
+    y += direction.imag
+    wrap_into(x, width, tmp)
+    wrap_into(y, height, tmp)
@@ -1,59 +1,155 @@
 import sys
 import numpy as np
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QSlider, QPushButton, QLabel, QFileDialog
-from PyQt5.QtCore import Qt, QTimer, QPoint, QSize, QRectF
-from PyQt5.QtGui import QPainter, QColor, QPen
-from PyQt5.QtSvg import QSvgGenerator
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QSlider, QPushButton, QLabel, QFileDialog, QInputDialog, QMessageBox, QShortcut
+from PyQt5.QtCore import Qt, QTimer, QPoint
+from PyQt5.QtGui import QPainter, QColor, QPen, QImage, QKeySequence
+import os
+import time
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fluid_flow.model import FluidFlowModel
+from fluid_flow.raster import ParticleRaster
+from fluid_flow.trails import TrailBuffer
+from common.png import write_png
+from common.pipeline import SimulationPipeline
+from common.profiling import FrameProfiler
+from common.hud import draw_hud
+from common.recorder import Recorder, open_writer
+from common.recording import PositionRecorder, EXTENSION as RECORDING_EXTENSION
+from common.svg import SvgCanvas
+from common.poster import PosterJob
+from common.quality import QualityController, scaled
 
 class FluidFlowWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, seed=None):
         super(FluidFlowWidget, self).__init__(parent)
         self.setMinimumSize(600, 400)
-        self.particles = []
-        self.num_particles = 5000  # Increased default number of particles
-        self.flow_scale = 0.005
-        self.speed = 1.0
-        self.particle_size = 1  # Reduced default particle size for density
-        self.time = 0
+        self.model = FluidFlowModel(seed=seed)  # Parameters and particles; see fluid_flow/model.py
+        # 'raster' splats into a NumPy buffer, 'points' draws each particle with
+        # QPainter, 'trails' shows the long exposure built up in self.trails
+        self.render_mode = 'raster'
+        self.raster = ParticleRaster()
+        self.trails = TrailBuffer()
+        # Stage timings; off unless GENART_PROFILE is set or the HUD is toggled with F3
+        self.profiler = FrameProfiler.from_env(target_fps=60)
+        # Steps on the GUI thread until the window starts it on a worker thread
+        self.pipeline = SimulationPipeline(self.model, profiler=self.profiler)
+        self.shown_error = None
+        self.shown_frame = -1
+        # Scales the slider values down while frames run over budget and back up when there is room
+        self.quality = QualityController({'num_particles': scaled(500), 'particle_size': scaled(1)},
+                                         budget_ms=1000 / 60)
+        self.quality.request(num_particles=self.model.num_particles, particle_size=self.model.particle_size)
 
     def paintEvent(self, event):
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        for particle in self.particles:
-            x, y = particle
-            color = self.get_color(x, y)
-            painter.setPen(QPen(color, self.particle_size))
-            painter.drawPoint(int(x), int(y))
+        started = time.perf_counter()
+        with self.profiler.stage('paint'):
+            if self.render_mode in ('raster', 'trails'):
+                rgba = self.render_frame()
+                # Wraps the NumPy buffer without copying; rgba stays alive until the draw is done
+                image = QImage(rgba.data, rgba.shape[1], rgba.shape[0], rgba.strides[0], QImage.Format_RGBA8888)
+                painter.drawImage(0, 0, image)
+            else:
+                painter.setRenderHint(QPainter.Antialiasing)
+                self.draw_points(painter)
+        self.observe_quality((time.perf_counter() - started) * 1000)
+        self.profiler.frame()
+        if self.profiler.hud:
+            draw_hud(painter, self.profiler, extra=[self.quality.summary()])
+
+    def toggle_hud(self):
+        self.profiler.hud = not self.profiler.hud
+        if self.profiler.hud and not self.profiler.enabled:
+            self.profiler.enable()
+        self.update()
+
+    def set_params(self, **values):
+        # Slider values, applied at the current quality
+        self.quality.request(**values)
+        self.pipeline.set(**self.quality.values())
+
+    def set_max_quality(self, enabled):
+        # Ignore the frame budget, e.g. before exporting
+        self.quality.set_max_quality(enabled)
+        self.pipeline.set(**self.quality.values())
+
+    def observe_quality(self, paint_ms):
+        # Cost of the frame just painted; changes the quality level when it is over or well under budget
+        if self.quality.observe(self.pipeline.step_time * 1000, paint_ms):
+            self.pipeline.set(**self.quality.values())
+
+    def draw_points(self, painter):
+        with self.pipeline.front() as positions:
+            if positions is None:
+                return
+            for x, y in zip(positions[0].tolist(), positions[1].tolist()):
+                color = self.get_color(x, y)
+                painter.setPen(QPen(color, self.model.particle_size))
+                painter.drawPoint(int(x), int(y))
+
+    def set_render_mode(self, mode):
+        # Trails are deposited on the simulation thread for every published
+        # frame, including the ones the repaint timer never shows
+        listening = self.deposit_trails in self.pipeline.listeners
+        if mode == 'trails' and not listening:
+            self.trails.resize(self.width(), self.height())
+            self.pipeline.listeners.append(self.deposit_trails)
+        elif mode != 'trails' and listening:
+            self.pipeline.listeners.remove(self.deposit_trails)
+        self.render_mode = mode
+        self.update()
+
+    def deposit_trails(self, positions):
+        self.trails.deposit(positions[0], positions[1], self.model.particle_size)
+
+    def render_frame(self):
+        # RGBA of the current raster or trail view
+        if self.render_mode == 'trails':
+            self.trails.resize(self.width(), self.height())
+            return self.trails.render()
+        return self.render_raster()
+
+    def render_raster(self):
+        self.raster.resize(self.width(), self.height())
+        with self.pipeline.front() as positions:
+            if positions is None:
+                self.raster.clear()
+                return self.raster.rgba
+            return self.raster.draw(positions[0], positions[1], self.model.particle_size)
 
     def get_color(self, x, y):
         # Generate a grayscale color based on the position of the particle
         intensity = int((np.sin(x * 0.01 + y * 0.01) + 1) * 127)
         return QColor(intensity, intensity, intensity)
 
-    def update_simulation(self):
-        if not self.particles:
-            self.particles = [(np.random.rand() * self.width(), np.random.rand() * self.height()) for _ in range(self.num_particles)]
-
-        new_particles = []
-        for x, y in self.particles:
-            angle = self.flow_field(x, y)
-            dx = np.cos(angle) * self.speed
-            dy = np.sin(angle) * self.speed
-            new_x = (x + dx) % self.width()
-            new_y = (y + dy) % self.height()
-            new_particles.append((new_x, new_y))
-
-        self.particles = new_particles
-        self.time += 0.01
-        self.update()
+    def start_simulation(self, rate):
+        # Step on a worker thread from now on; the canvas size is applied first so
+        # the first points spawn across all of it
+        self.pipeline.set(width=self.width(), height=self.height())
+        self.pipeline.start(rate)
 
-    def flow_field(self, x, y):
-        # Create a flow field using Perlin-like noise
-        angle = (np.sin(x * self.flow_scale + self.time) + 
-                 np.sin(y * self.flow_scale + self.time) + 
-                 np.sin((x + y) * self.flow_scale + self.time)) * np.pi
-        return angle
+    def report_error(self):
+        # The worker stopped on an error; shown once, and the model is left
+        # alone rather than stepped again on the GUI thread
+        if self.shown_error is not self.pipeline.error:
+            self.shown_error = self.pipeline.error
+            QMessageBox.warning(self, "Simulation", f"The simulation stopped: {self.shown_error!r}")
+
+    def update_simulation(self):
+        # Timer slot: steps the model unless the pipeline runs on its own thread,
+        # then repaints if a new frame is ready
+        if (self.model.width, self.model.height) != (self.width(), self.height()):
+            self.pipeline.set(width=self.width(), height=self.height())
+        if self.pipeline.error is not None:
+            self.report_error()
+            return
+        if not self.pipeline.running:
+            self.pipeline.step()
+        if self.pipeline.frame != self.shown_frame:
+            self.shown_frame = self.pipeline.frame
+            self.update()
 
 class FluidFlowSimulation(QMainWindow):
     def __init__(self):
@@ -95,25 +191,71 @@ class FluidFlowSimulation(QMainWindow):
         reset_button.clicked.connect(self.reset_sliders)
         export_button = QPushButton("Export SVG")
         export_button.clicked.connect(self.export_svg)
+        self.poster_button = QPushButton("Export Poster")
+        self.poster_button.clicked.connect(self.export_poster)
+        self.poster_job = None
+        self.record_button = QPushButton("Record")
+        self.record_button.setCheckable(True)
+        self.record_button.toggled.connect(self.toggle_recording)
+        self.recorder = None
+        export_png_button = QPushButton("Export PNG")
+        export_png_button.clicked.connect(self.export_png)
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(reset_button)
         button_layout.addWidget(export_button)
+        button_layout.addWidget(export_png_button)
+        button_layout.addWidget(self.poster_button)
+        button_layout.addWidget(self.record_button)
         control_layout.addLayout(button_layout)
 
+        trails_button = QPushButton("Trails")
+        trails_button.setCheckable(True)
+        trails_button.toggled.connect(lambda checked: self.flow_widget.set_render_mode('trails' if checked else 'raster'))
+        save_trails_button = QPushButton("Save Trails")
+        save_trails_button.clicked.connect(self.save_trails)
+        load_trails_button = QPushButton("Load Trails")
+        load_trails_button.clicked.connect(self.load_trails)
+
+        trails_layout = QHBoxLayout()
+        trails_layout.addWidget(trails_button)
+        trails_layout.addWidget(save_trails_button)
+        trails_layout.addWidget(load_trails_button)
+        max_quality_button = QPushButton("Max Quality")
+        max_quality_button.setCheckable(True)
+        max_quality_button.toggled.connect(self.flow_widget.set_max_quality)
+        trails_layout.addWidget(max_quality_button)
+        control_layout.addLayout(trails_layout)
+
         main_layout.addWidget(self.flow_widget, 3)
         main_layout.addWidget(control_panel, 1)
 
+        QShortcut(QKeySequence('F3'), self, activated=self.flow_widget.toggle_hud)
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.flow_widget.update_simulation)
         self.timer.start(16)  # Update every 16 ms (approx. 60 FPS)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Particles advance on a worker thread at 60 steps per second; the timer
+        # only repaints the newest finished frame, dropping any it missed
+        self.flow_widget.start_simulation(rate=60)
+
+    def closeEvent(self, event):
+        self.record_button.setChecked(False)  # Finish the file before the worker goes away
+        self.timer.stop()  # Or its next tick would step the model again on this thread
+        self.flow_widget.pipeline.stop()
+        self.flow_widget.model.close()  # Advection workers, when the model runs any
+        if self.poster_job is not None:
+            self.poster_job.wait()  # Let the file be finished rather than cut off
+        super().closeEvent(event)
+
     def update_simulation(self):
-        self.flow_widget.num_particles = self.sliders['num_particles'].value()
-        self.flow_widget.flow_scale = self.sliders['flow_scale'].value() / 10000
-        self.flow_widget.speed = self.sliders['speed'].value() / 10
-        self.flow_widget.particle_size = self.sliders['particle_size'].value()
-        self.flow_widget.particles = []  # Reset particles to apply new settings
+        self.flow_widget.set_params(
+            num_particles=self.sliders['num_particles'].value(),
+            flow_scale=self.sliders['flow_scale'].value() / 10000,
+            speed=self.sliders['speed'].value() / 10,
+            particle_size=self.sliders['particle_size'].value())
 
     def reset_sliders(self):
         default_values = {
@@ -124,39 +266,143 @@ class FluidFlowSimulation(QMainWindow):
         }
         for name, value in default_values.items():
             self.sliders[name].setValue(value)
-        self.flow_widget.time = 0
-        self.flow_widget.particles = []
+        self.flow_widget.pipeline.call(FluidFlowModel.reset)
+
+    def toggle_recording(self, checked):
+        # Every frame the pipeline publishes goes through a bounded queue to an
+        # encoder thread; frames it can't keep up with are dropped and counted.
+        # A .genrec file keeps the positions instead, for replaying or
+        # re-rendering with gen-art/common/recording.py.
+        if checked:
+            file_path, _ = QFileDialog.getSaveFileName(self, "Record", "", "GIF files (*.gif);;Animated PNG (*.png);;Video (*.mp4 *.webm);;Positions (*.genrec)")
+            if not file_path:
+                self.record_button.setChecked(False)  # User cancelled the dialog
+                return
+            pipeline = self.flow_widget.pipeline
+            try:
+                if file_path.lower().endswith(RECORDING_EXTENSION):
+                    self.recorder = PositionRecorder(pipeline.model, file_path, rate=pipeline.rate).attach(pipeline)
+                else:
+                    self.recorder = Recorder(pipeline.model, open_writer(file_path, pipeline.rate)).attach(pipeline)
+            except (OSError, RuntimeError, ValueError) as error:
+                # E.g. a video without ffmpeg, or an extension there is no writer for
+                QMessageBox.warning(self, "Record", f"Could not record to '{file_path}': {error}")
+                self.record_button.setChecked(False)
+                return
+            self.record_button.setText("Stop")
+        elif self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
+            self.record_button.setText("Record")
+            try:
+                stats = recorder.close()
+            except Exception as error:
+                # The encoder's error, re-raised once the file is closed
+                QMessageBox.warning(self, "Record", f"Recording failed: {error}")
+                return
+            print(f"Recorded {stats['written']} frames, {stats['dropped']} dropped, "
+                  f"{stats['encode_ms']:.1f} ms per frame")
 
     def export_svg(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save SVG", "", "SVG files (*.svg)")
         if not file_path:
             return  # User cancelled the dialog
 
-        generator = QSvgGenerator()
-        generator.setFileName(file_path)
-        generator.setSize(QSize(self.flow_widget.width(), self.flow_widget.height()))
-        generator.setViewBox(QRectF(0, 0, self.flow_widget.width(), self.flow_widget.height()))
-        generator.setTitle("Fluid Flow")
-        generator.setDescription("Generated by Fluid Flow gen art")
-
-        painter = QPainter()
-        painter.begin(generator)
-        
-        # Set the background to white
-        painter.fillRect(QRectF(0, 0, self.flow_widget.width(), self.flow_widget.height()), QColor(255, 255, 255))
-
-        # Draw particles
-        for particle in self.flow_widget.particles:
-            x, y = particle
-            color = self.flow_widget.get_color(x, y)
-            painter.setPen(QPen(color, self.flow_widget.particle_size))
-            painter.drawPoint(int(x), int(y))
-
-        painter.end()
+        with self.flow_widget.profiler.stage('export'):
+            self.write_svg(file_path)
         print(f"SVG exported as '{file_path}'")
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    def export_poster(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Poster", "", "TIFF files (*.tif);;PNG files (*.png)")
+        if not file_path:
+            return  # User cancelled the dialog
+        scale, ok = QInputDialog.getDouble(self, "Poster Scale", "Output pixels per canvas pixel:", 8, 1, 64, 1)
+        if not ok:
+            return
+
+        # Tiles are rendered by a process pool from a copy of the frame on
+        # screen, on a background thread; the simulation is only paused while
+        # the model is copied
+        pipeline = self.flow_widget.pipeline
+        running = pipeline.running
+        pipeline.stop()
+        try:
+            with self.flow_widget.profiler.stage('export'), pipeline.front() as state:
+                self.poster_job = PosterJob(pipeline.model, file_path, scale, state)
+        except Exception as error:
+            QMessageBox.warning(self, "Export Poster", f"Could not export '{file_path}': {error}")
+            return
+        finally:
+            if running:
+                pipeline.start()
+        self.poster_button.setEnabled(False)
+        self.poster_button.setText("Rendering...")
+        QTimer.singleShot(100, self.finish_poster)
+
+    def finish_poster(self):
+        # Polls the poster job until it is done, then reports how it went
+        job = self.poster_job
+        if job is None:
+            return
+        if not job.done():
+            QTimer.singleShot(100, self.finish_poster)
+            return
+        self.poster_job = None
+        self.poster_button.setEnabled(True)
+        self.poster_button.setText("Export Poster")
+        if job.error is not None:
+            QMessageBox.warning(self, "Export Poster", f"Could not export '{job.path}': {job.error}")
+        else:
+            print(f"{job.size[0]}x{job.size[1]} poster exported as '{job.path}'")
+
+    def write_svg(self, file_path):
+        # Streams the particles grouped by gray into a few shared paths. The
+        # pipeline reuses the front buffer, so it is copied and released
+        # before writing rather than holding up the simulation for the export.
+        with self.flow_widget.pipeline.front() as positions:
+            positions = None if positions is None else positions.copy()
+        with SvgCanvas(file_path, self.flow_widget.width(), self.flow_widget.height(),
+                       title="Fluid Flow", description="Generated by Fluid Flow gen art") as svg:
+            if positions is not None:
+                self.flow_widget.model.draw(svg, positions)
+
+    def export_png(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save PNG", "", "PNG files (*.png)")
+        if not file_path:
+            return  # User cancelled the dialog
+
+        # Saves the particle framebuffer (or the tone-mapped trails) directly, no QPainter involved
+        with self.flow_widget.profiler.stage('export'):
+            write_png(file_path, self.flow_widget.render_frame())
+        print(f"PNG exported as '{file_path}'")
+
+    def save_trails(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Trails", "", "NumPy files (*.npy)")
+        if not file_path:
+            return  # User cancelled the dialog
+
+        # Full-precision density and ink, so the exposure can be resumed later
+        self.flow_widget.trails.save(file_path)
+        print(f"Trails saved as '{file_path}'")
+
+    def load_trails(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Load Trails", "", "NumPy files (*.npy)")
+        if not file_path:
+            return  # User cancelled the dialog
+
+        self.flow_widget.trails.resize(self.flow_widget.width(), self.flow_widget.height())
+        try:
+            self.flow_widget.trails.load(file_path)
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, "Load Trails", f"Could not load '{file_path}': {error}")
+            return
+        self.flow_widget.update()
+        print(f"Trails loaded from '{file_path}'")
+
+def main(argv=None):
+    app = QApplication.instance() or QApplication(sys.argv if argv is None else argv)
     main_window = FluidFlowSimulation()
     main_window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    return app.exec_()
+
+if __name__ == '__main__':
+    sys.exit(main())
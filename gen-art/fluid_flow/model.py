@@ -0,0 +1,101 @@
+import numpy as np
+
+from fluid_flow.particles import ParticleStore, advect
+from fluid_flow.flow_grid import advect_grid
+from fluid_flow.raster import particle_intensity
+
+
+class FluidFlowModel:
+    # Parameters and simulation state of the fluid flow demo, free of Qt so it
+    # can be stepped and drawn headless. A fixed seed makes runs reproducible.
+
+    def __init__(self, width=600, height=400, seed=None):
+        self.width = width
+        self.height = height
+        self.num_particles = 5000  # Increased default number of particles
+        self.flow_scale = 0.005
+        self.speed = 1.0
+        self.particle_size = 1  # Reduced default particle size for density
+        self.time = 0
+        self.flow_grid = None  # Optional FlowFieldGrid; None evaluates flow_field analytically per particle
+        self.processes = 0  # Worker processes advecting the particles over shared memory; 0 or 1 steps them here
+        self._advection = None
+        self.particles = ParticleStore()
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self):
+        self.time = 0
+        self.particles.clear()
+        self.rng = np.random.default_rng(self.seed)
+
+    def step(self):
+        if len(self.particles) != self.num_particles:
+            # Grow or shrink the pool, keeping the particles already on screen
+            self.particles.resize(self.num_particles, self.width, self.height, self.rng)
+
+        advection = self.advection()
+        if self.flow_grid is not None:
+            self.flow_grid.update(self.time, self.flow_scale, self.width, self.height)
+            advect_grid(self.particles, self.flow_grid, self.speed, self.width, self.height)
+        elif advection is not None:
+            advection.advect(self.particles, self.flow_scale, self.speed, self.time, self.width, self.height)
+        else:
+            advect(self.particles, self.flow_scale, self.speed, self.time, self.width, self.height)
+        self.time += 0.01
+
+    def advection(self):
+        # The ParallelAdvection worker pool for `processes`, started or
+        # stopped when the parameter changes; None when stepping in process
+        workers = self.processes if self.processes > 1 else 0
+        if self._advection is not None and self._advection.workers != workers:
+            self.close()
+        if workers and self._advection is None:
+            from fluid_flow.parallel import ParallelAdvection  # multiprocessing only loads when it is used
+            self._advection = ParallelAdvection(workers)
+            self.particles = self._advection.adopt(self.particles)
+        return self._advection
+
+    def close(self):
+        # Stops the advection workers, if any
+        if self._advection is not None:
+            self._advection.close()
+            self._advection = None
+
+    def __getstate__(self):
+        # Copies step in process until they start their own workers
+        state = self.__dict__.copy()
+        state['_advection'] = None
+        return state
+
+    def snapshot(self, buffer=None):
+        # Copy of the (2, count) particle positions for drawing while the next
+        # step runs; buffer is a previous snapshot to reuse when the count matches
+        count = len(self.particles)
+        if buffer is None or buffer.shape[1] != count:
+            buffer = np.empty((2, count), dtype=np.float32)
+        np.copyto(buffer, self.particles.pos[:, :count])
+        return buffer
+
+    def positions(self):
+        # (count, 2) particle positions in canvas units, for common/recording.py
+        return self.particles.positions()
+
+    def set_positions(self, points):
+        # Replaces the particles, e.g. with a recorded frame, so draw() shows them
+        self.particles.resize(len(points), self.width, self.height, self.rng)
+        self.particles.pos[:, :len(points)] = np.asarray(points).T
+        self.num_particles = len(points)
+
+    def flow_field(self, x, y):
+        # Create a flow field using Perlin-like noise
+        angle = (np.sin(x * self.flow_scale + self.time) +
+                 np.sin(y * self.flow_scale + self.time) +
+                 np.sin((x + y) * self.flow_scale + self.time)) * np.pi
+        return angle
+
+    def draw(self, target, state=None):
+        # Draw onto a RasterCanvas or SvgCanvas in canvas coordinates; state is a
+        # snapshot() to draw instead of the live particles
+        x, y = state if state is not None else (self.particles.x, self.particles.y)
+        target.points(np.stack([x, y], axis=1), particle_intensity(x, y)[:, None], self.particle_size)
@@ -0,0 +1,199 @@
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+from threading import BrokenBarrierError
+
+import numpy as np
+
+from common import kernels
+from fluid_flow.particles import ParticleStore
+
+# Particle advection split across worker processes for million-particle runs.
+# The positions live in a shared memory block that every worker maps, so
+# nothing is pickled per step: each tick the stepping process writes the step
+# parameters into a small shared control block and meets the workers at a
+# barrier, every worker advances its contiguous slice of the particles in
+# place with the selected advect kernel, and a second barrier hands the
+# positions back. The kernel is elementwise, so the result is the same bytes
+# for any number of workers.
+#
+#   advection = ParallelAdvection(8)
+#   model.particles = advection.adopt(model.particles)
+#   advection.advect(model.particles, flow_scale, speed, time, width, height)
+#
+# FluidFlowModel does this itself when its `processes` parameter is above 1.
+
+# Control block layout: float64 slots, then the positions block's name
+COMMAND, COUNT, FLOW_SCALE, SPEED, TIME, WIDTH, HEIGHT, CAPACITY = range(8)
+SLOTS = 8
+NAME_OFFSET = SLOTS * 8
+NAME_SIZE = 64
+STEP, STOP = 0, 1
+
+
+class SharedParticleStore(ParticleStore):
+    # ParticleStore whose positions are a (2, capacity) float32 array in a
+    # shared memory block; growing it moves them to a new, larger block. The
+    # scratch rows stay private, each worker keeps its own.
+
+    def __init__(self, capacity=0):
+        self.block = None
+        super().__init__(capacity)
+        self.pos = self._allocate(capacity)
+        self._update_views()
+
+    def _allocate(self, capacity):
+        # A zero-size block is not allowed, so there is always room for one particle
+        block = shared_memory.SharedMemory(create=True, size=max(capacity, 1) * 2 * 4)
+        pos = np.ndarray((2, capacity), dtype=np.float32, buffer=block.buf)
+        if self.block is not None:
+            pos[:, :self.count] = self.pos[:, :self.count]
+            self.pos = self.x = self.y = None  # Drop the views so the old block can be unmapped
+            self._release()
+        self.block = block
+        self._release = weakref.finalize(self, _release, block)
+        return pos
+
+    def resize(self, count, width, height, rng):
+        if count > self.capacity:
+            self.pos = self._allocate(max(count, 2 * self.capacity))
+            self.scratch = np.empty(self.pos.shape, dtype=np.float32)
+        super().resize(count, width, height, rng)
+
+    def close(self):
+        # Frees the block; the particles are copied out and stay usable
+        if self.block is not None:
+            self.pos = self.pos.copy()
+            self._update_views()
+            self._release()
+            self.block = None
+
+    def __reduce__(self):
+        # Copies (e.g. for poster workers) are plain stores holding the live particles
+        return _restore, (self.pos[:, :self.count].copy(), self.count)
+
+
+def _release(block):
+    block.unlink()
+    try:
+        block.close()
+    except BufferError:
+        pass  # Still viewed at interpreter exit; the mapping goes with the process
+
+
+def _restore(pos, count):
+    store = ParticleStore()
+    store.pos = pos
+    store.scratch = np.empty_like(pos)
+    store.count = count
+    store._update_views()
+    return store
+
+
+def shard(count, index, workers):
+    # The contiguous slice of count particles that worker index advances
+    return count * index // workers, count * (index + 1) // workers
+
+
+class ParallelAdvection:
+    # A persistent pool of `workers` processes advecting a SharedParticleStore.
+    # Workers are spawned rather than forked, so they don't inherit the GUI's
+    # threads, and use the kernel backend selected in this process. close()
+    # (or garbage collection) stops them and frees the control block. A step
+    # that takes longer than `timeout` seconds, e.g. because a worker was
+    # killed, raises instead of waiting forever.
+
+    def __init__(self, workers, timeout=60):
+        self.workers = workers
+        self.timeout = timeout
+        context = multiprocessing.get_context('spawn')
+        self.control = shared_memory.SharedMemory(create=True, size=NAME_OFFSET + NAME_SIZE)
+        self.params = np.ndarray((SLOTS,), dtype=np.float64, buffer=self.control.buf)
+        self.barrier = context.Barrier(workers + 1)
+        self.processes = [context.Process(target=_work, name=f'advect-{index}', daemon=True,
+                                          args=(index, workers, self.control.name, self.barrier,
+                                                kernels.backend()))
+                          for index in range(workers)]
+        for process in self.processes:
+            process.start()
+        self._finalizer = weakref.finalize(self, _shutdown, self.processes, self.barrier, self.control)
+
+    def adopt(self, particles):
+        # A SharedParticleStore holding the same particles, for advect()
+        if isinstance(particles, SharedParticleStore):
+            return particles
+        store = SharedParticleStore(particles.count)
+        store.pos[:, :particles.count] = particles.pos[:, :particles.count]
+        store.count = particles.count
+        store._update_views()
+        return store
+
+    def advect(self, particles, flow_scale, speed, time, width, height):
+        # Same as particles.advect, over the workers; returns once every slice has moved
+        name = particles.block.name.encode()
+        self.control.buf[NAME_OFFSET:NAME_OFFSET + NAME_SIZE] = name.ljust(NAME_SIZE, b'\0')
+        self.params[:] = STEP, particles.count, flow_scale, speed, time, width, height, particles.capacity
+        try:
+            self.barrier.wait(self.timeout)  # Go
+            self.barrier.wait(self.timeout)  # Every slice done
+        except BrokenBarrierError as error:
+            raise RuntimeError('a particle advection worker failed or timed out') from error
+
+    def close(self):
+        self.params = None  # The control block can't be unmapped while viewed
+        self._finalizer()
+
+
+def _shutdown(processes, barrier, control):
+    np.ndarray((SLOTS,), dtype=np.float64, buffer=control.buf)[COMMAND] = STOP
+    try:
+        barrier.wait(timeout=5)
+    except BrokenBarrierError:
+        pass  # A worker already failed and aborted the barrier
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    control.close()
+    control.unlink()
+
+
+def _work(index, workers, control_name, barrier, backend):
+    # Worker loop: wait for a step, advance this worker's slice in place, report back
+    kernels.use(backend)
+    advect_arrays = kernels.get('advect')
+    control = shared_memory.SharedMemory(name=control_name)
+    params = np.ndarray((SLOTS,), dtype=np.float64, buffer=control.buf)
+    block = pos = None
+    scratch = np.empty((2, 0), dtype=np.float32)
+    try:
+        while True:
+            barrier.wait()
+            if params[COMMAND] == STOP:
+                break
+            name = bytes(control.buf[NAME_OFFSET:NAME_OFFSET + NAME_SIZE]).rstrip(b'\0').decode()
+            if block is None or block.name != name:
+                # The store grew into a new block
+                pos = None
+                if block is not None:
+                    block.close()
+                block = shared_memory.SharedMemory(name=name)
+                pos = np.ndarray((2, int(params[CAPACITY])), dtype=np.float32, buffer=block.buf)
+            lo, hi = shard(int(params[COUNT]), index, workers)
+            if scratch.shape[1] < hi - lo:
+                scratch = np.empty((2, hi - lo), dtype=np.float32)
+            # Python floats, so float32 arithmetic rounds exactly as in one process
+            flow_scale, speed, time, width, height = (float(value) for value in params[FLOW_SCALE:HEIGHT + 1])
+            advect_arrays(pos[0, lo:hi], pos[1, lo:hi], scratch[0, :hi - lo], scratch[1, :hi - lo],
+                          flow_scale, speed, time, width, height)
+            barrier.wait()
+    except BrokenBarrierError:
+        pass  # The step was given up elsewhere, and whoever gave up reports it
+    except BaseException:
+        barrier.abort()  # Wakes the stepping process instead of leaving it waiting
+        raise
+    finally:
+        pos = params = None
+        if block is not None:
+            block.close()
+        control.close()
@@ -0,0 +1,100 @@
+import numpy as np
+
+from common import kernels
+
+
+class ParticleStore:
+    # Particle positions kept in one contiguous float32 buffer (row 0 = x,
+    # row 1 = y) plus preallocated scratch rows, so stepping works in place and
+    # allocates nothing per frame. Capacity grows geometrically and resizing
+    # keeps the particles that already exist.
+
+    def __init__(self, capacity=0):
+        self.count = 0
+        self.pos = np.empty((2, capacity), dtype=np.float32)
+        self.scratch = np.empty((2, capacity), dtype=np.float32)
+        self._update_views()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return self.pos.shape[1]
+
+    def positions(self):
+        # (count, 2) view of the live particles
+        return self.pos[:, :self.count].T
+
+    def resize(self, count, width, height, rng):
+        if count > self.capacity:
+            capacity = max(count, 2 * self.capacity)
+            pos = np.empty((2, capacity), dtype=np.float32)
+            pos[:, :self.count] = self.pos[:, :self.count]
+            self.pos = pos
+            self.scratch = np.empty((2, capacity), dtype=np.float32)
+        if count > self.count:
+            # New particles are spawned uniformly over the canvas
+            added = count - self.count
+            self.pos[0, self.count:count] = rng.random(added, dtype=np.float32) * width
+            self.pos[1, self.count:count] = rng.random(added, dtype=np.float32) * height
+        self.count = count
+        self._update_views()
+
+    def clear(self):
+        self.count = 0
+        self._update_views()
+
+    def _update_views(self):
+        self.x = self.pos[0, :self.count]
+        self.y = self.pos[1, :self.count]
+        self.angle = self.scratch[0, :self.count]
+        self.tmp = self.scratch[1, :self.count]
+
+
+def flow_field_into(x, y, flow_scale, time, out, tmp):
+    # angle = (sin(x * s + t) + sin(y * s + t) + sin((x + y) * s + t)) * pi
+    np.multiply(x, flow_scale, out=out)
+    out += time
+    np.sin(out, out=out)
+    np.multiply(y, flow_scale, out=tmp)
+    tmp += time
+    np.sin(tmp, out=tmp)
+    out += tmp
+    np.add(x, y, out=tmp)
+    tmp *= flow_scale
+    tmp += time
+    np.sin(tmp, out=tmp)
+    out += tmp
+    out *= np.pi
+    return out
+
+
+def advect(particles, flow_scale, speed, time, width, height):
+    # Move every particle one step along the flow field and wrap it around the
+    # canvas edges, all in place, with the selected kernel backend
+    kernels.get('advect')(particles.x, particles.y, particles.angle, particles.tmp,
+                          flow_scale, speed, time, width, height)
+
+
+@kernels.register('advect')
+def advect_arrays(x, y, angle, tmp, flow_scale, speed, time, width, height):
+    # NumPy reference of advect; angle and tmp are float32 scratch arrays the size of x
+    flow_field_into(x, y, flow_scale, time, angle, tmp)
+    np.cos(angle, out=tmp)
+    tmp *= speed
+    x += tmp
+    np.sin(angle, out=tmp)
+    tmp *= speed
+    y += tmp
+    wrap_into(x, width, tmp)
+    wrap_into(y, height, tmp)
+
+
+def wrap_into(values, size, tmp):
+    # values %= size, spelled out because np.mod is many times slower than
+    # floor and multiply on float32
+    np.multiply(values, 1 / size, out=tmp)
+    np.floor(tmp, out=tmp)
+    tmp *= size
+    values -= tmp
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def gray_levels(s):
+    # Grayscale of FluidFlowWidget.get_color for integer x + y
+    return ((np.sin(s * 0.01) + 1) * 127).astype(np.uint8)
+
+
+def particle_intensity(x, y):
+    # Per-particle gray over truncated positions, as the framebuffer colors them
+    return gray_levels(x.astype(np.int32) + y.astype(np.int32))
+
+
+class ParticleRaster:
+    # Preallocated RGBA8888 framebuffer that particles are splatted into with
+    # NumPy. Particle colors come from a lookup table over x + y instead of a
+    # per-point sin, and the buffer can be wrapped by a QImage without copying
+    # or written straight to PNG.
+
+    def __init__(self, width=1, height=1, background=(255, 255, 255, 255)):
+        self.background = np.array(background, dtype=np.uint8).view(np.uint32)[0]
+        self.width = 0
+        self.height = 0
+        self.resize(width, height)
+        self._ix = np.empty(0, dtype=np.int32)
+        self._iy = np.empty(0, dtype=np.int32)
+        self._colors = np.empty(0, dtype=np.uint32)
+
+    def resize(self, width, height):
+        if (width, height) == (self.width, self.height):
+            return
+        self.width, self.height = width, height
+        self.rgba = np.empty((height, width, 4), dtype=np.uint8)
+        self.pixels = self.rgba.view(np.uint32).reshape(height, width)
+        self.flat = self.pixels.reshape(-1)
+        self.color_lut = self.build_color_lut(width + height + 1)
+        self.clear()
+
+    @staticmethod
+    def build_color_lut(size):
+        intensity = gray_levels(np.arange(size))
+        rgba = np.empty((size, 4), dtype=np.uint8)
+        rgba[:, 0] = rgba[:, 1] = rgba[:, 2] = intensity
+        rgba[:, 3] = 255
+        return rgba.view(np.uint32).reshape(size)
+
+    @staticmethod
+    def splat_offsets(particle_size):
+        # Square kernel like a QPen of width particle_size drawing a point
+        size = max(int(particle_size), 1)
+        offsets = np.arange(-(size // 2), size - size // 2)
+        return [(dx, dy) for dy in offsets for dx in offsets]
+
+    def clear(self):
+        self.pixels.fill(self.background)
+
+    def draw(self, x, y, particle_size=1):
+        self.clear()
+        count = len(x)
+        if len(self._ix) < count:
+            self._ix = np.empty(count, dtype=np.int32)
+            self._iy = np.empty(count, dtype=np.int32)
+            self._colors = np.empty(count, dtype=np.uint32)
+        ix, iy, colors = self._ix[:count], self._iy[:count], self._colors[:count]
+        np.copyto(ix, x, casting='unsafe')  # Truncates like int(x)
+        np.copyto(iy, y, casting='unsafe')
+        lut_index = np.clip(ix + iy, 0, len(self.color_lut) - 1)
+        np.take(self.color_lut, lut_index, out=colors)
+
+        for dx, dy in self.splat_offsets(particle_size):
+            px = ix + dx
+            py = iy + dy
+            inside = (px >= 0) & (px < self.width) & (py >= 0) & (py < self.height)
+            self.flat[(py * self.width + px)[inside]] = colors[inside]
+        return self.rgba
@@ -0,0 +1,119 @@
+import threading
+
+import numpy as np
+
+from fluid_flow.raster import ParticleRaster, particle_intensity
+
+
+class TrailBuffer:
+    # Long-exposure accumulation for the fluid flow particles. Instead of
+    # keeping past positions, every step adds the particles into two float32
+    # planes the size of the canvas: density (hits) and the sum of the hit
+    # particles' gray. Both fade by `decay` per step, so memory is O(pixels)
+    # however long the exposure runs. decay=1 never forgets.
+    #
+    # render() tone maps the planes onto the background: coverage is
+    # 1 - exp(-exposure * density) and the ink is the mean gray of what landed
+    # there. The planes are HDR, so they can be saved as a (2, height, width)
+    # .npy checkpoint and loaded later to continue the exposure.
+    #
+    # deposit() may run on the simulation thread while render() runs on the
+    # GUI thread; a lock keeps them from seeing half a step.
+
+    FLUSH_INTERVAL = 512  # Steps between zeroing faded values before they turn into slow denormals
+
+    def __init__(self, width=1, height=1, decay=0.98, exposure=0.5, background=(255, 255, 255)):
+        self.decay = decay
+        self.exposure = exposure
+        self.background = np.array(background, dtype=np.float32)
+        self.steps = 0
+        self.accum = np.zeros((2, height, width), dtype=np.float32)
+        self.rgba = np.empty((height, width, 4), dtype=np.uint8)
+        self._lock = threading.Lock()
+
+    @property
+    def width(self):
+        return self.accum.shape[2]
+
+    @property
+    def height(self):
+        return self.accum.shape[1]
+
+    def resize(self, width, height):
+        # Keeps the overlapping part of the exposure
+        if (width, height) == (self.width, self.height):
+            return
+        with self._lock:
+            accum = np.zeros((2, height, width), dtype=np.float32)
+            h, w = min(height, self.height), min(width, self.width)
+            accum[:, :h, :w] = self.accum[:, :h, :w]
+            self.accum = accum
+            self.rgba = np.empty((height, width, 4), dtype=np.uint8)
+
+    def clear(self):
+        with self._lock:
+            self.accum.fill(0)
+            self.steps = 0
+
+    def deposit(self, x, y, particle_size=1):
+        # One step: fade what is there, then add a hit per particle pixel
+        ix = x.astype(np.int32)  # Truncates like ParticleRaster
+        iy = y.astype(np.int32)
+        gray = particle_intensity(x, y).astype(np.float32)
+        width, height = self.width, self.height
+        indices, weights = [], []
+        for dx, dy in ParticleRaster.splat_offsets(particle_size):
+            px = ix + dx
+            py = iy + dy
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            indices.append((py * width + px)[inside])
+            weights.append(gray[inside])
+        indices = np.concatenate(indices)
+        hits = np.bincount(indices, minlength=width * height)
+        ink = np.bincount(indices, weights=np.concatenate(weights), minlength=width * height)
+
+        with self._lock:
+            if self.accum.shape[1:] != (height, width):
+                return  # Resized by the GUI thread since the indices were computed
+            density, gray_sum = self.accum.reshape(2, -1)
+            if self.decay != 1:
+                self.accum *= self.decay
+            np.add(density, hits, out=density, casting='unsafe')
+            np.add(gray_sum, ink, out=gray_sum, casting='unsafe')
+            self.steps += 1
+            if self.decay != 1 and self.steps % self.FLUSH_INTERVAL == 0:
+                self.accum[self.accum < 1e-20] = 0
+
+    def render(self):
+        # Tone-mapped (height, width, 4) uint8 image of the exposure so far
+        with self._lock:
+            density, gray_sum = self.accum
+            coverage = np.exp(density * -self.exposure)
+            ink = gray_sum / np.maximum(density, 1e-12)
+        np.subtract(1, coverage, out=coverage)
+        # Blend each channel from the background toward the mean ink, one 2-D
+        # plane at a time (broadcasting over a trailing channel axis is slow)
+        blend = np.empty_like(ink)
+        for channel, background in enumerate(self.background.tolist()):
+            np.subtract(ink, background, out=blend)
+            blend *= coverage
+            blend += background
+            np.clip(blend, 0, 255, out=blend)
+            np.copyto(self.rgba[..., channel], blend, casting='unsafe')
+        self.rgba[..., 3] = 255
+        return self.rgba
+
+    def save(self, path):
+        # HDR checkpoint of both planes as a (2, height, width) float32 .npy
+        with self._lock:
+            np.save(path, self.accum)
+
+    def load(self, path):
+        # Continue from a checkpoint; it is cropped or padded to the current size
+        accum = np.load(path)
+        if accum.ndim != 3 or accum.shape[0] != 2:
+            raise ValueError(f"'{path}' is not a trail buffer checkpoint")
+        with self._lock:
+            self.accum.fill(0)
+            h, w = min(accum.shape[1], self.height), min(accum.shape[2], self.width)
+            self.accum[:, :h, :w] = accum[:, :h, :w]
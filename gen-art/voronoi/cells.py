@@ -0,0 +1,227 @@
+import argparse
+import os
+import sys
+import threading
+
+import numpy as np
+
+# Filled Voronoi cells as a raster: every pixel is labelled with its nearest
+# seed by a cKDTree and colored through a palette lookup table. Unlike the
+# ridge lines this needs no qhull diagram, and cells at the border are closed.
+#
+#   python gen-art/voronoi/cells.py --check       # against a query of every pixel
+
+
+def default_palette(levels=8):
+    # Light grays, so the dark cell outlines stay readable
+    gray = np.linspace(250, 130, levels).astype(np.uint8)
+    return np.repeat(gray[:, None], 3, axis=1)
+
+
+class CellRaster:
+    # Labels are found coarse to fine: the nearest seeds of the corners of
+    # each block x block pixel square are queried first, and since Voronoi
+    # cells are convex, a square whose four corners share a seed lies wholly
+    # inside that cell. Squares that straddle an edge are split in four and
+    # the new corners queried, down to single pixels, so the queries follow
+    # the cell edges instead of covering every pixel. Row bands of
+    # `chunk_rows` pixels are labelled on a thread pool (cKDTree queries
+    # release the GIL), so the query temporaries never hold more than a few
+    # bands at a time.
+    #
+    # With periodic=True distances wrap around the canvas like the seeds do,
+    # so cells continue across the edges. A cell is then only convex per
+    # periodic copy of its seed: with few seeds, corners can share a seed but
+    # be nearest to different copies of it, so a square is only filled when
+    # its corners agree on the copy too. Seed i is colored palette[i % len],
+    # which stays put while the seeds move. outline colors the pixels where
+    # the label changes to the right or below; None leaves the cells bare.
+    #
+    # Pixel centers are mapped to canvas units with RasterCanvas' scale and
+    # origin, so poster tiles line up with a full render exactly.
+
+    def __init__(self, palette=None, outline=(60, 60, 60), periodic=True, block=16, chunk_rows=128,
+                 workers=None):
+        self.palette = default_palette() if palette is None else np.asarray(palette, dtype=np.uint8)
+        self.outline = outline
+        self.periodic = periodic
+        self.block = block
+        self.chunk_rows = chunk_rows - chunk_rows % block or block
+        self.workers = workers or os.cpu_count() or 1
+        self.queried = 0  # Points the last labels() call queried, to compare with its pixel count
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def tree(self, points, width, height):
+        from scipy.spatial import cKDTree  # scipy only loads when cells are drawn
+
+        points = np.asarray(points, dtype=np.float64)
+        if not self.periodic:
+            return cKDTree(points)
+        box = np.array([width, height], dtype=np.float64)
+        points = np.mod(points, box)
+        points[points >= box] = 0  # np.mod can round a tiny negative up to the box size
+        return cKDTree(points, boxsize=box)
+
+    def labels(self, points, width, height, shape, scale=1.0, origin=(0, 0)):
+        # (rows, columns) int32 nearest-seed index of each pixel of a shape
+        # sized raster whose pixel (0, 0) is pixel origin of the full canvas
+        # drawn at scale pixels per unit
+        rows, columns = shape
+        labels = np.zeros(shape, dtype=np.int32)
+        self.queried = 0
+        if not len(points) or not rows or not columns:
+            return labels
+        tree = self.tree(points, width, height)
+        bands = [(top, min(top + self.chunk_rows, rows)) for top in range(0, rows, self.chunk_rows)]
+
+        def label_band(band):
+            top, bottom = band
+            return self._label_band(tree, labels[top:bottom], origin[0], origin[1] + top, scale)
+
+        if self.workers <= 1 or len(bands) == 1:
+            self.queried = sum(map(label_band, bands))
+        else:
+            self.queried = sum(self.pool().map(label_band, bands))
+        return labels
+
+    def _label_band(self, tree, out, left, top, scale):
+        # Fills out with labels; left and top are global pixel indices. Returns the points queried.
+        rows, columns = out.shape
+        step = self.block
+
+        def query(iy, ix):
+            centers = np.stack([(left + ix * step + 0.5) / scale, (top + iy * step + 0.5) / scale], axis=-1)
+            return self._query(tree, centers.reshape(-1, 2))
+
+        # Nearest seed (and which periodic copy of it) of every block corner, at pixel centers
+        iy, ix = np.meshgrid(np.arange(-(-rows // step) + 1), np.arange(-(-columns // step) + 1), indexing='ij')
+        grid = query(iy, ix).reshape(iy.shape)
+        queried = grid.size
+        while step > 1:
+            # Halve the spacing: the new lattice points of uniform squares take
+            # the square's label, the rest are queried
+            corner = grid[:-1, :-1]
+            uniform = (corner == grid[:-1, 1:]) & (corner == grid[1:, :-1]) & (corner == grid[1:, 1:])
+            fine = np.full((grid.shape[0] * 2 - 1, grid.shape[1] * 2 - 1), -1, dtype=np.int64)
+            fine[::2, ::2] = grid
+            by, bx = np.nonzero(uniform)
+            label = corner[by, bx]
+            for dy, dx in ((1, 0), (1, 2), (0, 1), (2, 1), (1, 1)):
+                fine[by * 2 + dy, bx * 2 + dx] = label
+            step //= 2
+            iy, ix = np.nonzero(fine < 0)
+            fine[iy, ix] = query(iy, ix)
+            queried += len(iy)
+            grid = fine
+        out[:] = grid[:rows, :columns] & 0xffffffff
+        return queried
+
+    @staticmethod
+    def _query(tree, points):
+        # Seed index in the low 32 bits; with a periodic tree the high bits
+        # tell which copy of the seed is nearest, so that corners only match
+        # when they lie in the same convex cell
+        _, index = tree.query(points)
+        key = index.astype(np.int64)
+        if tree.boxsize is not None:
+            box = tree.boxsize[:2]
+            copy = np.rint((points - tree.data[index]) / box).astype(np.int64) + 0x4000
+            key |= (copy[:, 0] << 48) | (copy[:, 1] << 32)
+        return key
+
+    def colors(self, count):
+        # Palette lookup table of the seeds as packed RGBA, one uint32 per seed
+        rgba = np.full((len(self.palette), 4), 255, dtype=np.uint8)
+        rgba[:, :3] = self.palette
+        return rgba.view(np.uint32)[np.arange(count) % len(self.palette), 0]
+
+    def render(self, points, width, height, shape=None, scale=1.0, origin=(0, 0), out=None):
+        # (rows, columns, 4) uint8 image of the cells; shape defaults to the canvas at scale.
+        # out is reused when it has the right shape.
+        if shape is None:
+            shape = (round(height * scale), round(width * scale))
+        rows, columns = shape
+        if out is None or out.shape != (rows, columns, 4) or not out.flags.c_contiguous:
+            out = np.empty((rows, columns, 4), dtype=np.uint8)
+        pixels = out.view(np.uint32)[..., 0]  # One lookup writes all four channels
+        if not len(points):
+            pixels[:] = self.colors(1)[0]
+            return out
+        if self.outline is None:
+            np.take(self.colors(len(points)), self.labels(points, width, height, shape, scale, origin),
+                    out=pixels)
+            return out
+
+        # One extra row and column, so edges at the right and bottom need no neighboring tile
+        labels = self.labels(points, width, height, (rows + 1, columns + 1), scale, origin)
+        cells = labels[:-1, :-1]
+        np.take(self.colors(len(points)), cells, out=pixels)
+        edge = (cells != labels[:-1, 1:]) | (cells != labels[1:, :-1])
+        out[edge, :3] = self.outline
+        return out
+
+    def draw(self, target, points, width, height):
+        # Fills a RasterCanvas with the cells
+        target.rgba = self.render(points, width, height, target.rgba.shape[:2], target.scale, target.origin,
+                                  target.rgba)
+
+    def __getstate__(self):
+        # The thread pool stays behind when copied or pickled, e.g. for poster workers
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pool_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+
+    def pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cells')
+            return self._pool
+
+
+def mismatches(count, seed=0, width=600, height=400, periodic=True, block=16):
+    # Pixels whose label differs from a brute-force query of every pixel, for count random seeds
+    points = np.random.default_rng(seed).random((count, 2)) * [width, height]
+    raster = CellRaster(outline=None, periodic=periodic, block=block, workers=1)
+    labels = raster.labels(points, width, height, (height, width))
+    iy, ix = np.mgrid[0:height, 0:width]
+    centers = np.stack([ix.ravel() + 0.5, iy.ravel() + 0.5], axis=-1)
+    tree = raster.tree(points, width, height)
+    # Ties between equally near seeds may go either way
+    distance, _ = tree.query(centers)
+    labelled = tree.data[labels.ravel()] - centers
+    if periodic:
+        box = np.array([width, height])
+        labelled -= np.rint(labelled / box) * box
+    return int(np.count_nonzero(np.hypot(*labelled.T) > distance + 1e-9))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the cell labels against a brute-force nearest-seed query.')
+    parser.add_argument('--check', action='store_true', help='run the comparison')
+    parser.add_argument('--counts', default='2,3,4,5,6,10,50', help='seed counts to try, comma separated')
+    parser.add_argument('--trials', type=int, default=30, help='random seed sets per count')
+    args = parser.parse_args(argv)
+    if not args.check:
+        parser.print_help()
+        return 0
+
+    failed = False
+    for periodic in (True, False):
+        for count in map(int, args.counts.split(',')):
+            wrong = [mismatches(count, seed, periodic=periodic) for seed in range(args.trials)]
+            ok = not any(wrong)
+            print(f"  {'periodic' if periodic else 'bounded':<10}{count:>4} seeds  "
+                  f"{sum(wrong):6} wrong pixels in {args.trials} trials {'ok' if ok else 'FAILED'}")
+            failed |= not ok
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
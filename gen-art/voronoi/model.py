@@ -0,0 +1,126 @@
+import numpy as np
+
+from common import kernels
+from voronoi.cells import CellRaster
+from voronoi.ridges import ridge_segments, ridge_intensity, bucket_by_color
+
+
+@kernels.register('orbit')
+def orbit(points, time, speed, width, height):
+    # Moves each (n, 2) point `speed` along a direction that turns with time
+    # and with its index, then wraps it around the edges, in place
+    theta = np.linspace(0, 2*np.pi, len(points)) + time
+    points[:, 0] += np.cos(theta) * speed
+    points[:, 1] += np.sin(theta) * speed
+    points[:, 0] %= width
+    points[:, 1] %= height
+
+
+class VoronoiModel:
+    # Parameters and simulation state of the Voronoi demo, free of Qt so it can
+    # be stepped and drawn headless. A fixed seed makes runs reproducible.
+    #
+    # render_mode 'ridges' draws the finite ridges of the qhull diagram;
+    # 'cells' skips qhull and fills every pixel with its nearest seed's color
+    # through self.cells (see voronoi/cells.py), rendered at the canvas size
+    # on every step.
+
+    def __init__(self, width=600, height=400, seed=None):
+        self.width = width
+        self.height = height
+        self.points = np.empty((0, 2))
+        self.vor = None
+        self.segments = np.empty((0, 2, 2))  # Finite ridges of self.vor as (n, 2, 2)
+        self.segment_buckets = []  # (gray, segment indices) per quantized color
+        self.color_levels = 16
+        self.render_mode = 'ridges'
+        self.cells = CellRaster()
+        self.image = None  # Cells at the canvas size, in 'cells' mode
+        self.num_points = 100  # Increased default number of points
+        self.movement_speed = 1.0
+        self.time = 0
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def clear_points(self):
+        # New points are spawned on the next step
+        self.points = np.empty((0, 2))
+
+    def reset(self):
+        self.time = 0
+        self.clear_points()
+        self.rng = np.random.default_rng(self.seed)
+
+    def step(self, diagram=True):
+        # Pass diagram=False to only move the points, e.g. when skipping frames
+        if len(self.points) == 0:
+            self.points = self.rng.random((self.num_points, 2)) * [self.width, self.height]
+        elif len(self.points) != self.num_points:
+            # Add or drop points, keeping the ones already on screen
+            added = self.rng.random((max(self.num_points - len(self.points), 0), 2)) * [self.width, self.height]
+            self.points = np.concatenate([self.points[:self.num_points], added])
+
+        # Move points in a circular pattern and wrap them around the edges
+        kernels.get('orbit')(self.points, self.time, self.movement_speed, self.width, self.height)
+
+        if diagram:
+            self.update_diagram()
+        self.time += 0.05
+
+    def update_diagram(self):
+        if self.render_mode == 'cells':
+            self.vor = None
+            self.segments = np.empty((0, 2, 2))
+            self.segment_buckets = []
+            self.image = self.cells.render(self.points, self.width, self.height)
+            return
+        self.image = None
+
+        # scipy is imported on first use, so loading the model (e.g. for a
+        # headless fluid render that lists all demos) doesn't pay for it
+        from scipy.spatial import Voronoi
+
+        # Compute Voronoi diagram
+        self.vor = Voronoi(self.points)
+        self.segments = ridge_segments(self.vor)
+        self.segment_buckets = bucket_by_color(ridge_intensity(self.segments), self.color_levels)
+
+    def positions(self):
+        # (num_points, 2) point positions in canvas units, for common/recording.py
+        return self.points
+
+    def set_positions(self, points):
+        # Replaces the points, e.g. with a recorded frame, and rebuilds the diagram for draw()
+        self.points = np.asarray(points, dtype=np.float64)
+        self.num_points = len(self.points)
+        self.update_diagram()
+
+    def snapshot(self, buffer=None):
+        # (segments, buckets, points, image). Every step builds new ridge arrays
+        # and images, so handing them out needs no copy; the points move in
+        # place, so cells mode copies them for drawing at other sizes.
+        if self.image is None:
+            return self.segments, self.segment_buckets, None, None
+        return self.segments, self.segment_buckets, self.points.copy(), self.image
+
+    def draw(self, target, state=None):
+        # Every ridge in its bucket's gray in one call, or the cells; state is a
+        # snapshot() to draw instead of the current diagram
+        segments, buckets, points, image = state if state is not None else self.snapshot()
+        if points is not None:
+            if not hasattr(target, 'rgba'):
+                # Vector targets get the cell outlines; open at the border like the ridges
+                from scipy.spatial import Voronoi
+                segments = ridge_segments(Voronoi(points))
+                buckets = bucket_by_color(ridge_intensity(segments), self.color_levels)
+                self.draw(target, (segments, buckets, None, None))
+                return
+            if image.shape == target.rgba.shape and target.scale == 1 and target.origin == (0, 0):
+                target.rgba[:] = image  # Already rendered at this size
+            else:
+                self.cells.draw(target, points, self.width, self.height)
+            return
+        gray = np.zeros((len(segments), 1), dtype=np.uint8)
+        for level, indices in buckets:
+            gray[indices] = level
+        target.segments(segments, gray, 1)
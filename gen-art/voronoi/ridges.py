@@ -0,0 +1,29 @@
+import numpy as np
+
+# Voronoi ridges as NumPy arrays, computed once per simulation step and shared
+# by the widget and the SVG export
+
+
+def ridge_segments(vor):
+    # (n, 2, 2) array of the finite ridges; ridges with a vertex at infinity (-1) are dropped
+    ridges = np.asarray(vor.ridge_vertices, dtype=np.intp).reshape(-1, 2)
+    finite = (ridges >= 0).all(axis=1)
+    return vor.vertices[ridges[finite]]
+
+
+def ridge_intensity(segments):
+    # Same grayscale as VoronoiWidget.get_color, taken at each ridge's first vertex
+    start = segments[:, 0]
+    return ((np.sin(start[:, 0] * 0.1 + start[:, 1] * 0.1) + 1) * 127).astype(np.int32)
+
+
+def bucket_by_color(intensity, levels=16):
+    # Quantize intensities into `levels` gray buckets. Returns a list of
+    # (gray, indices) pairs, one per non-empty bucket, so each bucket can be
+    # drawn with one pen and one call.
+    bucket = np.minimum(intensity * levels // 255, levels - 1)
+    order = np.argsort(bucket, kind='stable')
+    counts = np.bincount(bucket, minlength=levels)
+    gray = ((np.arange(levels) + 0.5) * 255 / levels).astype(int)
+    groups = np.split(order, np.cumsum(counts)[:-1])
+    return [(gray[b], groups[b]) for b in range(levels) if counts[b]]
@@ -1,58 +1,118 @@
 import sys
 import numpy as np
-from scipy.spatial import Voronoi
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QSlider, QPushButton, QLabel, QFileDialog
-from PyQt5.QtCore import Qt, QTimer, QPointF, QRectF, QSize
-from PyQt5.QtGui import QPainter, QColor, QPen, QPolygonF
-from PyQt5.QtSvg import QSvgGenerator
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QSlider, QPushButton, QLabel, QFileDialog, QInputDialog, QMessageBox, QShortcut
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QPainter, QColor, QPen, QKeySequence, QImage
+import os
+import time
+
+# Make the shared gen-art modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from voronoi.model import VoronoiModel
+from common.qtarrays import point_pairs_from_array
+from common.pipeline import SimulationPipeline
+from common.profiling import FrameProfiler
+from common.hud import draw_hud
+from common.recorder import Recorder, open_writer
+from common.recording import PositionRecorder, EXTENSION as RECORDING_EXTENSION
+from common.svg import SvgCanvas
+from common.poster import PosterJob
+from common.quality import QualityController, scaled
 
 class VoronoiWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, seed=None):
         super(VoronoiWidget, self).__init__(parent)
         self.setMinimumSize(600, 400)
-        self.points = np.array([])  # Initialize as an empty NumPy array
-        self.vor = None
-        self.num_points = 100  # Increased default number of points
-        self.movement_speed = 1.0
-        self.time = 0
+        self.model = VoronoiModel(seed=seed)  # Points and ridges; see voronoi/model.py
+        # Stage timings; off unless GENART_PROFILE is set or the HUD is toggled with F3
+        self.profiler = FrameProfiler.from_env(target_fps=20)
+        # Steps on the GUI thread until the window starts it on a worker thread
+        self.pipeline = SimulationPipeline(self.model, profiler=self.profiler)
+        self.shown_error = None
+        self.shown_frame = -1
+        # Scales the slider values down while frames run over budget and back up when there is room
+        self.quality = QualityController({'num_points': scaled(10)}, budget_ms=1000 / 20)
+        self.quality.request(num_points=self.model.num_points)
 
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
 
-        if self.vor is not None:
-            for simplex in self.vor.ridge_vertices:
-                if -1 not in simplex:
-                    p1 = QPointF(*self.vor.vertices[simplex[0]])
-                    p2 = QPointF(*self.vor.vertices[simplex[1]])
-                    color = self.get_color(p1.x(), p1.y())
-                    painter.setPen(QPen(color, 1))  # Reduced line thickness for density
-                    painter.drawLine(p1, p2)
+        started = time.perf_counter()
+        with self.profiler.stage('paint'):
+            self.draw_frame(painter)
+        self.observe_quality((time.perf_counter() - started) * 1000)
+        self.profiler.frame()
+        if self.profiler.hud:
+            draw_hud(painter, self.profiler, extra=[self.quality.summary()])
+
+    def toggle_hud(self):
+        self.profiler.hud = not self.profiler.hud
+        if self.profiler.hud and not self.profiler.enabled:
+            self.profiler.enable()
+        self.update()
+
+    def set_params(self, **values):
+        # Slider values, applied at the current quality
+        self.quality.request(**values)
+        self.pipeline.set(**self.quality.values())
+
+    def set_max_quality(self, enabled):
+        # Ignore the frame budget, e.g. before exporting
+        self.quality.set_max_quality(enabled)
+        self.pipeline.set(**self.quality.values())
+
+    def observe_quality(self, paint_ms):
+        # Cost of the frame just painted; changes the quality level when it is over or well under budget
+        if self.quality.observe(self.pipeline.step_time * 1000, paint_ms):
+            self.pipeline.set(**self.quality.values())
+
+    def set_render_mode(self, mode):
+        # 'ridges' or 'cells'; applied from the next step
+        self.pipeline.set(render_mode=mode)
+
+    def draw_frame(self, painter):
+        # The cells image, or one drawLines call per color bucket, from the latest finished step
+        with self.pipeline.front() as frame:
+            segments, buckets, _, image = frame if frame is not None else (None, [], None, None)
+            if image is not None:
+                # Wraps the NumPy buffer without copying; the front buffer can't be swapped until the draw is done
+                painter.drawImage(0, 0, QImage(image.data, image.shape[1], image.shape[0], image.strides[0],
+                                               QImage.Format_RGBA8888))
+            for gray, indices in buckets:
+                painter.setPen(QPen(QColor(gray, gray, gray), 1))  # Reduced line thickness for density
+                painter.drawLines(point_pairs_from_array(segments[indices]))
 
     def get_color(self, x, y):
         # Generate a grayscale color based on the position
         intensity = int((np.sin(x * 0.1 + y * 0.1) + 1) * 127)
         return QColor(intensity, intensity, intensity)
 
+    def start_simulation(self, rate):
+        # Step on a worker thread from now on; the canvas size is applied first so
+        # the first points spawn across all of it
+        self.pipeline.set(width=self.width(), height=self.height())
+        self.pipeline.start(rate)
+
+    def report_error(self):
+        # Shows the worker's error once; the diagram stays on its last frame
+        if self.shown_error is not self.pipeline.error:
+            self.shown_error = self.pipeline.error
+            QMessageBox.warning(self, "Simulation", f"The simulation stopped: {self.shown_error!r}")
+
     def update_simulation(self):
-        if len(self.points) == 0:
-            self.points = np.random.rand(self.num_points, 2) * [self.width(), self.height()]
-
-        # Move points in a circular pattern
-        theta = np.linspace(0, 2*np.pi, self.num_points) + self.time
-        dx = np.cos(theta) * self.movement_speed
-        dy = np.sin(theta) * self.movement_speed
-        self.points[:, 0] += dx
-        self.points[:, 1] += dy
-
-        # Wrap around the edges
-        self.points[:, 0] %= self.width()
-        self.points[:, 1] %= self.height()
-
-        # Compute Voronoi diagram
-        self.vor = Voronoi(self.points)
-        self.time += 0.05
-        self.update()
+        # Timer slot: steps the model unless the pipeline runs on its own thread,
+        # then repaints if a new diagram is ready
+        if (self.model.width, self.model.height) != (self.width(), self.height()):
+            self.pipeline.set(width=self.width(), height=self.height())
+        if self.pipeline.error is not None:
+            self.report_error()
+            return
+        if not self.pipeline.running:
+            self.pipeline.step()
+        if self.pipeline.frame != self.shown_frame:
+            self.shown_frame = self.pipeline.frame
+            self.update()
 
 class VoronoiArtSimulation(QMainWindow):
     def __init__(self):
@@ -72,7 +132,7 @@ class VoronoiArtSimulation(QMainWindow):
 
         self.sliders = {}
         slider_params = [
-            ('num_points', 'Number of Points', 10, 500, 100),  # Increased max points
+            ('num_points', 'Number of Points', 10, 100000, 100),  # Ridges are batched and cells are labelled on a thread pool, so tens of thousands of seeds stay interactive
             ('movement_speed', 'Movement Speed', 0, 100, 10),
         ]
 
@@ -92,23 +152,56 @@ class VoronoiArtSimulation(QMainWindow):
         reset_button.clicked.connect(self.reset_sliders)
         export_button = QPushButton("Export SVG")
         export_button.clicked.connect(self.export_svg)
+        self.poster_button = QPushButton("Export Poster")
+        self.poster_button.clicked.connect(self.export_poster)
+        self.poster_job = None
+        self.record_button = QPushButton("Record")
+        self.record_button.setCheckable(True)
+        self.record_button.toggled.connect(self.toggle_recording)
+        self.recorder = None
+        cells_button = QPushButton("Cells")
+        cells_button.setCheckable(True)
+        cells_button.toggled.connect(lambda checked: self.voronoi_widget.set_render_mode('cells' if checked else 'ridges'))
+        max_quality_button = QPushButton("Max Quality")
+        max_quality_button.setCheckable(True)
+        max_quality_button.toggled.connect(self.voronoi_widget.set_max_quality)
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(reset_button)
         button_layout.addWidget(export_button)
+        button_layout.addWidget(self.poster_button)
+        button_layout.addWidget(self.record_button)
+        button_layout.addWidget(cells_button)
+        button_layout.addWidget(max_quality_button)
         control_layout.addLayout(button_layout)
 
         main_layout.addWidget(self.voronoi_widget, 3)
         main_layout.addWidget(control_panel, 1)
 
+        QShortcut(QKeySequence('F3'), self, activated=self.voronoi_widget.toggle_hud)
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.voronoi_widget.update_simulation)
-        self.timer.start(50)  # Update every 50 ms
+        self.timer.start(16)  # Check for a new frame every 16 ms
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # qhull runs on a worker thread at 20 steps per second, so a slow diagram
+        # no longer blocks input; the timer repaints whenever a new one is ready
+        self.voronoi_widget.start_simulation(rate=20)
+
+    def closeEvent(self, event):
+        self.record_button.setChecked(False)  # Finish the file before the worker goes away
+        self.timer.stop()  # Or its next tick would step the model again on this thread
+        self.voronoi_widget.pipeline.stop()
+        if self.poster_job is not None:
+            self.poster_job.wait()  # Let the file be finished rather than cut off
+        super().closeEvent(event)
 
     def update_simulation(self):
-        self.voronoi_widget.num_points = self.sliders['num_points'].value()
-        self.voronoi_widget.movement_speed = self.sliders['movement_speed'].value() / 10
-        self.voronoi_widget.points = []  # Reset points to apply new settings
+        self.voronoi_widget.set_params(
+            num_points=self.sliders['num_points'].value(),
+            movement_speed=self.sliders['movement_speed'].value() / 10)
+        self.voronoi_widget.pipeline.call(VoronoiModel.clear_points)  # Reset points to apply new settings
 
     def reset_sliders(self):
         default_values = {
@@ -117,42 +210,110 @@ class VoronoiArtSimulation(QMainWindow):
         }
         for name, value in default_values.items():
             self.sliders[name].setValue(value)
-        self.voronoi_widget.time = 0
-        self.voronoi_widget.points = []
+        self.voronoi_widget.pipeline.call(VoronoiModel.reset)
+
+    def toggle_recording(self, checked):
+        # Every frame the pipeline publishes goes through a bounded queue to an
+        # encoder thread; frames it can't keep up with are dropped and counted.
+        # A .genrec file keeps the positions instead, for replaying or
+        # re-rendering with gen-art/common/recording.py.
+        if checked:
+            file_path, _ = QFileDialog.getSaveFileName(self, "Record", "", "GIF files (*.gif);;Animated PNG (*.png);;Video (*.mp4 *.webm);;Positions (*.genrec)")
+            if not file_path:
+                self.record_button.setChecked(False)  # User cancelled the dialog
+                return
+            pipeline = self.voronoi_widget.pipeline
+            try:
+                if file_path.lower().endswith(RECORDING_EXTENSION):
+                    self.recorder = PositionRecorder(pipeline.model, file_path, rate=pipeline.rate).attach(pipeline)
+                else:
+                    self.recorder = Recorder(pipeline.model, open_writer(file_path, pipeline.rate)).attach(pipeline)
+            except (OSError, RuntimeError, ValueError) as error:
+                # E.g. a video without ffmpeg, or an extension there is no writer for
+                QMessageBox.warning(self, "Record", f"Could not record to '{file_path}': {error}")
+                self.record_button.setChecked(False)
+                return
+            self.record_button.setText("Stop")
+        elif self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
+            self.record_button.setText("Record")
+            try:
+                stats = recorder.close()
+            except Exception as error:
+                # The encoder's error, re-raised once the file is closed
+                QMessageBox.warning(self, "Record", f"Recording failed: {error}")
+                return
+            print(f"Recorded {stats['written']} frames, {stats['dropped']} dropped, "
+                  f"{stats['encode_ms']:.1f} ms per frame")
 
     def export_svg(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save SVG", "", "SVG files (*.svg)")
         if not file_path:
             return  # User cancelled the dialog
 
-        generator = QSvgGenerator()
-        generator.setFileName(file_path)
-        generator.setSize(QSize(self.voronoi_widget.width(), self.voronoi_widget.height()))
-        generator.setViewBox(QRectF(0, 0, self.voronoi_widget.width(), self.voronoi_widget.height()))
-        generator.setTitle("Voronoi Art")
-        generator.setDescription("Generated by Voronoi Art gen")
-
-        painter = QPainter()
-        painter.begin(generator)
-        
-        # Set the background to white
-        painter.fillRect(QRectF(0, 0, self.voronoi_widget.width(), self.voronoi_widget.height()), QColor(255, 255, 255))
-
-        # Draw Voronoi diagram
-        if self.voronoi_widget.vor is not None:
-            for simplex in self.voronoi_widget.vor.ridge_vertices:
-                if -1 not in simplex:
-                    p1 = QPointF(*self.voronoi_widget.vor.vertices[simplex[0]])
-                    p2 = QPointF(*self.voronoi_widget.vor.vertices[simplex[1]])
-                    color = self.voronoi_widget.get_color(p1.x(), p1.y())
-                    painter.setPen(QPen(color, 1))  # Reduced line thickness for density
-                    painter.drawLine(p1, p2)
-
-        painter.end()
+        with self.voronoi_widget.profiler.stage('export'):
+            self.write_svg(file_path)
         print(f"SVG exported as '{file_path}'")
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    def export_poster(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Poster", "", "TIFF files (*.tif);;PNG files (*.png)")
+        if not file_path:
+            return  # User cancelled the dialog
+        scale, ok = QInputDialog.getDouble(self, "Poster Scale", "Output pixels per canvas pixel:", 8, 1, 64, 1)
+        if not ok:
+            return
+
+        # Tiles are rendered by a process pool from a copy of the frame on
+        # screen, on a background thread; the simulation is only paused while
+        # the model is copied
+        pipeline = self.voronoi_widget.pipeline
+        running = pipeline.running
+        pipeline.stop()
+        try:
+            with self.voronoi_widget.profiler.stage('export'), pipeline.front() as state:
+                self.poster_job = PosterJob(pipeline.model, file_path, scale, state)
+        except Exception as error:
+            QMessageBox.warning(self, "Export Poster", f"Could not export '{file_path}': {error}")
+            return
+        finally:
+            if running:
+                pipeline.start()
+        self.poster_button.setEnabled(False)
+        self.poster_button.setText("Rendering...")
+        QTimer.singleShot(100, self.finish_poster)
+
+    def finish_poster(self):
+        # Polls the poster job until it is done, then reports how it went
+        job = self.poster_job
+        if job is None:
+            return
+        if not job.done():
+            QTimer.singleShot(100, self.finish_poster)
+            return
+        self.poster_job = None
+        self.poster_button.setEnabled(True)
+        self.poster_button.setText("Export Poster")
+        if job.error is not None:
+            QMessageBox.warning(self, "Export Poster", f"Could not export '{job.path}': {job.error}")
+        else:
+            print(f"{job.size[0]}x{job.size[1]} poster exported as '{job.path}'")
+
+    def write_svg(self, file_path):
+        # Streams the ridge arrays from the last step, one shared path per gray.
+        # Every step builds new arrays, so the diagram can be kept after the
+        # lock is released and the simulation goes on while the file is written.
+        with self.voronoi_widget.pipeline.front() as diagram:
+            pass
+        with SvgCanvas(file_path, self.voronoi_widget.width(), self.voronoi_widget.height(),
+                       title="Voronoi Art", description="Generated by Voronoi Art gen") as svg:
+            if diagram is not None:
+                self.voronoi_widget.model.draw(svg, diagram)
+
+def main(argv=None):
+    app = QApplication.instance() or QApplication(sys.argv if argv is None else argv)
     main_window = VoronoiArtSimulation()
     main_window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    return app.exec_()
+
+if __name__ == '__main__':
+    sys.exit(main())